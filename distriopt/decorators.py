@@ -38,14 +38,15 @@ def cached(func):
 
 def cachedproperty(func):
     """Decorator to cache property values."""
-    values = {}
+
+    func.cache = {}
 
     @property
     @functools.wraps(func)
     def wrapper(self):
-        if self not in values:
-            values[self] = func(self)
-        return values[self]
+        if self not in func.cache:
+            func.cache[self] = func(self)
+        return func.cache[self]
 
     return wrapper
 
@@ -1,2 +1,3 @@
 from .physical import PhysicalNetwork
+from .delta import VirtualDelta
 from .solver import EmbedSolver
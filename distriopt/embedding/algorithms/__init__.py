@@ -1,5 +1,7 @@
+from .colgen import EmbedColumnGeneration
 from .greedy import EmbedGreedy
 from .ilp import EmbedILP
 from .kbalanced import EmbedBalanced
 from .partition import EmbedPartition
+from .portfolio import PortfolioSolver
 from .random import RandomSelection
@@ -0,0 +1,411 @@
+"""
+Path-based formulation of the embedding problem solved by column generation.
+
+Each virtual link is routed on a path between the physical nodes hosting its endpoints: a variable is defined for
+each (virtual link, physical path) pair, but only the paths which can improve the solution are generated. The
+restricted master problem (RMP) is the linear relaxation over the paths generated so far, new paths are priced by
+a shortest path computation on the dual values of the RMP and, once no path has a negative reduced cost, the
+integer problem is solved over the generated paths (price-and-branch).
+
+The RMP is always feasible thanks to artificial variables with a big-M cost.
+"""
+
+import heapq
+import itertools
+import logging
+import time
+
+import numpy as np
+import pulp
+
+from distriopt.constants import *
+from distriopt.decorators import timeit
+from distriopt.embedding.algorithms.ilp import EmbedILP
+from distriopt.embedding.solution import Solution
+
+_log = logging.getLogger(__name__)
+
+# tolerance on the reduced costs and on the values of the variables
+_EPS = 1e-6
+
+
+def _shortest_paths(compiled, weights, source):
+    """Dijkstra from the node id source with a weight for each interface.
+
+    Return the distances to all the nodes and the predecessors map, node id -> (node id, interface).
+    """
+    dist = np.full(len(compiled.names), np.inf)
+    dist[source] = 0
+    pred = {source: None}
+    visited = set()
+    heap = [(0, source)]
+
+    while heap:
+        d_i, i = heapq.heappop(heap)
+        if i in visited:
+            continue
+        visited.add(i)
+        for j, interfaces in compiled.adjacency[i]:
+            k = min(interfaces, key=weights.__getitem__)
+            d_j = d_i + weights[k]
+            if d_j < dist[j]:
+                dist[j] = d_j
+                pred[j] = (i, k)
+                heapq.heappush(heap, (d_j, j))
+
+    return dist, pred
+
+
+class EmbedColumnGeneration(EmbedILP):
+    """Path-based ILP solved by column generation and price-and-branch.
+
+    The same objectives ("min_n_machines" and "min_bw") and PuLP backends of EmbedILP are supported. The initial
+    paths are taken from the solution of the heuristic warm_start (if not None) and symmetries between identical
+    machines are broken unless symmetry is False. Duals are read from the PuLP constraints, so the default backend
+    is "cbc": if the backend does not return them (e.g. "glpk"), only the initial paths are used and current_val is
+    not set.
+    """
+
+    def _add_column(self, rmp, constraints, columns, e, a, b, path, cost):
+        """Add the variable of the path (list of (node id, node id, interface)) from a to b for the virtual link e."""
+        src_constraints, dst_constraints, capacity_constraints = constraints
+        ks = tuple(k for (_, _, k) in path)
+        if (e, ks) in columns:
+            return False
+
+        var = pulp.LpVariable(f"path_{len(columns)}", lowBound=0, upBound=1)
+        columns[(e, ks)] = (var, path)
+
+        rmp.objective.addInPlace(cost * var)
+        src_constraints[(e, a)].addInPlace(var)
+        dst_constraints[(e, b)].addInPlace(var)
+        for k in ks:
+            capacity_constraints[k].addInPlace(self._rates[e] * var)
+        return True
+
+    def _path_ids(self, compiled, path):
+        """Translate a path given as a list of (i, device_id, j) in a list of (node id, node id, interface)."""
+        return [
+            (
+                compiled.ids[i],
+                compiled.ids[j],
+                compiled.interface_ids[(i, j, device_id)],
+            )
+            for (i, device_id, j) in path
+        ]
+
+    @timeit
+    def solve(self, **kwargs):
+
+        obj = kwargs.get("obj", "min_n_machines")
+        solver_name = kwargs.get("solver_name", "cbc").lower()
+        timelimit = int(kwargs.get("timelimit", "3600"))
+        warm_start = kwargs.get("warm_start", "greedy")
+        symmetry = kwargs.get("symmetry", True)
+        max_iterations = kwargs.get("max_iterations", 100)
+        # number of paths added for each virtual link at each iteration
+        n_columns = kwargs.get("n_columns", 5)
+
+        _log.debug(f"called column generation with the following parameters: {kwargs}")
+        start = time.time()
+
+        compiled = self.physical.compile()
+        hosts = compiled.compute_nodes.tolist()
+        host_names = [compiled.names[i] for i in hosts]
+        virtual_edges = sorted(self.virtual.sorted_edges())
+        self._rates = np.array(
+            [self.virtual.req_rate(u, v) for (u, v) in virtual_edges]
+        )
+        n_interfaces = len(compiled.rates)
+
+        # cost of a hop of a path for a unit of rate
+        hop_cost = 1 if obj == "min_bw" else 0
+        # cost of the artificial variables, larger than the cost of any solution
+        big_m = len(hosts) + 1 + hop_cost * self._rates.sum() * n_interfaces
+
+        rmp = pulp.LpProblem("Column generation RMP", pulp.LpMinimize)
+
+        # node mapping variables
+        node_mapping = pulp.LpVariable.dicts(
+            "node_mapping",
+            ((u, i) for u in self.virtual.nodes() for i in hosts),
+            lowBound=0,
+            upBound=1,
+        )
+        # the endpoints of the virtual link e are both mapped on i
+        colocation = pulp.LpVariable.dicts(
+            "colocation",
+            ((e, i) for e in range(len(virtual_edges)) for i in hosts),
+            lowBound=0,
+            upBound=1,
+        )
+        # artificial variables for the source and destination constraints, and overload of the interfaces
+        artificial = pulp.LpVariable.dicts(
+            "artificial",
+            (
+                (e, i, side)
+                for e in range(len(virtual_edges))
+                for i in hosts
+                for side in ("src", "dst")
+            ),
+            lowBound=0,
+        )
+        overload = pulp.LpVariable.dicts("overload", range(n_interfaces), lowBound=0)
+
+        if obj == "min_n_machines":
+            usage_phy_machine = pulp.LpVariable.dicts(
+                "usage", hosts, lowBound=0, upBound=1
+            )
+            objective = pulp.lpSum(usage_phy_machine[i] for i in hosts)
+        elif obj == "min_bw":
+            usage_phy_machine = {}
+            objective = pulp.LpAffineExpression()
+        else:
+            raise ValueError(f"Invalid objective {obj}")
+
+        rmp += objective + big_m * (
+            pulp.lpSum(artificial.values()) + pulp.lpSum(overload.values())
+        )
+
+        for u in self.virtual.nodes():
+            rmp += pulp.lpSum(node_mapping[(u, i)] for i in hosts) == 1
+        for i, name in zip(hosts, host_names):
+            rmp += pulp.lpSum(
+                self.virtual.req_cores(u) * node_mapping[(u, i)]
+                for u in self.virtual.nodes()
+            ) <= self.physical.cores(name)
+            rmp += pulp.lpSum(
+                self.virtual.req_memory(u) * node_mapping[(u, i)]
+                for u in self.virtual.nodes()
+            ) <= self.physical.memory(name)
+            if obj == "min_n_machines":
+                for u in self.virtual.nodes():
+                    rmp += usage_phy_machine[i] >= node_mapping[(u, i)]
+        # value of the RMP which cannot be improved by new paths
+        lp_bound = 0
+        if obj == "min_n_machines":
+            # the linear relaxation is much weaker than the lower bound
+            lp_bound = self.lower_bound()
+            rmp += pulp.lpSum(usage_phy_machine.values()) >= lp_bound
+
+        # symmetry breaking for identical machines (see EmbedILP)
+        classes = (
+            [
+                [compiled.ids[i] for i in members]
+                for members in self._machine_classes(host_names)
+            ]
+            if symmetry
+            else []
+        )
+        for members in classes:
+            if obj == "min_n_machines":
+                for i, i_next in zip(members, members[1:]):
+                    rmp += usage_phy_machine[i] >= usage_phy_machine[i_next]
+            for r, u in enumerate(self.virtual.nodes()):
+                for i in members[r + 1 :]:
+                    node_mapping[(u, i)].upBound = 0
+
+        # each virtual link leaves the host of its source on a path, unless both its endpoints are on the same host
+        src_constraints, dst_constraints = {}, {}
+        for e, (u, v) in enumerate(virtual_edges):
+            for i in hosts:
+                src_constraints[(e, i)] = (
+                    colocation[(e, i)]
+                    + artificial[(e, i, "src")]
+                    - node_mapping[(u, i)]
+                    == 0
+                )
+                dst_constraints[(e, i)] = (
+                    colocation[(e, i)]
+                    + artificial[(e, i, "dst")]
+                    - node_mapping[(v, i)]
+                    == 0
+                )
+                rmp += src_constraints[(e, i)]
+                rmp += dst_constraints[(e, i)]
+
+        # capacity of the interfaces
+        capacity_constraints = {}
+        for k in range(n_interfaces):
+            capacity_constraints[k] = (
+                -compiled.rates[k] * overload[k] <= compiled.rates[k]
+            )
+            rmp += capacity_constraints[k]
+
+        constraints = src_constraints, dst_constraints, capacity_constraints
+        columns = {}
+
+        # initial paths from a heuristic solution
+        if warm_start is not None:
+            heuristic_solution = self._heuristic_solution(warm_start)
+            if heuristic_solution is not None:
+                edge_index = {edge: e for e, edge in enumerate(virtual_edges)}
+                # the paths of the heuristic solution must satisfy the symmetry breaking constraints
+                _, link_path = self._break_symmetry(
+                    heuristic_solution,
+                    [[compiled.names[i] for i in members] for members in classes],
+                )
+                for (u, v), path in link_path.items():
+                    if (u, v) not in edge_index:
+                        u, v = v, u
+                        path = [(j, device_id, i) for (i, device_id, j) in path[::-1]]
+                    path = self._path_ids(compiled, path)
+                    self._add_column(
+                        rmp,
+                        constraints,
+                        columns,
+                        edge_index[(u, v)],
+                        path[0][0],
+                        path[-1][1],
+                        path,
+                        hop_cost * self.virtual.req_rate(u, v) * len(path),
+                    )
+
+        #
+        # column generation
+        #
+        self.current_val = 0
+        for iteration in range(max_iterations):
+            remaining = max(1, int(timelimit - (time.time() - start)))
+            rmp.setSolver(self._get_solver(solver_name, remaining))
+            status = pulp.LpStatus[rmp.solve()]
+            if status != "Optimal":
+                _log.warning(f"RMP not solved at iteration {iteration}: {status}")
+                break
+
+            rmp_value = pulp.value(rmp.objective)
+            if rmp_value <= lp_bound + _EPS:
+                _log.debug(f"iteration {iteration}: RMP {rmp_value} at its lower bound")
+                self.current_val = rmp_value
+                break
+
+            # duals
+            if any(
+                constraint.pi is None
+                for constraint in itertools.chain(
+                    src_constraints.values(),
+                    dst_constraints.values(),
+                    capacity_constraints.values(),
+                )
+            ):
+                _log.warning(f"no duals returned by {solver_name}, no path is priced")
+                break
+            src_duals = np.array(
+                [
+                    [src_constraints[(e, i)].pi for i in hosts]
+                    for e in range(len(virtual_edges))
+                ]
+            ).reshape(len(virtual_edges), len(hosts))
+            dst_duals = np.array(
+                [
+                    [dst_constraints[(e, i)].pi for i in hosts]
+                    for e in range(len(virtual_edges))
+                ]
+            ).reshape(len(virtual_edges), len(hosts))
+            # the weight of each interface for a unit of rate, a small cost per hop prefers short paths
+            weights = [
+                hop_cost - min(capacity_constraints[k].pi, 0) + _EPS
+                for k in range(n_interfaces)
+            ]
+
+            # shortest paths between all the hosts
+            dist = np.empty((len(hosts), len(hosts)))
+            preds = []
+            for a, i in enumerate(hosts):
+                dist_i, pred = _shortest_paths(compiled, weights, i)
+                dist[a] = dist_i[hosts]
+                preds.append(pred)
+
+            # reduced cost of the shortest path from a to b for each virtual link
+            reduced_costs = (
+                self._rates[:, None, None] * dist[None, :, :]
+                - src_duals[:, :, None]
+                - dst_duals[:, None, :]
+            )
+            reduced_costs[:, np.arange(len(hosts)), np.arange(len(hosts))] = np.inf
+
+            n_added = 0
+            for e in range(len(virtual_edges)):
+                flat = reduced_costs[e].ravel()
+                for idx in np.argsort(flat)[:n_columns].tolist():
+                    if flat[idx] >= -_EPS:
+                        break
+                    a, b = divmod(idx, len(hosts))
+                    path = []
+                    j = hosts[b]
+                    while preds[a][j] is not None:
+                        i, k = preds[a][j]
+                        path.append((i, j, k))
+                        j = i
+                    path = path[::-1]
+                    n_added += self._add_column(
+                        rmp,
+                        constraints,
+                        columns,
+                        e,
+                        hosts[a],
+                        hosts[b],
+                        path,
+                        hop_cost * self._rates[e] * len(path),
+                    )
+
+            _log.debug(f"iteration {iteration}: RMP {rmp_value}, {n_added} paths added")
+            if not n_added:
+                # the linear relaxation is solved, its value is a lower bound
+                self.current_val = rmp_value
+                break
+            if time.time() - start > timelimit:
+                break
+
+        #
+        # price-and-branch: integer problem over the generated paths
+        #
+        for var in node_mapping.values():
+            var.cat = pulp.LpInteger
+        for var in usage_phy_machine.values():
+            var.cat = pulp.LpInteger
+        for var, _ in columns.values():
+            var.cat = pulp.LpInteger
+
+        remaining = max(1, int(timelimit - (time.time() - start)))
+        rmp.setSolver(self._get_solver(solver_name, remaining))
+        status = pulp.LpStatus[rmp.solve()]
+
+        if status == "Infeasible":
+            self.status = Infeasible
+            return Infeasible
+        if (
+            status not in ("Optimal", "Not Solved", "Undefined")
+            or pulp.value(rmp.objective) is None
+            or any(
+                (var.varValue or 0) > _EPS
+                for var in list(artificial.values()) + list(overload.values())
+            )
+        ):
+            # no solution without artificial variables among the generated paths
+            self.status = NotSolved
+            return NotSolved
+
+        # build solution from variables values
+        res_node_mapping = {
+            u: compiled.names[i]
+            for (u, i), var in node_mapping.items()
+            if var.varValue > 0.5
+        }
+        res_link_mapping = {}
+        for (e, _), (var, path) in columns.items():
+            if var.varValue > 0.5:
+                res_link_mapping[virtual_edges[e]] = [
+                    (
+                        compiled.names[i],
+                        compiled.interface_device[k],
+                        compiled.names[j],
+                    )
+                    for (i, j, k) in path
+                ]
+
+        self.solution = Solution.build_solution(
+            self.virtual, self.physical, res_node_mapping, res_link_mapping
+        )
+        self.status = Solved
+        return Solved
@@ -1,5 +1,5 @@
 import logging
-from collections import defaultdict, Counter, deque
+from collections import defaultdict, deque
 
 import numpy as np
 from networkx.algorithms.community.kernighan_lin import kernighan_lin_bisection
@@ -7,6 +7,10 @@ from networkx.algorithms.community.kernighan_lin import kernighan_lin_bisection
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.embedding import EmbedSolver
+from distriopt.embedding.algorithms.mincut import karger_min_cut, min_cut_executor
+from distriopt.embedding.algorithms.multilevel import multilevel_bisection
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.paths import get_path_engine
 from distriopt.embedding.solution import Solution
 
 _log = logging.getLogger(__name__)
@@ -67,94 +71,25 @@ class Tree(object):
                     to_visit.append(current.r)
 
 
-def partition(virtual, algo="min_cut"):
+def partition(
+    virtual, algo="min_cut", n_trials=1, karger_stein=False, n_jobs=1, seed=None
+):
     """Iterative min cut algorithm.
 
-    Iteratively partitions the graph according to the chosen algorithm (either min cut or min bisection)
-    until the size of the partition is under a certain threshold.
+    Iteratively partitions the graph according to the chosen algorithm (either min cut, min bisection or
+    multilevel bisection) until the size of the partition is under a certain threshold.
+    Each min cut is the best of n_trials trials of Karger's (or Karger-Stein's) algorithm, run in a pool of
+    n_jobs processes.
     """
-
-    class UnionFind:
-        """Utility Class used by the MinCut algorithm."""
-
-        def __init__(self, nodes):
-            self.parents = {u: u for u in nodes}
-            self.ranks = {u: 0 for u in nodes}
-            self.subsets = {u: {u} for u in nodes}
-
-        def find(self, u):
-            return u if self.parents[u] == u else self.find(self.parents[u])
-
-        def union(self, u, v):
-
-            u_root, v_root = self.find(u), self.find(v)
-
-            if self.ranks[u_root] < self.ranks[v_root]:
-                self.parents[u_root] = v_root
-
-                self.subsets[v_root] |= self.subsets[u_root]
-                del self.subsets[u_root]
-
-            elif self.ranks[u_root] > self.ranks[v_root]:
-                self.parents[v_root] = u_root
-
-                self.subsets[u_root] |= self.subsets[v_root]
-                del self.subsets[v_root]
-
-            else:
-                self.parents[v_root] = u_root
-                self.ranks[u_root] += 1
-
-                self.subsets[u_root] |= self.subsets[v_root]
-                del self.subsets[v_root]
-
-    def min_cut(g):
-        """Return a min cut of g.
-
-        The procedure is based on Karger's algorithm [1].
-
-        [1] D. Karger "Global Min-cuts in RNC and Other Ramifications of a Simple Mincut Algorithm".
-        Proc. 4th Annual ACM-SIAM Symposium on Discrete Algorithms 1993.
-        """
-        edges = []
-        weights = []
-        sum_rate = 0
-
-        for (u, v) in g.edges():
-            edges.append((u, v))
-            rate = g[u][v]["rate"]
-            weights.append(rate)
-            sum_rate += rate
-
-        n_nodes = len(g.nodes())
-
-        uf = UnionFind(g.nodes())
-
-        sorted_edges = iter(
-            np.random.choice(
-                np.arange(len(edges)),
-                size=len(edges),
-                replace=False,
-                p=np.array(weights) / sum_rate,
-            )
-        )
-
-        while n_nodes > 2:
-            u, v = edges[next(sorted_edges)]
-
-            if uf.find(u) != uf.find(v):
-                n_nodes -= 1
-                uf.union(u, v)
-
-        return uf.subsets.values()
+    compact = virtual.compact()
 
     to_be_processed = [set(virtual.nodes())]
     partitions = []
 
     root = Node(
         frozenset(virtual.nodes()),
-        cores=sum(virtual.req_cores(u) for u in virtual.nodes()),
-        memory=sum(virtual.req_memory(u) for u in virtual.nodes()),
+        cores=compact.cores.sum(),
+        memory=compact.memory.sum(),
     )
 
     t = Tree(root)
@@ -162,40 +97,61 @@ def partition(virtual, algo="min_cut"):
     # to keep track of the Node associated to each of the partitions
     partitions_nodes = {frozenset(virtual.nodes()): root}
 
-    while to_be_processed:
-        p = to_be_processed.pop()
-        if len(p) <= 1:
-            partitions.append(p)
-        else:
-            if algo == "min_cut":
-                p1, p2 = min_cut(virtual.g.subgraph(p))
-            elif algo == "bisection":
-                p1, p2 = kernighan_lin_bisection(virtual.g.subgraph(p), weight="rate")
-            else:
-                raise ValueError("undefined")
+    rng = np.random.RandomState(seed)
+    executor = min_cut_executor(n_jobs) if algo == "min_cut" else None
 
-            # update tree
-            parent = partitions_nodes[frozenset(p)]
-
-            p1_node = Node(
-                frozenset(p1),
-                cores=sum(virtual.req_cores(u) for u in p1),
-                memory=sum(virtual.req_memory(u) for u in p1),
-                parent=parent,
-            )
+    try:
+        while to_be_processed:
+            p = to_be_processed.pop()
+            if len(p) <= 1:
+                partitions.append(p)
+            else:
+                if algo == "min_cut":
+                    p1, p2 = karger_min_cut(
+                        virtual.g.subgraph(p),
+                        n_trials=n_trials,
+                        karger_stein=karger_stein,
+                        seed=rng.randint(2**31 - 1),
+                        executor=executor,
+                    )
+                elif algo == "bisection":
+                    p1, p2 = kernighan_lin_bisection(
+                        virtual.g.subgraph(p), weight="rate"
+                    )
+                elif algo == "multilevel":
+                    p1, p2 = multilevel_bisection(virtual.g.subgraph(p))
+                else:
+                    raise ValueError("undefined")
+
+                # update tree
+                parent = partitions_nodes[frozenset(p)]
+
+                p1_node = Node(
+                    frozenset(p1),
+                    cores=compact.cores[compact.to_ids(p1)].sum(),
+                    memory=compact.memory[compact.to_ids(p1)].sum(),
+                    parent=parent,
+                )
 
-            p2_node = Node(
-                frozenset(p2),
-                cores=sum(virtual.req_cores(u) for u in p2),
-                memory=sum(virtual.req_memory(u) for u in p2),
-                parent=parent,
-            )
+                p2_node = Node(
+                    frozenset(p2),
+                    cores=compact.cores[compact.to_ids(p2)].sum(),
+                    memory=compact.memory[compact.to_ids(p2)].sum(),
+                    parent=parent,
+                )
 
-            partitions_nodes[frozenset(p)].l = partitions_nodes[frozenset(p1)] = p1_node
-            partitions_nodes[frozenset(p)].r = partitions_nodes[frozenset(p2)] = p2_node
+                partitions_nodes[frozenset(p)].l = partitions_nodes[frozenset(p1)] = (
+                    p1_node
+                )
+                partitions_nodes[frozenset(p)].r = partitions_nodes[frozenset(p2)] = (
+                    p2_node
+                )
 
-            to_be_processed.append(p1)
-            to_be_processed.append(p2)
+                to_be_processed.append(p1)
+                to_be_processed.append(p2)
+    finally:
+        if executor is not None:
+            executor.shutdown()
 
     return t
 
@@ -205,82 +161,91 @@ class EmbedGreedy(EmbedSolver):
     def solve(self, **kwargs):
 
         algo = kwargs.get("algo", "bisection")
-
-        partitions_tree = partition(self.virtual, algo=algo)
+        path_engine = get_path_engine(kwargs.get("path_engine", "bfs"))
+
+        partitions_tree = partition(
+            self.virtual,
+            algo=algo,
+            n_trials=kwargs.get("n_trials", 1),
+            karger_stein=kwargs.get("karger_stein", False),
+            n_jobs=kwargs.get("n_jobs", 1),
+            seed=kwargs.get("seed", None),
+        )
 
         # nodes are sorted in non increasing order according to the amount of resources (cpu, memory)
         # the formula used is : n_cores * 1000 + memory + outgoing_rate
-        sorted_compute_nodes = sorted(
-            self.physical.compute_nodes,
-            key=lambda x: self.physical.cores(x) * 1000
-            + self.physical.memory(x)
-            + self.physical.rate_out(x),
-            reverse=True,
+        compiled = self.physical.compile()
+        sorted_compute_nodes = compiled.sorted_compute_nodes(
+            compiled.cores * 1000 + compiled.memory + compiled.rate_out
         )
+        rate_out = {
+            phy_node: compiled.rate_out[compiled.ids[phy_node]]
+            for phy_node in sorted_compute_nodes
+        }
 
-        for n_nodes_to_consider in range(
-            self.lower_bound(), len(sorted_compute_nodes) + 1
-        ):
-
+        def place(n_nodes_to_consider):
+            """Return a solution using the first n_nodes_to_consider physical nodes, None if not found."""
             nodes_to_consider = sorted_compute_nodes[:n_nodes_to_consider]
 
-            cores_used = defaultdict(int)
-            memory_used = defaultdict(int)
-            rate_used = defaultdict(int)
-            assigned = defaultdict(list)
+            ledger = ResidualLedger(self.physical)
+            # rate exchanged by the virtual nodes mapped on each physical node with the other virtual nodes
+            cut_rate = defaultdict(int)
 
             res_node_mapping = {}
             res_link_mapping = {}
 
             # for each partition, starting from the biggest
             for node in partitions_tree.bfs_visit():
+                # outgoing rate of the partition, virtual links towards the already mapped nodes
+                # and rate towards each physical node
+                partition_rate = 0
+                mapped_links = []
+                links_to = defaultdict(int)
+                for u in node.partition:
+                    for v in self.virtual.neighbors(u):
+                        if v not in node.partition:
+                            rate = self.virtual.req_rate(u, v)
+                            partition_rate += rate
+                            if v in res_node_mapping:
+                                mapped_links.append((u, v, rate))
+                                links_to[res_node_mapping[v]] += rate
+
                 # consider the physical nodes starting from the already selected ones
                 for phy_node in nodes_to_consider:
+                    # resources used by the partition are tentatively added to the ledger
+                    ledger.begin()
                     try:
                         # check if the node resources are enough
-                        if node.cores + cores_used[phy_node] > self.physical.cores(
-                            phy_node
-                        ) or node.memory + memory_used[phy_node] > self.physical.memory(
-                            phy_node
-                        ):
+                        if not ledger.fits(phy_node, node.cores, node.memory):
                             raise NodeResourceError
 
-                        # check if outgoing communications can be performed and find a path
-                        if sum(
-                            self.virtual.req_rate(u, v)
-                            for u in node.partition | set(assigned[phy_node])
-                            for v in self.virtual.neighbors(u)
-                            if v not in node.partition | set(assigned[phy_node])
-                        ) > self.physical.rate_out(phy_node):
+                        # check if outgoing communications can be performed: the links between the
+                        # partition and the nodes already mapped on phy_node are no longer cut
+                        if (
+                            cut_rate[phy_node]
+                            + partition_rate
+                            - 2 * links_to[phy_node]
+                            > rate_out[phy_node]
+                        ):
                             raise LinkCapacityError
 
-                        temp_rate = defaultdict(int)
                         temp_paths = defaultdict(list)
                         # check if virtual links can be mapped
-                        for (u, v) in [
-                            (u, v)
-                            for u in node.partition
-                            for v in self.virtual.neighbors(u)
-                            if v not in node.partition
-                        ]:
-                            if (
-                                v in res_node_mapping
-                                and res_node_mapping[v] != phy_node
-                            ):
+                        for (u, v, rate) in mapped_links:
+                            if res_node_mapping[v] != phy_node:
 
                                 # find a path for the virtual link
                                 path = self.physical.find_path(
                                     phy_node,
                                     res_node_mapping[v],
-                                    req_rate=self.virtual.req_rate(u, v),
-                                    used_rate=Counter(rate_used) + Counter(temp_rate),
+                                    req_rate=rate,
+                                    used_rate=ledger.rate_used,
+                                    engine=path_engine,
                                 )
 
                                 # for each link in the path
+                                ledger.add_path(path, rate)
                                 for (i, j, device_id) in path:
-                                    temp_rate[
-                                        (i, j, device_id)
-                                    ] += self.virtual.req_rate(u, v)
                                     temp_paths[(u, v)].append((i, device_id, j))
 
                         # update the partitions placed
@@ -290,30 +255,32 @@ class EmbedGreedy(EmbedSolver):
                         res_link_mapping.update(temp_paths)
                         for u in node.partition:
                             res_node_mapping[u] = phy_node
-                            assigned[phy_node].append(u)
+                        cut_rate[phy_node] += partition_rate - 2 * links_to[phy_node]
 
                         # update used resources
-                        cores_used[phy_node] += node.cores
-                        memory_used[phy_node] += node.memory
-                        for k, v in temp_rate.items():
-                            rate_used[k] += v
+                        ledger.add_node(phy_node, node.cores, node.memory)
+                        ledger.commit()
                         break
 
                     except (NodeResourceError, LinkCapacityError, NoPathFoundError):
-                        pass
+                        ledger.rollback()
 
             # if all virtual nodes have been mapped return the solution
             if set(res_node_mapping) == set(self.virtual.nodes()):
-                self.solution = Solution.build_solution(
+                return Solution.build_solution(
                     self.virtual,
                     self.physical,
                     res_node_mapping,
                     res_link_mapping,
                     check_solution=False,
                 )
-                self.status = Solved
-                return Solved
+            return None
 
-        else:
-            self.status = Infeasible
-            return Infeasible
+        self.solution = self.search_n_machines(
+            place,
+            self.lower_bound(),
+            len(sorted_compute_nodes),
+            search=kwargs.get("search", "linear"),
+        )
+        self.status = Solved if self.solution is not None else Infeasible
+        return self.status
@@ -1,31 +1,282 @@
+import inspect
 import itertools
 import logging
+import weakref
+from collections import defaultdict
 
+import numpy as np
 import pulp
 
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.embedding import EmbedSolver
+from distriopt.embedding.algorithms.greedy import EmbedGreedy
+from distriopt.embedding.algorithms.kbalanced import EmbedBalanced
+from distriopt.embedding.algorithms.partition import EmbedPartition
 from distriopt.embedding.solution import Solution
+from distriopt.sparse import SparseModel
 
 _log = logging.getLogger(__name__)
 
 
+def _walk_path(successors, source, target):
+    """Return the path from source to target as a list of (i, device_id, j), following the links in successors.
+
+    successors maps each physical node to the (node, device_id) pairs reached by the flow. The solver may leave
+    cycles with no cost next to the path: they are skipped by a depth first search which visits each link once.
+    None is returned if target cannot be reached.
+    """
+    path, visited = [], {source}
+    stack = [(source, iter(successors.get(source, ())))]
+    while stack:
+        i, links = stack[-1]
+        if i == target:
+            return path
+        for (j, device_id) in links:
+            if j not in visited:
+                visited.add(j)
+                path.append((i, device_id, j))
+                stack.append((j, iter(successors.get(j, ()))))
+                break
+        else:
+            # dead end, go back to the previous node
+            stack.pop()
+            if path:
+                path.pop()
+    return None
+
+
+# heuristics which can be used to warm start the ILP
+WARM_START_HEURISTICS = {
+    "greedy": EmbedGreedy,
+    "balanced": EmbedBalanced,
+    "partition": EmbedPartition,
+}
+
+
+# substrate templates of each physical network, dropped once the physical network is garbage collected, which
+# requires to clear its cache (see PhysicalNetwork.clear_cache)
+_templates = weakref.WeakKeyDictionary()
+
+
+class SubstrateTemplate(object):
+    """Substrate-only structure of the ILP, shared by all the solves on the same physical network.
+
+    It holds the physical nodes which can host virtual nodes, the classes of identical machines, the physical links
+    which can route virtual links, their indices, capacities and the names of the substrate constraints, so that
+    a solve only adds the rows and the columns depending on the virtual network.
+    """
+
+    def __init__(self, physical, host_nodes, classes, phy_edges):
+        self.host_nodes = host_nodes
+        self.classes = classes
+        self.phy_edges = phy_edges
+
+        # (j, device_id) of the physical links incident to each physical node
+        self.incident_edges = {i: [] for i in host_nodes}
+        for (i, j, device_id) in phy_edges:
+            self.incident_edges.setdefault(i, []).append((j, device_id))
+            self.incident_edges.setdefault(j, []).append((i, device_id))
+        # physical nodes which are either endpoints or intermediate nodes of the paths, hosts first
+        self.flow_nodes = list(self.incident_edges)
+        flow_index = {i: f for f, i in enumerate(self.flow_nodes)}
+        host_index = {i: h for h, i in enumerate(host_nodes)}
+
+        self.host_cores = [physical.cores(i) for i in host_nodes]
+        self.host_memory = [physical.memory(i) for i in host_nodes]
+        self.class_ids = [[host_index[i] for i in members] for members in classes]
+        # endpoints (as indices of flow_nodes) and rates of the physical links
+        self.link_i = np.array(
+            [flow_index[i] for (i, _, _) in phy_edges], dtype=np.int64
+        )
+        self.link_j = np.array(
+            [flow_index[j] for (_, j, _) in phy_edges], dtype=np.int64
+        )
+        self.link_rates = [
+            physical.rate(i, j, device_id) for (i, j, device_id) in phy_edges
+        ]
+
+        # names of the constraints of the PuLP model
+        self.cpu_names = [f"CPU capacity for physical node {i}" for i in host_nodes]
+        self.memory_names = [
+            f"memory capacity for physical node {i}" for i in host_nodes
+        ]
+        self.link_names = [
+            f"link capacity for physical link {i, j, device_id}"
+            for (i, j, device_id) in phy_edges
+        ]
+
+        _log.debug(
+            f"model over {len(host_nodes)} physical nodes and {len(phy_edges)} physical links"
+        )
+
+
 class EmbedILP(EmbedSolver):
     @staticmethod
-    def _get_solver(solver_name, timelimit):
+    def _get_solver(solver_name, timelimit, warm_start=False):
         if solver_name == "cplex":
-            return pulp.CPLEX_PY(msg=0, timeLimit=timelimit)
+            solver_class, options = pulp.CPLEX_PY, dict(msg=0, timeLimit=timelimit)
         elif solver_name == "gurobi":
-            return pulp.GUROBI(msg=0, timeLimit=timelimit)
+            solver_class, options = pulp.GUROBI, dict(msg=0, timeLimit=timelimit)
         elif solver_name == "glpk":
-            return pulp.GLPK(msg=0, options=["--tmlim", str(timelimit)])
+            solver_class, options = (
+                pulp.GLPK,
+                dict(msg=0, options=["--tmlim", str(timelimit)]),
+            )
         elif solver_name == "cbc":
-            return pulp.COIN(msg=0, maxSeconds=timelimit)
+            solver_class, options = pulp.COIN, dict(msg=0, maxSeconds=timelimit)
         elif solver_name == "scip":
-            return pulp.SCIP(msg=0, options=["-c", f"set limits time {timelimit}"])
+            solver_class, options = (
+                pulp.SCIP,
+                dict(msg=0, options=["-c", f"set limits time {timelimit}"]),
+            )
+        else:
+            raise ValueError("Invalid Solver Name")
+
+        # MIP starts are passed only to the solvers supporting them (depending on the version of PuLP): with the
+        # solvers of PuLP 1.6.9 the initial values are ignored and the warm start is a no-op
+        if warm_start and "warmStart" in inspect.signature(solver_class).parameters:
+            options["warmStart"] = True
+        return solver_class(**options)
+
+    def _candidate_edges(self, classes=()):
+        """Return the physical links, as (i, j, device_id), on the candidate paths between compute nodes.
+
+        Candidate paths are the k shortest paths of the path index of the physical network. If classes of
+        identical machines are given, the links of a machine are candidate for all the machines of its class.
+        """
+        compiled = self.physical.compile()
+        compute_nodes = [compiled.names[i] for i in compiled.compute_nodes]
+        pairs = set()
+        for source, target in itertools.combinations(compute_nodes, 2):
+            for path in self.physical.path_index.paths(source, target):
+                for i, j in zip(path, path[1:]):
+                    pairs.add((compiled.names[i], compiled.names[j]))
+                    pairs.add((compiled.names[j], compiled.names[i]))
+        for members in classes:
+            neighbors = set(j for (i, j) in pairs if i in members)
+            for i in members:
+                for j in neighbors:
+                    pairs.add((i, j))
+                    pairs.add((j, i))
+        return [
+            (i, j, device_id)
+            for (i, j, device_id) in self.physical.edges(keys=True)
+            if (i, j) in pairs
+        ]
+
+    def _machine_classes(self, host_nodes):
+        """Return the classes, with at least two members, of identical physical machines.
+
+        Two machines are identical if they have the same cores and memory and the same interfaces (device id and
+        rate) towards the same neighbors, so that swapping them maps a solution to a solution with the same cost.
+        """
+        classes = defaultdict(list)
+        for i in host_nodes:
+            interfaces = sorted(
+                (str(j), str(device_id), self.physical.rate(i, j, device_id))
+                for j in self.physical.neighbors(i)
+                for device_id in self.physical.interfaces_ids(i, j)
+            )
+            classes[
+                (self.physical.cores(i), self.physical.memory(i), tuple(interfaces))
+            ].append(i)
+        return [members for members in classes.values() if len(members) > 1]
+
+    def _break_symmetry(self, solution, classes):
+        """Return the node mapping and the link paths of a solution with the machines of each class relabeled so
+        that the symmetry breaking constraints are satisfied.
+        """
+        index = {u: r for r, u in enumerate(self.virtual.nodes())}
+        first_hosted = defaultdict(lambda: len(index))
+        for u, i in solution.node_mapping.items():
+            first_hosted[i] = min(first_hosted[i], index[u])
+
+        relabel = {}
+        for members in classes:
+            # the machine hosting the virtual node with the smallest index becomes the first one, and so on
+            for i, i_new in zip(sorted(members, key=first_hosted.__getitem__), members):
+                relabel[i] = i_new
+
+        node_mapping = {u: relabel.get(i, i) for u, i in solution.node_mapping.items()}
+        link_path = {
+            (u, v): [
+                (relabel.get(i, i), device_id, relabel.get(j, j))
+                for (i, device_id, j) in path
+            ]
+            for (u, v), path in solution.link_path.items()
+        }
+        return node_mapping, link_path
 
-        raise ValueError("Invalid Solver Name")
+    def _heuristic_solution(self, heuristic):
+        """Run a heuristic and return its solution, None if no solution is found."""
+        try:
+            heuristic_class = WARM_START_HEURISTICS[heuristic]
+        except KeyError:
+            raise ValueError(f"Invalid heuristic {heuristic}")
+
+        prob = heuristic_class(self.virtual, self.physical)
+        time_solution, status = prob.solve()
+        _log.info(f"heuristic {heuristic} status {status} in {time_solution} s")
+        return prob.solution if status == Solved else None
+
+    def _set_initial_values(
+        self, solution, node_mapping, link_mapping, usage=None, classes=()
+    ):
+        """Set the values of the variables to the given solution to be used as a MIP start.
+
+        The values are used only if the solver accepts a MIP start, see _get_solver.
+        """
+        solution_node_mapping, solution_link_path = self._break_symmetry(
+            solution, classes
+        )
+
+        for var in itertools.chain(node_mapping.values(), link_mapping.values()):
+            var.varValue = 0
+        for (u, i) in solution_node_mapping.items():
+            if (u, i) in node_mapping:
+                node_mapping[(u, i)].varValue = 1
+
+        sorted_edges = self.virtual.sorted_edges()
+        for (u, v), path in solution_link_path.items():
+            # paths are oriented from u to v
+            if (u, v) not in sorted_edges:
+                u, v = v, u
+                path = [(j, device_id, i) for (i, device_id, j) in path[::-1]]
+            for (i, device_id, j) in path:
+                # links removed by the presolve leave the start incomplete
+                if (u, v, i, j, device_id) in link_mapping:
+                    link_mapping[(u, v, i, j, device_id)].varValue = 1
+
+        if usage is not None:
+            used = set(solution_node_mapping.values())
+            for i, var in usage.items():
+                var.varValue = 1 if i in used else 0
+
+    def _template(self, presolve, symmetry):
+        """Return the substrate template of the physical network, built at the first solve with these options.
+
+        With presolve, only compute nodes can host virtual nodes and only the links on the candidate paths can
+        route virtual links. With symmetry, the classes of identical machines are computed.
+        """
+        templates = _templates.setdefault(self.physical, {})
+        if (presolve, symmetry) not in templates:
+            if presolve:
+                host_nodes = [
+                    i for i in self.physical.nodes() if i in self.physical.compute_nodes
+                ]
+            else:
+                host_nodes = list(self.physical.nodes())
+            # classes of identical machines, used to break symmetries
+            classes = self._machine_classes(host_nodes) if symmetry else []
+            if presolve:
+                phy_edges = self._candidate_edges(classes)
+            else:
+                phy_edges = list(self.physical.edges(keys=True))
+            templates[(presolve, symmetry)] = SubstrateTemplate(
+                self.physical, host_nodes, classes, phy_edges
+            )
+        return templates[(presolve, symmetry)]
 
     @timeit
     def solve(self, **kwargs):
@@ -33,37 +284,61 @@ class EmbedILP(EmbedSolver):
         obj = kwargs.get("obj", "min_n_machines")
         solver_name = kwargs.get("solver_name", "glpk").lower()
         timelimit = int(kwargs.get("timelimit", "3600"))
+        warm_start = kwargs.get("warm_start", None)
+        presolve = kwargs.get("presolve", False)
+        symmetry = kwargs.get("symmetry", False)
+        # "pulp" builds the model with PuLP expressions, "sparse" directly as a sparse matrix
+        model = kwargs.get("model", "pulp")
+        if model not in ("pulp", "sparse"):
+            raise ValueError(f"Invalid model {model}")
 
         _log.debug(f"called ILP _get_solver with the following parameters: {kwargs}")
 
-        # link mapping variables
-        link_mapping = pulp.LpVariable.dicts(
-            "link_mapping",
-            itertools.chain(
-                *(
-                    ((u, v, i, j, device_id), (u, v, j, i, device_id))
-                    for (u, v) in self.virtual.sorted_edges()
-                    for (i, j, device_id) in self.physical.edges(keys=True)
-                )
-            ),
-            lowBound=0,
-            upBound=1,
-            cat=pulp.LpContinuous
-            if self.physical.grouped_interfaces
-            else pulp.LpBinary,
+        if model == "sparse":
+            # the solver runs in the background until it exits or until the target gap or the deadline is reached
+            run = self.start(**dict(kwargs, warm_start=warm_start))
+            run.wait(kwargs.get("target_gap"), kwargs.get("deadline"))
+            return self.status
+
+        # solution of the heuristic used as a MIP start and as an upper bound on the number of machines
+        heuristic_solution = (
+            self._heuristic_solution(warm_start) if warm_start is not None else None
         )
+        template = self._template(presolve, symmetry)
+        host_nodes, classes, phy_edges = (
+            template.host_nodes,
+            template.classes,
+            template.phy_edges,
+        )
+        incident_edges = template.incident_edges
+
+        # link mapping variables, named after the indices of the virtual and of the physical link
+        link_category = (
+            pulp.LpContinuous if self.physical.grouped_interfaces else pulp.LpBinary
+        )
+        link_mapping = {}
+        for e, (u, v) in enumerate(self.virtual.sorted_edges()):
+            for p, (i, j, device_id) in enumerate(phy_edges):
+                link_mapping[(u, v, i, j, device_id)] = pulp.LpVariable(
+                    f"link_mapping_{e}_{p}_0", 0, 1, link_category
+                )
+                link_mapping[(u, v, j, i, device_id)] = pulp.LpVariable(
+                    f"link_mapping_{e}_{p}_1", 0, 1, link_category
+                )
 
         # node mapping variables
         node_mapping = pulp.LpVariable.dicts(
             "node_mapping",
-            ((u, i) for u in self.virtual.nodes() for i in self.physical.nodes()),
+            ((u, i) for u in self.virtual.nodes() for i in host_nodes),
             cat=pulp.LpBinary,
         )
 
         # problem definition
         mapping_ILP = pulp.LpProblem("Mapping ILP", pulp.LpMinimize)
         # get _get_solver
-        solver = self._get_solver(solver_name, timelimit)
+        solver = self._get_solver(
+            solver_name, timelimit, warm_start=heuristic_solution is not None
+        )
         # set _get_solver
         mapping_ILP.setSolver(solver)
 
@@ -74,16 +349,29 @@ class EmbedILP(EmbedSolver):
         elif obj == "min_n_machines":
             # define variables to keep track of the number of machines used
             usage_phy_machine = pulp.LpVariable.dicts(
-                "usage", [i for i in self.physical.nodes()], cat=pulp.LpBinary
+                "usage", host_nodes, cat=pulp.LpBinary
             )
             # set objective
-            mapping_ILP += pulp.lpSum(
-                usage_phy_machine[i] for i in self.physical.nodes()
-            )
+            mapping_ILP += pulp.lpSum(usage_phy_machine[i] for i in host_nodes)
             # a machine is used if at least a virtual node is mapped on it
-            for i in self.physical.nodes():
-                for u in self.virtual.nodes():
-                    mapping_ILP += usage_phy_machine[i] >= node_mapping[(u, i)]
+            if presolve:
+                # a single constraint per machine
+                for i in host_nodes:
+                    mapping_ILP += (
+                        pulp.lpSum(node_mapping[(u, i)] for u in self.virtual.nodes())
+                        <= self.virtual.number_of_nodes() * usage_phy_machine[i]
+                    )
+            else:
+                for i in host_nodes:
+                    for u in self.virtual.nodes():
+                        mapping_ILP += usage_phy_machine[i] >= node_mapping[(u, i)]
+            # cutoff, solutions must not use more machines than the heuristic
+            if heuristic_solution is not None:
+                mapping_ILP += (
+                    pulp.lpSum(usage_phy_machine[i] for i in host_nodes)
+                    <= heuristic_solution.n_machines_used,
+                    "cutoff on the number of machines used",
+                )
         # Case 3: minimize used bandwidth
         elif obj == "min_bw":
             mapping_ILP += pulp.lpSum(
@@ -93,26 +381,26 @@ class EmbedILP(EmbedSolver):
                     + link_mapping[(u, v, j, i, device_id)]
                 )
                 for (u, v) in self.virtual.sorted_edges()
-                for (i, j, device_id) in self.physical.edges(keys=True)
+                for (i, j, device_id) in phy_edges
             )
 
         # Assignment of virtual nodes to physical nodes
         for u in self.virtual.nodes():
             mapping_ILP += (
-                pulp.lpSum(node_mapping[(u, i)] for i in self.physical.nodes()) == 1,
+                pulp.lpSum(node_mapping[(u, i)] for i in host_nodes) == 1,
                 f"assignment of {u} to a physical node",
             )
 
         # Node capacity constraints
-        for i in self.physical.nodes():
+        for h, i in enumerate(host_nodes):
             # CPU limit
             mapping_ILP += (
                 pulp.lpSum(
                     self.virtual.req_cores(u) * node_mapping[(u, i)]
                     for u in self.virtual.nodes()
                 )
-                <= self.physical.cores(i),
-                f"CPU capacity for physical node {i}",
+                <= template.host_cores[h],
+                template.cpu_names[h],
             )
             # Memory limit
             mapping_ILP += (
@@ -120,31 +408,46 @@ class EmbedILP(EmbedSolver):
                     self.virtual.req_memory(u) * node_mapping[(u, i)]
                     for u in self.virtual.nodes()
                 )
-                <= self.physical.memory(i),
-                f"memory capacity for physical node {i}",
+                <= template.host_memory[h],
+                template.memory_names[h],
             )
 
+        # Symmetry breaking for identical machines: within a class, the machines used are the first ones and
+        # the r-th virtual node can only be mapped on one of the first r+1 machines
+        for members in classes:
+            if obj == "min_n_machines":
+                for i, i_next in zip(members, members[1:]):
+                    mapping_ILP += (
+                        usage_phy_machine[i] >= usage_phy_machine[i_next],
+                        f"usage order of identical physical nodes {i, i_next}",
+                    )
+            for r, u in enumerate(self.virtual.nodes()):
+                for i in members[r + 1 :]:
+                    node_mapping[(u, i)].upBound = 0
+
         # Max latency for a virtual link in the substrate network
         # @todo to be added
 
+        # physical nodes which are either endpoints or intermediate nodes of the paths
+        flow_nodes = template.flow_nodes
+
         # Bandwidth conservation
         for (u, v) in self.virtual.sorted_edges():
-            for i in self.physical.nodes():
+            for i in flow_nodes:
                 mapping_ILP += (
                     pulp.lpSum(
                         (
                             link_mapping[(u, v, i, j, device_id)]
                             - link_mapping[(u, v, j, i, device_id)]
                         )
-                        for j in self.physical.neighbors(i)
-                        for device_id in self.physical.interfaces_ids(i, j)
+                        for (j, device_id) in incident_edges[i]
                     )
-                    == (node_mapping[(u, i)] - node_mapping[(v, i)]),
+                    == (node_mapping.get((u, i), 0) - node_mapping.get((v, i), 0)),
                     f"flow conservation on physical node {i} for virtual link {u, v}",
                 )
 
         # Link capacity
-        for (i, j, device_id) in self.physical.edges(keys=True):
+        for p, (i, j, device_id) in enumerate(phy_edges):
             mapping_ILP += (
                 pulp.lpSum(
                     self.virtual.req_rate(u, v)
@@ -154,19 +457,18 @@ class EmbedILP(EmbedSolver):
                     )
                     for (u, v) in self.virtual.sorted_edges()
                 )
-                <= self.physical.rate(i, j, device_id),
-                f"link capacity for physical link {i, j, device_id}",
+                <= template.link_rates[p],
+                template.link_names[p],
             )
 
         # Given a virtual link a physical machine the rate that goes out from the physical machine to an interface_name
         # or that comes in to the physical machine from an interface_name is at most 1
         for (u, v) in self.virtual.sorted_edges():
-            for i in self.physical.nodes():
+            for i in flow_nodes:
                 mapping_ILP += (
                     pulp.lpSum(
                         link_mapping[(u, v, i, j, device_id)]
-                        for j in self.physical.neighbors(i)
-                        for device_id in self.physical.interfaces_ids(i, j)
+                        for (j, device_id) in incident_edges[i]
                     )
                     <= 1,
                     f"virtual link {u, v} can use only a network interface_name to going out from physical node {i}",
@@ -174,8 +476,7 @@ class EmbedILP(EmbedSolver):
                 mapping_ILP += (
                     pulp.lpSum(
                         link_mapping[(u, v, j, i, device_id)]
-                        for j in self.physical.neighbors(i)
-                        for device_id in self.physical.interfaces_ids(i, j)
+                        for (j, device_id) in incident_edges[i]
                     )
                     <= 1,
                     f"virtual link {u, v} can use only a network interface_name to reach physical node {i}",
@@ -183,7 +484,7 @@ class EmbedILP(EmbedSolver):
 
         # A link can be used only in a direction
         for (u, v) in self.virtual.sorted_edges():
-            for (i, j, device_id) in self.physical.edges(keys=True):
+            for (i, j, device_id) in phy_edges:
                 mapping_ILP += (
                     link_mapping[(u, v, i, j, device_id)]
                     + link_mapping[(u, v, j, i, device_id)]
@@ -191,6 +492,15 @@ class EmbedILP(EmbedSolver):
                     f"{u, v} can be mapped to a single direction of physical node {i, j, device_id}",
                 )
 
+        if heuristic_solution is not None:
+            self._set_initial_values(
+                heuristic_solution,
+                node_mapping,
+                link_mapping,
+                usage_phy_machine if obj == "min_n_machines" else None,
+                classes,
+            )
+
         # solve the ILP
         status = pulp.LpStatus[mapping_ILP.solve()]
 
@@ -202,20 +512,33 @@ class EmbedILP(EmbedSolver):
             self.current_val = 0
 
         # check status
-        if status == "Infeasible":
-            self.status = Infeasible
-            return Infeasible
-        elif (status == "Not Solved" or status == "Undefined") and (
-            not pulp.value(mapping_ILP.objective)
-            or pulp.value(mapping_ILP.objective) < 1.1
+        if status == "Infeasible" or (
+            (status == "Not Solved" or status == "Undefined")
+            and (
+                not pulp.value(mapping_ILP.objective)
+                or pulp.value(mapping_ILP.objective) < 1.1
+            )
         ):
             # @todo check specific _get_solver status
+            if heuristic_solution is not None:
+                # the solver did not improve the heuristic solution in the time limit, or the presolved model
+                # does not contain the heuristic solution
+                self.solution = heuristic_solution
+                self.status = Solved
+                return Solved
+            # the presolve drops physical nodes and links, the instance may be feasible without them
+            if status == "Infeasible" and not presolve:
+                self.status = Infeasible
+                return Infeasible
             self.status = NotSolved
             return NotSolved
 
         # build solution from variables values
         res_node_mapping, res_link_mapping = self._build_ILP_solution(
-            self.virtual, self.physical, node_mapping, link_mapping
+            self.virtual,
+            self.physical,
+            {key: var.varValue for key, var in node_mapping.items()},
+            {key: var.varValue for key, var in link_mapping.items()},
         )
         # if interfaces have been grouped, map to solution to the original network
         self.solution = Solution.build_solution(
@@ -224,61 +547,256 @@ class EmbedILP(EmbedSolver):
         self.status = Solved
         return Solved
 
+    def _build_sparse_model(self, obj, heuristic_solution, template, presolve):
+        """Build the model of solve directly as a sparse matrix over the substrate template.
+
+        Return the SparseModel and a function building the Solution from the values of its variables.
+        """
+        host_nodes, phy_edges = template.host_nodes, template.phy_edges
+        link_i, link_j = template.link_i, template.link_j
+        nodes = list(self.virtual.nodes())
+        node_index = {u: r for r, u in enumerate(nodes)}
+        edges = sorted(self.virtual.sorted_edges())
+
+        n_v, n_h, n_e = len(nodes), len(host_nodes), len(edges)
+        n_p, n_f = len(phy_edges), len(template.flow_nodes)
+        edge_src = np.array([node_index[u] for (u, _) in edges], dtype=np.int64)
+        edge_dst = np.array([node_index[v] for (_, v) in edges], dtype=np.int64)
+        rates = np.array([self.virtual.req_rate(u, v) for (u, v) in edges], dtype=float)
+
+        model = SparseModel("Mapping_ILP")
+
+        # link mapping variables, indexed by (virtual link, physical link, direction): 0 from i to j, 1 from j to i
+        link_vars = model.add_variables(
+            n_e * n_p * 2,
+            upper=1,
+            integer=not self.physical.grouped_interfaces,
+            cost=np.repeat(rates, n_p * 2) if obj == "min_bw" else 0,
+        ).reshape(n_e, n_p, 2)
+        forward, backward = link_vars[:, :, 0].ravel(), link_vars[:, :, 1].ravel()
+        # node mapping variables, indexed by (virtual node, host)
+        node_vars = model.add_variables(n_v * n_h, upper=1, integer=True).reshape(
+            n_v, n_h
+        )
+        if obj == "no_obj":
+            model.add_variables(1, lower=1, upper=1)
+        elif obj == "min_n_machines":
+            usage = model.add_variables(n_h, upper=1, integer=True, cost=1)
+            # a machine is used if at least a virtual node is mapped on it
+            if presolve:
+                model.add_constraints(
+                    np.concatenate([np.tile(np.arange(n_h), n_v), np.arange(n_h)]),
+                    np.concatenate([node_vars.ravel(), usage]),
+                    np.concatenate([np.ones(n_v * n_h), np.full(n_h, -n_v)]),
+                    "L",
+                    np.zeros(n_h),
+                )
+            else:
+                model.add_constraints(
+                    np.tile(np.arange(n_v * n_h), 2),
+                    np.concatenate([node_vars.ravel(), np.tile(usage, n_v)]),
+                    np.repeat([1, -1], n_v * n_h),
+                    "L",
+                    np.zeros(n_v * n_h),
+                )
+            # cutoff, solutions must not use more machines than the heuristic
+            if heuristic_solution is not None:
+                model.add_constraints(
+                    np.zeros(n_h), usage, 1, "L", heuristic_solution.n_machines_used
+                )
+
+        # Assignment of virtual nodes to physical nodes
+        model.add_constraints(
+            np.repeat(np.arange(n_v), n_h), node_vars.ravel(), 1, "E", np.ones(n_v)
+        )
+
+        # Node capacity constraints
+        for demands, capacities in (
+            ([self.virtual.req_cores(u) for u in nodes], template.host_cores),
+            ([self.virtual.req_memory(u) for u in nodes], template.host_memory),
+        ):
+            model.add_constraints(
+                np.tile(np.arange(n_h), n_v),
+                node_vars.ravel(),
+                np.repeat(demands, n_h),
+                "L",
+                capacities,
+            )
+
+        # Symmetry breaking for identical machines (see solve)
+        fixed = []
+        for members in template.class_ids:
+            if obj == "min_n_machines":
+                model.add_constraints(
+                    np.repeat(np.arange(len(members) - 1), 2),
+                    np.stack([usage[members[:-1]], usage[members[1:]]], axis=1).ravel(),
+                    np.tile([1, -1], len(members) - 1),
+                    "G",
+                    np.zeros(len(members) - 1),
+                )
+            fixed.extend(node_vars[r, members[r + 1 :]] for r in range(n_v))
+        if fixed:
+            model.set_upper_bounds(np.concatenate(fixed), 0)
+
+        # rows of the constraints indexed by (virtual link, flow node) for the two endpoints of each physical link
+        edge_ids = np.repeat(np.arange(n_e), n_p)
+        rows_i = edge_ids * n_f + np.tile(link_i, n_e)
+        rows_j = edge_ids * n_f + np.tile(link_j, n_e)
+        rows_host = np.repeat(np.arange(n_e), n_h) * n_f + np.tile(np.arange(n_h), n_e)
+
+        # Bandwidth conservation
+        model.add_constraints(
+            np.concatenate([rows_i, rows_j, rows_j, rows_i, rows_host, rows_host]),
+            np.concatenate(
+                [
+                    forward,
+                    forward,
+                    backward,
+                    backward,
+                    node_vars[edge_src].ravel(),
+                    node_vars[edge_dst].ravel(),
+                ]
+            ),
+            np.repeat([1, -1, 1, -1, -1, 1], [n_e * n_p] * 4 + [n_e * n_h] * 2),
+            "E",
+            np.zeros(n_e * n_f),
+        )
+
+        # Link capacity
+        link_rows = np.tile(np.arange(n_p), n_e)
+        model.add_constraints(
+            np.concatenate([link_rows, link_rows]),
+            np.concatenate([forward, backward]),
+            np.tile(np.repeat(rates, n_p), 2),
+            "L",
+            template.link_rates,
+        )
+
+        # A virtual link uses at most an interface to leave and to reach each physical node
+        model.add_constraints(
+            np.concatenate([rows_i, rows_j]),
+            np.concatenate([forward, backward]),
+            1,
+            "L",
+            np.ones(n_e * n_f),
+        )
+        model.add_constraints(
+            np.concatenate([rows_j, rows_i]),
+            np.concatenate([forward, backward]),
+            1,
+            "L",
+            np.ones(n_e * n_f),
+        )
+
+        # A link can be used only in a direction
+        model.add_constraints(
+            np.tile(np.arange(n_e * n_p), 2),
+            np.concatenate([forward, backward]),
+            1,
+            "L",
+            np.ones(n_e * n_p),
+        )
+
+        def build_solution(values):
+            # only the nonzero variables are read
+            node_values = {}
+            for k in np.flatnonzero(values[node_vars.ravel()] > 0.5).tolist():
+                node_values[(nodes[k // n_h], host_nodes[k % n_h])] = 1
+            link_values = {}
+            for k in np.flatnonzero(values[link_vars.ravel()] > 0.99).tolist():
+                e, p, direction = k // (n_p * 2), k // 2 % n_p, k % 2
+                (u, v), (i, j, device_id) = edges[e], phy_edges[p]
+                if direction:
+                    i, j = j, i
+                link_values[(u, v, i, j, device_id)] = 1
+
+            res_node_mapping, res_link_mapping = self._build_ILP_solution(
+                self.virtual, self.physical, node_values, link_values
+            )
+            return Solution.build_solution(
+                self.virtual, self.physical, res_node_mapping, res_link_mapping
+            )
+
+        return model, build_solution
+
+    def start(self, **kwargs):
+        """Start solving the ILP, built as a sparse matrix, in the background and return the SolverRun.
+
+        The parameters are the ones of solve, only the solvers "cbc" and "glpk" are supported. The solution of the
+        heuristic warm_start ("greedy" by default) is used as a cutoff and is available right away in solution: it is
+        replaced by the solution of the solver, if better, when the solver exits. While the solver is running, the
+        run gives the objective value of the best solution found (incumbent), the bound and the gap, and can be
+        stopped. Once the solver exits, current_val is the bound.
+        """
+        obj = kwargs.get("obj", "min_n_machines")
+        solver_name = kwargs.get("solver_name", "glpk").lower()
+        timelimit = int(kwargs.get("timelimit", "3600"))
+        warm_start = kwargs.get("warm_start", "greedy")
+        presolve = kwargs.get("presolve", False)
+        symmetry = kwargs.get("symmetry", False)
+
+        heuristic_solution = (
+            self._heuristic_solution(warm_start) if warm_start is not None else None
+        )
+        model, build_solution = self._build_sparse_model(
+            obj, heuristic_solution, self._template(presolve, symmetry), presolve
+        )
+
+        self.solution = heuristic_solution
+        self.status = Solved if heuristic_solution is not None else NotSolved
+        self.current_val = 0
+
+        def finish(run):
+            self.current_val = run.bound if run.bound is not None else 0
+            if model.values is not None:
+                if heuristic_solution is None or model.objective_value < (
+                    self._objective_value(heuristic_solution, obj)
+                ):
+                    self.solution = build_solution(model.values)
+                self.status = Solved
+            elif (
+                model.status == "Infeasible"
+                and heuristic_solution is None
+                and not presolve
+            ):
+                self.status = Infeasible
+
+        return model.start(
+            solver_name,
+            timelimit,
+            incumbent=(
+                self._objective_value(heuristic_solution, obj)
+                if heuristic_solution is not None
+                else None
+            ),
+            callback=finish,
+        )
+
     @staticmethod
-    def _build_ILP_solution(virtual, physical, node_mapping, link_mapping):
+    def _build_ILP_solution(virtual, physical, node_values, link_values):
         """Build an assignment of virtual nodes and virtual links starting from the values of the variables in the ILP
+
+        The values are given as dicts indexed as the variables and are read in a single pass, then the path of each
+        virtual link is rebuilt in order by walking the physical links it uses from the host of its source to the
+        host of its destination.
         """
-        res_node_mapping = {}
-        res_link_mapping = {}
         # mapping for the virtual nodes
-        for virtual_node in virtual.nodes():
-            res_node_mapping[virtual_node] = next(
-                (
-                    physical_node
-                    for physical_node in physical.nodes()
-                    if node_mapping[(virtual_node, physical_node)].varValue > 0
-                ),
-                None,
-            )
+        res_node_mapping = dict.fromkeys(virtual.nodes())
+        for (virtual_node, physical_node), value in node_values.items():
+            if res_node_mapping[virtual_node] is None and (value or 0) > 0.5:
+                res_node_mapping[virtual_node] = physical_node
+
+        # physical links used by each virtual link, in the direction of the flow
+        successors = defaultdict(lambda: defaultdict(list))
+        for (u, v, i, j, device_id), value in link_values.items():
+            if (value or 0) > 0.99:
+                successors[(u, v)][i].append((j, device_id))
+
         # mapping for the virtual links
+        res_link_mapping = {}
         for (u, v) in virtual.sorted_edges():
             if res_node_mapping[u] != res_node_mapping[v]:
-                s_node, d_node = res_node_mapping[u], res_node_mapping[v]
-                # source of the virtual link
-                source = next(
-                    (
-                        (s_node, device_id, j)
-                        for j in physical.neighbors(s_node)
-                        for device_id in physical.interfaces_ids(s_node, j)
-                        if link_mapping[(u, v, s_node, j, device_id)].varValue
-                        + link_mapping[(u, v, j, s_node, device_id)].varValue
-                        > 0.99
-                    ),
-                    None,
-                )
-                # destination of the virtual link
-                dest = next(
-                    (
-                        (j, device_id, d_node)
-                        for j in physical.neighbors(d_node)
-                        for device_id in physical.interfaces_ids(d_node, j)
-                        if link_mapping[(u, v, d_node, j, device_id)].varValue
-                        + link_mapping[(u, v, j, d_node, device_id)].varValue
-                        > 0.99
-                    ),
-                    None,
+                res_link_mapping[(u, v)] = _walk_path(
+                    successors[(u, v)], res_node_mapping[u], res_node_mapping[v]
                 )
-                # intermediary nodes in the path
-                # @todo - intemediate nodes may be in the wrong order -> build the full path
-                inter = [
-                    (i, device_id, j)
-                    for (i, j, device_id) in physical.edges(keys=True)
-                    if i not in (s_node, d_node)
-                    and j not in (s_node, d_node)
-                    and link_mapping[(u, v, i, j, device_id)].varValue
-                    + link_mapping[(u, v, j, i, device_id)].varValue
-                    > 0.99
-                ]
-
-                res_link_mapping[(u, v)] = [source] + inter + [dest]
         return res_node_mapping, res_link_mapping
@@ -1,68 +1,109 @@
+import functools
 import logging
 import math
-from collections import defaultdict
+import threading
+from collections import OrderedDict
 
 from networkx.algorithms.community.kernighan_lin import kernighan_lin_bisection
 
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.embedding import EmbedSolver
+from distriopt.embedding.algorithms.multilevel import multilevel_partition
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.paths import get_path_engine
 from distriopt.embedding.solution import Solution
 
 _log = logging.getLogger(__name__)
 
 
-class GetPartitions(object):
-    """Callable object."""
-
-    def __init__(self):
-        # to keep track of the already computed partitions
-        self._cache = {}
+class PartitionTree(object):
+    """Recursive Kernighan-Lin bisections of a graph.
 
-    def __call__(self, g, n_partitions):
-        """Given the graph G and the number of partitions k, returns a list with k sets of nodes."""
+    The bisection of each set of nodes is computed the first time it is needed and kept in the tree, so that
+    the partitions for any number of partitions are cut from the same hierarchy.
+    """
 
-        def _iterative_cutting(g, p):
-            """helper function (iterative version)"""
+    def __init__(self, g):
+        self.g = g
+        self.root = frozenset(g.nodes())
+        # set of nodes -> its two halves
+        self.children = {}
+        self.lock = threading.Lock()
 
-            to_be_processed = [g]
-            K = math.ceil(len(g.nodes()) / p)
+    def _bisect(self, nodes):
+        if nodes not in self.children:
+            g_l, g_r = kernighan_lin_bisection(self.g.subgraph(nodes), weight="rate")
+            self.children[nodes] = frozenset(g_l), frozenset(g_r)
+        return self.children[nodes]
 
-            res = []
-            while len(to_be_processed) > 0:
+    def _cut(self, nodes, p, res):
+        k = math.ceil(len(nodes) / p)
+        for partition in self._bisect(nodes):
+            if len(partition) > k:
+                self._cut(partition, p / 2, res)
+            else:
+                res.append(set(partition))
+        return res
 
-                g = to_be_processed.pop()
-                g_l, g_r = kernighan_lin_bisection(g, weight="rate")
+    def cut(self, n_partitions):
+        """Return the partitions obtained by bisecting the sets of nodes larger than |V| / n_partitions.
 
-                for partition in g_l, g_r:
-                    if len(partition) > K:
-                        to_be_processed.append(g.subgraph(partition))
-                    else:
-                        res.append(partition)
-            return res
+        The threshold is halved at each level of the tree.
+        """
+        with self.lock:
+            return self._cut(self.root, n_partitions, [])
 
-        def _recursive_cutting(g, p, res=[]):
-            """helper function (recursive version)"""
-            k = math.ceil(len(g.nodes()) / p)
-            g_l, g_r = kernighan_lin_bisection(g, weight="rate")
 
-            for partition in g_l, g_r:
-                if len(partition) > k:
-                    _recursive_cutting(g.subgraph(partition), p / 2, res)
-                else:
-                    res.append(partition)
+class GetPartitions(object):
+    """Callable object.
+
+    The partition trees of the max_graphs graphs used most recently are kept. Graphs with the same nodes and
+    the same weighted edges share their tree. The cache can be used by concurrent threads.
+    """
+
+    def __init__(self, max_graphs=32):
+        self.max_graphs = max_graphs
+        # fingerprint of the graph -> partition tree, least recently used first
+        self._trees = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def fingerprint(g):
+        """Return a key identifying the nodes and the weighted edges of a graph."""
+        return (
+            frozenset(g.nodes()),
+            frozenset(
+                (frozenset((u, v)), rate)
+                for (u, v, rate) in g.edges(data="rate", default=1)
+            ),
+        )
 
-            return res
+    def tree(self, g):
+        """Return the partition tree of the graph g."""
+        key = self.fingerprint(g)
+        with self._lock:
+            if key in self._trees:
+                self._trees.move_to_end(key)
+            else:
+                # the graph may be modified by the caller
+                self._trees[key] = PartitionTree(g.copy())
+                if len(self._trees) > self.max_graphs:
+                    self._trees.popitem(last=False)
+            return self._trees[key]
+
+    def __call__(self, g, n_partitions, partitioner="kl"):
+        """Given the graph G and the number of partitions k, returns a list with k sets of nodes.
+
+        Partitions are computed either by recursive Kernighan-Lin bisections (partitioner="kl")
+        or by the multilevel scheme (partitioner="multilevel").
+        """
+        if partitioner == "multilevel":
+            return multilevel_partition(g, n_partitions)
+        elif partitioner != "kl":
+            raise ValueError(f"Invalid partitioner {partitioner}")
 
-        # when computing a partitioning for the graph nodes,
-        # if result is known for a smaller value of n_partitions
-        # don't restart from scratch but use it as an initial value
-        if g not in self._cache or len(self._cache[g]) < n_partitions:
-            self._cache.clear()
-            partitions = _recursive_cutting(g, p=n_partitions)
-            self._cache[g] = partitions[:]
-        else:
-            partitions = self._cache[g][:]
+        partitions = self.tree(g).cut(n_partitions)
 
         # merge small partitions to return the required number of partitions
         while len(partitions) > n_partitions:
@@ -77,99 +118,116 @@ get_partitions = GetPartitions()
 
 
 class EmbedBalanced(EmbedSolver):
-    @timeit
-    def solve(self, **kwargs):
-        """Heuristic based on computing a k-balanced partitions of virtual nodes for then mapping the partition
-           on a subset of the physical nodes.
-        """
-
-        sorted_compute_nodes = sorted(
-            self.physical.compute_nodes,
-            key=lambda x: self.physical.cores(x) * 1000 + self.physical.memory(x),
-            reverse=True,
+    def _place(
+        self, n_partitions_to_try, sorted_compute_nodes, path_engine, partitioner
+    ):
+        """Return a solution using n_partitions_to_try physical nodes, None if not found."""
+        compact = self.virtual.compact()
+
+        # partitioning of virtual nodes in n_partitions_to_try partitions
+        k_partition = get_partitions(
+            self.virtual.g, n_partitions=n_partitions_to_try, partitioner=partitioner
         )
 
-        for n_partitions_to_try in range(
-            self.lower_bound(), len(sorted_compute_nodes) + 1
-        ):
-
-            # partitioning of virtual nodes in n_partitions_to_try partitions
-            k_partition = get_partitions(
-                self.virtual.g, n_partitions=n_partitions_to_try
+        # subset of hosts of size n_partitions_to_try
+        chosen_physical = sorted_compute_nodes[:n_partitions_to_try]
+
+        #
+        # check if the partitioning is a feasible solution
+        #
+        # keep track of the physical resources used, attempts are independent of each other
+        ledger = ResidualLedger(self.physical)
+        try:
+            # resources required by each partition
+            cores_load, memory_load = compact.partition_loads(
+                compact.assignment(k_partition), len(k_partition)
             )
 
-            # subset of hosts of size n_partitions_to_try
-            chosen_physical = sorted_compute_nodes[:n_partitions_to_try]
+            # virtual nodes to physical nodes assignment
+            res_node_mapping = {}
+
+            # iterate over each pair (physical_node i, virtual nodes assigned to i)
+            for physical_node, assigned_virtual_nodes, cores, memory in zip(
+                chosen_physical, k_partition, cores_load, memory_load
+            ):
+                # check if node resources are not exceeded:
+                ledger.add_node(physical_node, cores, memory)
+                # cpu cores
+                if ledger.residual_cores(physical_node) < 0:
+                    raise NodeResourceError(physical_node, "cpu cores")
+                # memory
+                if ledger.residual_memory(physical_node) < 0:
+                    raise NodeResourceError(physical_node, "memory")
+                # assign the virtual nodes to a physical node
+                for virtual_node in assigned_virtual_nodes:
+                    res_node_mapping[virtual_node] = physical_node
 
             #
-            # check if the partitioning is a feasible solution
+            # virtual links to physical links assignment
             #
-            try:
-                # virtual nodes to physical nodes assignment
-                res_node_mapping = {}
-
-                # iterate over each pair (physical_node i, virtual nodes assigned to i)
-                for physical_node, assigned_virtual_nodes in zip(
-                    chosen_physical, k_partition
-                ):
-                    # keep track of the node physical resources used
-                    cores_used = memory_used = 0
-                    # check if node resources are not exceeded:
-                    for virtual_node in assigned_virtual_nodes:
-                        # cpu cores
-                        cores_used += self.virtual.req_cores(virtual_node)
-                        if self.physical.cores(physical_node) < cores_used:
-                            raise NodeResourceError(physical_node, "cpu cores")
-                        # memory
-                        memory_used += self.virtual.req_memory(virtual_node)
-                        if self.physical.memory(physical_node) < memory_used:
-                            raise NodeResourceError(physical_node, "memory")
-                        # assign the virtual nodes to a physical node
-                        res_node_mapping[virtual_node] = physical_node
-
-                #
-                # virtual links to physical links assignment
-                #
-                res_link_mapping = {}
-                rate_used = defaultdict(int)
-
-                # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
-                for (u, v) in (
-                    (u, v)
-                    for (u, v) in self.virtual.sorted_edges()
-                    if res_node_mapping[u] != res_node_mapping[v]
+            res_link_mapping = {}
+
+            # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
+            for (u, v) in (
+                (u, v)
+                for (u, v) in self.virtual.sorted_edges()
+                if res_node_mapping[u] != res_node_mapping[v]
+            ):
+
+                res_link_mapping[(u, v)] = []
+
+                # physical nodes on which u and v have been placed
+                phy_u, phy_v = res_node_mapping[u], res_node_mapping[v]
+
+                # for each link in the physical path
+                for (i, j, device_id) in self.physical.find_path(
+                    phy_u,
+                    phy_v,
+                    req_rate=self.virtual.req_rate(u, v),
+                    used_rate=ledger.rate_used,
+                    engine=path_engine,
                 ):
+                    # else update the rate
+                    ledger.add_rate(i, j, device_id, self.virtual.req_rate(u, v))
+
+                    res_link_mapping[(u, v)].append((i, device_id, j))
+
+            # build solution from the output
+            return Solution.build_solution(
+                self.virtual, self.physical, res_node_mapping, res_link_mapping
+            )
+
+        except (NodeResourceError, NoPathFoundError):
+            # unfeasible, increase the number of partitions to be used
+            return None
+
+    @timeit
+    def solve(self, **kwargs):
+        """Heuristic based on computing a k-balanced partitions of virtual nodes for then mapping the partition
+           on a subset of the physical nodes.
+        """
+        path_engine = get_path_engine(kwargs.get("path_engine", "bfs"))
+        partitioner = kwargs.get("partitioner", "kl")
 
-                    res_link_mapping[(u, v)] = []
-
-                    # physical nodes on which u and v have been placed
-                    phy_u, phy_v = res_node_mapping[u], res_node_mapping[v]
-
-                    # for each link in the physical path
-                    for (i, j, device_id) in self.physical.find_path(
-                        phy_u,
-                        phy_v,
-                        req_rate=self.virtual.req_rate(u, v),
-                        used_rate=rate_used,
-                    ):
-                        # else update the rate
-                        rate_used[(i, j, device_id)] += self.virtual.req_rate(u, v)
-
-                        res_link_mapping[(u, v)].append((i, device_id, j))
-
-                # build solution from the output
-                self.solution = Solution.build_solution(
-                    self.virtual, self.physical, res_node_mapping, res_link_mapping
-                )
-                self.status = Solved
-                return Solved
-
-            except (NodeResourceError, NoPathFoundError):
-                # unfeasible, increase the number of partitions to be used
-                pass
-        else:
-            self.status = Infeasible
-            return Infeasible
+        compiled = self.physical.compile()
+        sorted_compute_nodes = compiled.sorted_compute_nodes(
+            compiled.cores * 1000 + compiled.memory
+        )
+
+        self.solution = self.search_n_machines(
+            functools.partial(
+                self._place,
+                sorted_compute_nodes=sorted_compute_nodes,
+                path_engine=path_engine,
+                partitioner=partitioner,
+            ),
+            self.lower_bound(),
+            len(sorted_compute_nodes),
+            search=kwargs.get("search", "linear"),
+            n_jobs=kwargs.get("n_jobs", 1),
+        )
+        self.status = Solved if self.solution is not None else Infeasible
+        return self.status
 
 
 if __name__ == "__main__":
@@ -0,0 +1,147 @@
+"""
+Randomized min cut based on Karger's contraction algorithm [1] and on its recursive variant by Karger and Stein [2].
+Several independent trials can be run, possibly in a pool of processes, and the best cut is kept.
+
+[1] D. Karger "Global Min-cuts in RNC and Other Ramifications of a Simple Mincut Algorithm".
+Proc. 4th Annual ACM-SIAM Symposium on Discrete Algorithms 1993.
+[2] D. Karger, C. Stein "A New Approach to the Minimum Cut Problem". Journal of the ACM 1996.
+"""
+import logging
+import math
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+
+class UnionFind(object):
+    """Disjoint sets over the integers 0..n-1 with union by rank and path compression."""
+
+    def __init__(self, n):
+        self.parents = list(range(n))
+        self.ranks = [0] * n
+        self.n_sets = n
+
+    def find(self, u):
+        root = u
+        while self.parents[root] != root:
+            root = self.parents[root]
+        # path compression
+        while self.parents[u] != root:
+            self.parents[u], u = root, self.parents[u]
+        return root
+
+    def union(self, u, v):
+        """Merge the sets containing u and v, return False if they are already in the same set."""
+        u_root, v_root = self.find(u), self.find(v)
+        if u_root == v_root:
+            return False
+        if self.ranks[u_root] < self.ranks[v_root]:
+            u_root, v_root = v_root, u_root
+        self.parents[v_root] = u_root
+        if self.ranks[u_root] == self.ranks[v_root]:
+            self.ranks[u_root] += 1
+        self.n_sets -= 1
+        return True
+
+    def labels(self):
+        """Return an array with the index (from 0 to n_sets-1) of the set of each element."""
+        roots = np.array([self.find(u) for u in range(len(self.parents))])
+        return np.unique(roots, return_inverse=True)[1]
+
+
+def _contract(n_nodes, src, dst, weights, n_target, rng):
+    """Contract random edges, picked with probability proportional to their weight, until n_target nodes are left.
+
+    Return for each node the index of the node in which it has been contracted.
+    """
+    uf = UnionFind(n_nodes)
+    if len(src):
+        # a random order of the edges equivalent to sampling them without replacement
+        # with probability proportional to their weight [Efraimidis, Spirakis 2006]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            keys = -np.log(1 - rng.random_sample(len(src))) / weights
+        src, dst = src.tolist(), dst.tolist()
+        for idx in np.argsort(keys).tolist():
+            if uf.n_sets <= n_target:
+                break
+            uf.union(src[idx], dst[idx])
+    labels = uf.labels()
+    # disconnected graphs: merge the remaining components
+    return np.minimum(labels, n_target - 1)
+
+
+def _cut_weight(labels, src, dst, weights):
+    return weights[labels[src] != labels[dst]].sum()
+
+
+def _karger_stein(n_nodes, src, dst, weights, rng):
+    """Recursive contraction, return the labels of the two sides of the cut and the cut weight."""
+    if n_nodes <= 6:
+        labels = _contract(n_nodes, src, dst, weights, 2, rng)
+        return labels, _cut_weight(labels, src, dst, weights)
+
+    n_target = math.ceil(1 + n_nodes / math.sqrt(2))
+    best_labels, best_cut = None, float("inf")
+    for _ in range(2):
+        labels = _contract(n_nodes, src, dst, weights, n_target, rng)
+        # contracted graph without self loops
+        c_src, c_dst = labels[src], labels[dst]
+        inter = c_src != c_dst
+        c_labels, cut = _karger_stein(
+            labels.max() + 1, c_src[inter], c_dst[inter], weights[inter], rng
+        )
+        if cut < best_cut:
+            best_labels, best_cut = c_labels[labels], cut
+    return best_labels, best_cut
+
+
+def _min_cut_trial(n_nodes, src, dst, weights, karger_stein, seed):
+    """Run a single trial, return the labels of the two sides of the cut and the cut weight."""
+    rng = np.random.RandomState(seed)
+    if karger_stein:
+        return _karger_stein(n_nodes, src, dst, weights, rng)
+    labels = _contract(n_nodes, src, dst, weights, 2, rng)
+    return labels, _cut_weight(labels, src, dst, weights)
+
+
+def karger_min_cut(
+    g, weight="rate", n_trials=1, karger_stein=False, seed=None, executor=None
+):
+    """Return a min cut of the networkx graph g (with at least two nodes) as two sets of nodes.
+
+    The best cut over n_trials independent trials is returned. If karger_stein is True, each trial runs the
+    recursive contraction of Karger and Stein. Trials are run in the concurrent.futures executor if given.
+    The seed makes the result reproducible, whatever the executor.
+    """
+    names = list(g.nodes())
+    ids = {u: idx for idx, u in enumerate(names)}
+    edges = [(ids[u], ids[v], w) for (u, v, w) in g.edges(data=weight, default=1)]
+    src = np.array([u for (u, _, _) in edges], dtype=np.int64)
+    dst = np.array([v for (_, v, _) in edges], dtype=np.int64)
+    weights = np.array([w for (_, _, w) in edges], dtype=float)
+
+    seeds = np.random.RandomState(seed).randint(2**31 - 1, size=n_trials).tolist()
+    args = (
+        [len(names)] * n_trials,
+        [src] * n_trials,
+        [dst] * n_trials,
+        [weights] * n_trials,
+        [karger_stein] * n_trials,
+        seeds,
+    )
+    trials = (
+        executor.map(_min_cut_trial, *args) if executor else map(_min_cut_trial, *args)
+    )
+
+    best_labels, _ = min(trials, key=lambda trial: trial[1])
+    return (
+        set(u for u, label in zip(names, best_labels.tolist()) if label == 0),
+        set(u for u, label in zip(names, best_labels.tolist()) if label != 0),
+    )
+
+
+def min_cut_executor(n_jobs):
+    """Return a pool of n_jobs processes to run the trials, None if n_jobs is 1."""
+    return ProcessPoolExecutor(max_workers=n_jobs) if n_jobs > 1 else None
@@ -0,0 +1,293 @@
+"""
+Multilevel k-way graph partitioning in the spirit of METIS [1].
+
+The graph is first coarsened by repeatedly contracting a heavy-edge matching, then the coarsest graph is partitioned
+by recursive bisection (greedy graph growing) and finally the partition is projected back level by level and
+refined at each level by moving boundary nodes.
+
+[1] G. Karypis, V. Kumar "A Fast and High Quality Multilevel Scheme for Partitioning Irregular Graphs".
+SIAM Journal on Scientific Computing 1998.
+"""
+import logging
+import math
+
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+
+class _Graph(object):
+    """Weighted graph in CSR format used in the multilevel scheme."""
+
+    def __init__(self, indptr, indices, weights, node_weights):
+        self.indptr = indptr
+        self.indices = indices
+        self.weights = weights
+        self.node_weights = node_weights
+
+    @property
+    def n_nodes(self):
+        return len(self.node_weights)
+
+    @classmethod
+    def from_networkx(cls, g, weight="rate"):
+        """Return the graph and the list of node names from a networkx graph."""
+        names = list(g.nodes())
+        ids = {u: idx for idx, u in enumerate(names)}
+        edges = [
+            (ids[u], ids[v], rate)
+            for (u, v, rate) in g.edges(data=weight, default=1)
+            if u != v
+        ]
+        src = np.array([u for (u, _, _) in edges], dtype=np.int64)
+        dst = np.array([v for (_, v, _) in edges], dtype=np.int64)
+        rate = np.array([rate for (_, _, rate) in edges], dtype=float)
+        return (
+            cls._from_coo(
+                len(names),
+                np.concatenate([src, dst]),
+                np.concatenate([dst, src]),
+                np.concatenate([rate, rate]),
+                np.ones(len(names)),
+            ),
+            names,
+        )
+
+    @classmethod
+    def _from_coo(cls, n_nodes, heads, tails, weights, node_weights):
+        """Build the graph merging parallel edges."""
+        keys, inverse = np.unique(heads * n_nodes + tails, return_inverse=True)
+        weights = np.bincount(inverse, weights, len(keys))
+        indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(keys // n_nodes, minlength=n_nodes), out=indptr[1:])
+        return cls(indptr, keys % n_nodes, weights, node_weights)
+
+    def heavy_edge_matching(self, max_node_weight, rng):
+        """Match each node with the unmatched neighbor connected by the heaviest edge."""
+        indptr, indices = self.indptr.tolist(), self.indices.tolist()
+        weights, node_weights = self.weights.tolist(), self.node_weights.tolist()
+
+        match = [-1] * self.n_nodes
+        for u in rng.permutation(self.n_nodes).tolist():
+            if match[u] != -1:
+                continue
+            best, best_weight = u, -1
+            for idx in range(indptr[u], indptr[u + 1]):
+                v = indices[idx]
+                if (
+                    match[v] == -1
+                    and weights[idx] > best_weight
+                    and node_weights[u] + node_weights[v] <= max_node_weight
+                ):
+                    best, best_weight = v, weights[idx]
+            match[u], match[best] = best, u
+        return match
+
+    def contract(self, match):
+        """Return the coarse graph and the map from the nodes to the coarse nodes."""
+        coarse = np.full(self.n_nodes, -1, dtype=np.int64)
+        n_coarse = 0
+        for u, v in enumerate(match):
+            if coarse[u] == -1:
+                coarse[u] = coarse[v] = n_coarse
+                n_coarse += 1
+
+        heads = coarse[np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))]
+        tails = coarse[self.indices]
+        # edges inside a coarse node are discarded
+        inter = heads != tails
+        return (
+            _Graph._from_coo(
+                n_coarse,
+                heads[inter],
+                tails[inter],
+                self.weights[inter],
+                np.bincount(coarse, self.node_weights, n_coarse),
+            ),
+            coarse,
+        )
+
+    def cut_weight(self, assignment):
+        heads = np.repeat(np.arange(self.n_nodes), np.diff(self.indptr))
+        return self.weights[assignment[heads] != assignment[self.indices]].sum() / 2
+
+
+def _grow_bisection(graph, nodes, target_weight, rng):
+    """Split nodes in two parts, the first one is grown greedily from a random node until target_weight is reached."""
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    weights, node_weights = graph.weights.tolist(), graph.node_weights.tolist()
+
+    remaining = set(nodes)
+    part, part_weight = set(), 0
+    # rate from the nodes outside the part to the part
+    conn = {}
+
+    while remaining and part_weight < target_weight:
+        if conn:
+            u = max(conn, key=conn.get)
+        else:
+            # start a new region (the graph may be disconnected)
+            u = sorted(remaining)[rng.randint(len(remaining))]
+        conn.pop(u, None)
+        remaining.discard(u)
+        part.add(u)
+        part_weight += node_weights[u]
+        for idx in range(indptr[u], indptr[u + 1]):
+            v = indices[idx]
+            if v in remaining:
+                conn[v] = conn.get(v, 0) + weights[idx]
+
+    return part, remaining
+
+
+def _initial_partition(graph, n_partitions, rng):
+    """Partition the coarsest graph in n_partitions parts by recursive bisection."""
+    assignment = np.zeros(graph.n_nodes, dtype=np.int64)
+    to_be_processed = [(list(range(graph.n_nodes)), 0, n_partitions)]
+
+    while to_be_processed:
+        nodes, first_id, k = to_be_processed.pop()
+        if k == 1 or not nodes:
+            assignment[nodes] = first_id
+            continue
+        k_left = k // 2
+        total_weight = graph.node_weights[nodes].sum()
+        left, right = _grow_bisection(graph, nodes, total_weight * k_left / k, rng)
+        to_be_processed.append((sorted(left), first_id, k_left))
+        to_be_processed.append((sorted(right), first_id + k_left, k - k_left))
+
+    return assignment
+
+
+def _refine(graph, assignment, n_partitions, max_load, rng, n_passes=8):
+    """Greedy k-way refinement.
+
+    Boundary nodes are moved to the adjacent partition with the largest reduction of the cut weight, provided that
+    the load of the partition does not exceed max_load. Nodes of overloaded partitions are moved even if the cut
+    weight increases.
+    """
+    indptr, indices = graph.indptr.tolist(), graph.indices.tolist()
+    weights, node_weights = graph.weights.tolist(), graph.node_weights.tolist()
+    part = assignment.tolist()
+    loads = np.bincount(assignment, graph.node_weights, n_partitions).tolist()
+
+    for _ in range(n_passes):
+        n_moves = 0
+        for u in rng.permutation(graph.n_nodes).tolist():
+            p = part[u]
+            overloaded = loads[p] > max_load
+            # rate from u to each partition
+            conn = {}
+            for idx in range(indptr[u], indptr[u + 1]):
+                q = part[indices[idx]]
+                conn[q] = conn.get(q, 0) + weights[idx]
+            internal = conn.get(p, 0)
+
+            candidates = range(n_partitions) if overloaded else conn
+            best, best_gain = None, 0
+            for q in candidates:
+                if q == p or loads[q] + node_weights[u] > max_load:
+                    continue
+                gain = conn.get(q, 0) - internal
+                if best is None:
+                    improves = overloaded or gain > 0
+                else:
+                    # ties are broken in favour of the lightest partition
+                    improves = gain > best_gain or (
+                        gain == best_gain and loads[q] < loads[best]
+                    )
+                if improves:
+                    best, best_gain = q, gain
+
+            if best is not None:
+                part[u] = best
+                loads[p] -= node_weights[u]
+                loads[best] += node_weights[u]
+                n_moves += 1
+
+        if not n_moves:
+            break
+
+    return np.array(part, dtype=np.int64)
+
+
+def multilevel_partition(
+    g,
+    n_partitions,
+    weight="rate",
+    imbalance=0.03,
+    coarsen_to=None,
+    n_tries=8,
+    seed=None,
+):
+    """Partition the nodes of the networkx graph g in at most n_partitions sets minimizing the cut weight.
+
+    Each set contains at most (1 + imbalance) * n_nodes / n_partitions nodes (if possible). The coarsening stops
+    when the graph has less than coarsen_to nodes (by default 20 * n_partitions), then the best of n_tries initial
+    partitions of the coarsest graph is refined. Empty sets are not returned.
+    """
+    graph, names = _Graph.from_networkx(g, weight)
+    if graph.n_nodes == 0:
+        return []
+
+    n_partitions = min(n_partitions, graph.n_nodes)
+    rng = np.random.RandomState(seed)
+    coarsen_to = coarsen_to or 20 * n_partitions
+    max_load = max(
+        math.ceil((1 + imbalance) * graph.n_nodes / n_partitions),
+        math.ceil(graph.n_nodes / n_partitions),
+    )
+
+    #
+    # coarsening
+    #
+    levels = []
+    while graph.n_nodes > coarsen_to:
+        # coarse nodes are kept small enough to allow a balanced partition
+        match = graph.heavy_edge_matching(max(1, max_load / 4), rng)
+        coarse_graph, coarse = graph.contract(match)
+        # stop if the graph does not shrink enough
+        if coarse_graph.n_nodes > 0.95 * graph.n_nodes:
+            break
+        levels.append((graph, coarse))
+        graph = coarse_graph
+
+    _log.debug(f"multilevel partitioning, {len(levels)} coarsening levels")
+
+    #
+    # initial partitioning
+    #
+    # the best among n_tries initial partitions is kept
+    assignment = min(
+        (
+            _refine(
+                graph,
+                _initial_partition(graph, n_partitions, rng),
+                n_partitions,
+                max_load,
+                rng,
+            )
+            for _ in range(n_tries)
+        ),
+        key=graph.cut_weight,
+    )
+
+    #
+    # uncoarsening and refinement
+    #
+    for graph, coarse in reversed(levels):
+        assignment = _refine(graph, assignment[coarse], n_partitions, max_load, rng)
+
+    partitions = [set() for _ in range(n_partitions)]
+    for u, id_partition in zip(names, assignment.tolist()):
+        partitions[id_partition].add(u)
+    return [partition for partition in partitions if partition]
+
+
+def multilevel_bisection(g, weight="rate", seed=None):
+    """Return a balanced bisection of the nodes of the networkx graph g (with at least two nodes)."""
+    partitions = multilevel_partition(g, 2, weight=weight, imbalance=0, seed=seed)
+    if len(partitions) == 1:
+        # move a node to obtain two non empty sets
+        partitions.append({partitions[0].pop()})
+    return partitions[0], partitions[1]
@@ -1,151 +1,189 @@
+import functools
 import logging
 import random
 from collections import defaultdict
 
+import numpy as np
+
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.embedding import EmbedSolver
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.paths import get_path_engine
 from distriopt.embedding.solution import Solution
 
 _log = logging.getLogger(__name__)
 
 
 def get_partitions(virtual, n_partitions, n_swaps=100):
-    """ Divide the nodes in n_partitions bins and then tries to swap nodes to reduce the cut weight."""
+    """ Divide the nodes in n_partitions bins and then tries to swap nodes to reduce the cut weight.
+
+    Swaps are evaluated in the spirit of Fiduccia-Mattheyses: a table stores, for each node and partition, the rate
+    of the links from the node to the partition. The variation of the cut weight due to a swap is computed from the
+    table in constant time and the table is updated in O(degree) only when a swap is accepted.
+    """
+
+    compact = virtual.compact()
+    n_nodes = compact.number_of_nodes()
 
-    nodes = list(virtual.nodes())
+    nodes = list(range(n_nodes))
     random.shuffle(nodes)
-    # node -> id of the partition in which it is contained
-    nodes_partition = {
-        node: id_node % n_partitions for id_node, node in enumerate(nodes)
-    }
-
-    # current cost for the partition
-    old_cost = sum(
-        virtual.req_rate(u, v)
-        for (u, v) in virtual.edges()
-        if nodes_partition[u] != nodes_partition[v]
-    )
+    # node id -> id of the partition in which it is contained
+    nodes_partition = np.empty(n_nodes, dtype=np.int64)
+    nodes_partition[nodes] = np.arange(n_nodes) % n_partitions
+
+    # rate from each node to each partition
+    heads = np.repeat(np.arange(n_nodes), np.diff(compact.indptr))
+    conn = np.bincount(
+        heads * n_partitions + nodes_partition[compact.indices],
+        weights=compact.weights,
+        minlength=n_nodes * n_partitions,
+    ).reshape(n_nodes, n_partitions)
+
+    # rate of the link between two nodes
+    link_rate = defaultdict(int)
+    for (u, v, rate) in zip(
+        compact.src.tolist(), compact.dst.tolist(), compact.rate.tolist()
+    ):
+        link_rate[(u, v)] += rate
+        link_rate[(v, u)] += rate
 
     for _ in range(n_swaps):
         # take two random nodes
         u1, u2 = random.sample(nodes, k=2)
+        p1, p2 = nodes_partition[u1], nodes_partition[u2]
         # if the partitions ids of u1 and u2 are the same continue
-        if nodes_partition[u1] == nodes_partition[u2]:
+        if p1 == p2:
             continue
-        # store the old partition ids of u1 and u2
-        old_u1, old_u2 = nodes_partition[u1], nodes_partition[u2]
-        # swap the partitions
-        nodes_partition[u1], nodes_partition[u2] = (
-            nodes_partition[u2],
-            nodes_partition[u1],
-        )
-        # compute the new cost
-        new_cost = sum(
-            virtual.req_rate(u, v)
-            for (u, v) in virtual.edges()
-            if nodes_partition[u] != nodes_partition[v]
+        # variation of the cut weight, the link (u1,u2), if any, remains in the cut
+        delta = (
+            conn[u1, p1]
+            - conn[u1, p2]
+            + conn[u2, p2]
+            - conn[u2, p1]
+            + 2 * link_rate.get((u1, u2), 0)
         )
 
-        if new_cost < old_cost:
-            # update the current cost
-            old_cost = new_cost
-        else:
-            # go back to the previous solution
-            nodes_partition[u1], nodes_partition[u2] = old_u1, old_u2
+        if delta < 0:
+            # swap the partitions and update the rate from the neighbors to the partitions
+            nodes_partition[u1], nodes_partition[u2] = p2, p1
+            for u, old_p, new_p in (u1, p1, p2), (u2, p2, p1):
+                neighbors, rates = compact.neighbors(u)
+                np.subtract.at(conn[:, old_p], neighbors, rates)
+                np.add.at(conn[:, new_p], neighbors, rates)
 
-    partitions = defaultdict(list)
-    for node, id_partition in nodes_partition.items():
-        partitions[id_partition].append(node)
-    return partitions.values()
+    return [
+        partition
+        for partition in compact.partitions(nodes_partition, n_partitions)
+        if partition
+    ]
 
 
 class EmbedPartition(EmbedSolver):
+    def _place(self, n_partitions_to_try, sorted_compute_nodes, path_engine, n_swaps):
+        """Return a solution using n_partitions_to_try physical nodes, None if not found."""
+        compact = self.virtual.compact()
+
+        # partitioning of virtual nodes in n_partitions_to_try partitions
+        k_partition = get_partitions(
+            self.virtual, n_partitions=n_partitions_to_try, n_swaps=n_swaps
+        )
+        # random subset of hosts of size n_partitions_to_try
+        chosen_physical = sorted_compute_nodes[:n_partitions_to_try]
+        #
+        # check if the partitioning is a feasible solution
+        #
+        # keep track of the physical resources used, attempts are independent of each other
+        ledger = ResidualLedger(self.physical)
+        try:
+            # resources required by each partition
+            cores_load, memory_load = compact.partition_loads(
+                compact.assignment(k_partition), len(k_partition)
+            )
+
+            # virtual nodes to physical nodes assignment
+            res_node_mapping = {}
+
+            # iterate over each pair (physical_node i, virtual nodes assigned to i)
+            for physical_node, assigned_virtual_nodes, cores, memory in zip(
+                chosen_physical, k_partition, cores_load, memory_load
+            ):
+                # check if node resources are not exceeded:
+                ledger.add_node(physical_node, cores, memory)
+                # cpu cores
+                if ledger.residual_cores(physical_node) < 0:
+                    raise NodeResourceError(physical_node, "cpu cores")
+                # memory
+                if ledger.residual_memory(physical_node) < 0:
+                    raise NodeResourceError(physical_node, "memory")
+                # assign the virtual nodes to a physical node
+                for virtual_node in assigned_virtual_nodes:
+                    res_node_mapping[virtual_node] = physical_node
+
+            #
+            # virtual links to physical links assignment
+            #
+            res_link_mapping = {}
+
+            # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
+            for (u, v) in (
+                (u, v)
+                for (u, v) in self.virtual.sorted_edges()
+                if res_node_mapping[u] != res_node_mapping[v]
+            ):
+
+                res_link_mapping[(u, v)] = []
+
+                # physical nodes on which u and v have been placed
+                phy_u, phy_v = res_node_mapping[u], res_node_mapping[v]
+
+                # for each link in the physical path
+                for (i, j, device_id) in self.physical.find_path(
+                    phy_u,
+                    phy_v,
+                    req_rate=self.virtual.req_rate(u, v),
+                    used_rate=ledger.rate_used,
+                    engine=path_engine,
+                ):
+                    ledger.add_rate(i, j, device_id, self.virtual.req_rate(u, v))
+                    res_link_mapping[(u, v)].append((i, device_id, j))
+
+            # build solution from the output
+            return Solution.build_solution(
+                self.virtual, self.physical, res_node_mapping, res_link_mapping
+            )
+
+        except (NodeResourceError, NoPathFoundError):
+            # unfeasible, increase the number of partitions to be used
+            return None
+
     @timeit
     def solve(self, **kwargs):
         """Heuristic based on computing a k-balanced partitions of virtual nodes for then mapping the partition
            on a subset of the physical nodes.
         """
-        sorted_compute_nodes = sorted(
-            self.physical.compute_nodes,
-            key=lambda x: self.physical.cores(x) * 1000 + self.physical.memory(x),
-            reverse=True,
-        )
+        path_engine = get_path_engine(kwargs.get("path_engine", "bfs"))
+        n_swaps = kwargs.get("n_swaps", 100)
 
-        for n_partitions_to_try in range(
-            self.lower_bound(), len(self.physical.compute_nodes) + 1
-        ):
-            # partitioning of virtual nodes in n_partitions_to_try partitions
-            k_partition = get_partitions(self.virtual, n_partitions=n_partitions_to_try)
-            # random subset of hosts of size n_partitions_to_try
-            chosen_physical = sorted_compute_nodes[:n_partitions_to_try]
-            #
-            # check if the partitioning is a feasible solution
-            #
-            try:
-                # virtual nodes to physical nodes assignment
-                res_node_mapping = {}
-
-                # iterate over each pair (physical_node i, virtual nodes assigned to i)
-                for physical_node, assigned_virtual_nodes in zip(
-                    chosen_physical, k_partition
-                ):
-                    # keep track of the node physical resources used
-                    cores_used = memory_used = 0
-                    # check if node resources are not exceeded:
-                    for virtual_node in assigned_virtual_nodes:
-                        # cpu cores
-                        cores_used += self.virtual.req_cores(virtual_node)
-                        if self.physical.cores(physical_node) < cores_used:
-                            raise NodeResourceError(physical_node, "cpu cores")
-                        # memory
-                        memory_used += self.virtual.req_memory(virtual_node)
-                        if self.physical.memory(physical_node) < memory_used:
-                            raise NodeResourceError(physical_node, "memory")
-                        # assign the virtual nodes to a physical node
-                        res_node_mapping[virtual_node] = physical_node
-
-                #
-                # virtual links to physical links assignment
-                #
-                res_link_mapping = {}
-                rate_used = defaultdict(int)
-
-                # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
-                for (u, v) in (
-                    (u, v)
-                    for (u, v) in self.virtual.sorted_edges()
-                    if res_node_mapping[u] != res_node_mapping[v]
-                ):
+        compiled = self.physical.compile()
+        sorted_compute_nodes = compiled.sorted_compute_nodes(
+            compiled.cores * 1000 + compiled.memory
+        )
 
-                    res_link_mapping[(u, v)] = []
-
-                    # physical nodes on which u and v have been placed
-                    phy_u, phy_v = res_node_mapping[u], res_node_mapping[v]
-
-                    # for each link in the physical path
-                    for (i, j, device_id) in self.physical.find_path(
-                        phy_u,
-                        phy_v,
-                        req_rate=self.virtual.req_rate(u, v),
-                        used_rate=rate_used,
-                    ):
-                        rate_used[(i, j, device_id)] += self.virtual.req_rate(u, v)
-                        res_link_mapping[(u, v)].append((i, device_id, j))
-
-                # build solution from the output
-                self.solution = Solution.build_solution(
-                    self.virtual, self.physical, res_node_mapping, res_link_mapping
-                )
-                self.status = Solved
-                return Solved
-
-            except (NodeResourceError, NoPathFoundError) as err:
-                # unfeasible, increase the number of partitions to be used
-                pass
-        else:
-            self.status = Infeasible
-            return Infeasible
+        self.solution = self.search_n_machines(
+            functools.partial(
+                self._place,
+                sorted_compute_nodes=sorted_compute_nodes,
+                path_engine=path_engine,
+                n_swaps=n_swaps,
+            ),
+            self.lower_bound(),
+            len(sorted_compute_nodes),
+            search=kwargs.get("search", "linear"),
+            n_jobs=kwargs.get("n_jobs", 1),
+        )
+        self.status = Solved if self.solution is not None else Infeasible
+        return self.status
 
 
 if __name__ == "__main__":
@@ -0,0 +1,174 @@
+"""
+Portfolio of embedding algorithms raced in parallel processes.
+
+Each member of the portfolio solves the same instance in its own process under a shared deadline. The best
+solution according to the objective is kept: the members still running are cancelled when the deadline expires
+or as soon as a solution reaches the lower bound of the objective.
+"""
+import logging
+import math
+import multiprocessing
+import os
+import queue
+import signal
+import time
+
+from distriopt.constants import *
+from distriopt.decorators import timeit
+from distriopt.embedding import EmbedSolver
+from distriopt.embedding.algorithms.greedy import EmbedGreedy
+from distriopt.embedding.algorithms.ilp import EmbedILP
+from distriopt.embedding.algorithms.kbalanced import EmbedBalanced
+from distriopt.embedding.algorithms.partition import EmbedPartition
+
+_log = logging.getLogger(__name__)
+
+# name of the member -> (solver class, arguments of solve)
+DEFAULT_MEMBERS = {
+    "greedy": (EmbedGreedy, {}),
+    "balanced": (EmbedBalanced, {}),
+    "partition": (EmbedPartition, {}),
+    "ilp": (EmbedILP, {"warm_start": "greedy"}),
+}
+
+# seconds between two checks of the members which exited without sending a result
+_POLL_INTERVAL = 0.5
+
+
+def _member_kwargs(kwargs, obj, remaining):
+    """Return the arguments of solve of a member, which shares the objective and the deadline of the portfolio."""
+    return dict(
+        kwargs,
+        obj=obj,
+        timelimit=max(1, int(min(kwargs.get("timelimit", math.inf), remaining))),
+    )
+
+
+def _run_member(name, solver_class, virtual, physical, kwargs, results):
+    """Solve the instance with a member of the portfolio and send (name, time, status, solution) to results."""
+    # the member and the processes it starts (e.g. the ILP solver) form a process group, killed if cancelled
+    os.setpgrp()
+    try:
+        prob = solver_class(virtual, physical)
+        time_solution, status = prob.solve(**kwargs)
+        results.put((name, time_solution, status, prob.solution))
+    except Exception as e:
+        _log.warning(f"portfolio member {name} failed: {e!r}")
+        results.put((name, None, NotSolved, None))
+
+
+def _cancel(process):
+    """Kill the process group of a member of the portfolio."""
+    try:
+        os.killpg(process.pid, signal.SIGTERM)
+    except ProcessLookupError:
+        # the member has not created its group yet
+        process.terminate()
+    process.join()
+
+
+class PortfolioSolver(EmbedSolver):
+    """Race several embedding algorithms and keep the best solution.
+
+    After solve, winner is the name of the member which found the solution and results maps the name of each
+    member which returned to its (time, status).
+    """
+
+    def __init__(self, virtual, physical):
+        super().__init__(virtual, physical)
+        self.winner = None
+        self.results = {}
+
+    def _rank(self, solution, obj):
+        """Return the key used to compare solutions, the objective first and then the other criterion."""
+        n_machines = self._objective_value(solution, "min_n_machines")
+        bandwidth = self._objective_value(solution, "min_bw")
+        if obj == "min_n_machines":
+            return n_machines, bandwidth
+        return bandwidth, n_machines
+
+    @timeit
+    def solve(self, **kwargs):
+
+        obj = kwargs.get("obj", "min_n_machines")
+        if obj not in ("min_n_machines", "min_bw"):
+            raise ValueError(f"Invalid objective {obj}")
+        timelimit = float(kwargs.get("timelimit", 3600))
+        members = kwargs.get("members", DEFAULT_MEMBERS)
+        n_jobs = kwargs.get("n_jobs", len(members))
+
+        deadline = time.time() + timelimit
+        # a solution reaching the bound cannot be improved by the other members
+        target = self.lower_bound() if obj == "min_n_machines" else 0
+
+        self.solution = None
+        self.winner = None
+        self.results = {}
+        best = None
+
+        context = multiprocessing.get_context()
+        results = context.Queue()
+        pending = list(members.items())
+        running = {}
+        try:
+            while pending or running:
+                while pending and len(running) < n_jobs:
+                    name, (solver_class, member_kwargs) = pending.pop(0)
+                    member_kwargs = _member_kwargs(
+                        member_kwargs, obj, deadline - time.time()
+                    )
+                    running[name] = context.Process(
+                        target=_run_member,
+                        args=(
+                            name,
+                            solver_class,
+                            self.virtual,
+                            self.physical,
+                            member_kwargs,
+                            results,
+                        ),
+                    )
+                    running[name].start()
+
+                remaining = deadline - time.time()
+                if remaining <= 0:
+                    _log.debug("portfolio deadline expired")
+                    break
+                try:
+                    name, time_solution, status, solution = results.get(
+                        timeout=min(remaining, _POLL_INTERVAL)
+                    )
+                except queue.Empty:
+                    for name, process in list(running.items()):
+                        if process.exitcode not in (None, 0):
+                            _log.warning(f"portfolio member {name} crashed")
+                            running.pop(name).join()
+                            self.results[name] = (None, NotSolved)
+                    continue
+
+                running.pop(name).join()
+                self.results[name] = (time_solution, status)
+                _log.debug(f"portfolio member {name} returned with status {status}")
+                if status != Solved or solution is None:
+                    continue
+                key = self._rank(solution, obj)
+                if best is None or key < best:
+                    best, self.solution, self.winner = key, solution, name
+                if key[0] <= target:
+                    _log.debug(f"portfolio member {name} reached the lower bound")
+                    break
+        finally:
+            for name, process in running.items():
+                _log.debug(f"cancelling portfolio member {name}")
+                _cancel(process)
+            results.close()
+
+        if self.solution is not None:
+            self.status = Solved
+        elif len(self.results) == len(members) and all(
+            status == Infeasible for (_, status) in self.results.values()
+        ):
+            self.status = Infeasible
+        else:
+            self.status = NotSolved
+        return self.status
@@ -1,104 +1,183 @@
+"""
+Random search: virtual nodes are assigned to random physical nodes until a feasible solution is found.
+
+Assignments are sampled in batches and the node capacities of a whole batch are checked at once. Only the
+assignments respecting the node capacities are routed on the physical network. Batches with independent seeds can
+be sampled and routed in a pool of processes.
+"""
+import functools
 import logging
-import random
-from collections import defaultdict
+import multiprocessing
+import time
+
+import numpy as np
 
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.embedding import EmbedSolver
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.paths import get_path_engine
 from distriopt.embedding.solution import Solution
 
 _log = logging.getLogger(__name__)
 
+# search of a batch in the processes of the pool
+_worker_search = None
+
+
+def _init_worker(search):
+    global _worker_search
+    _worker_search = search
+
+
+def _run_batch(args):
+    return _worker_search(*args)
+
+
+def sample_assignments(cores, memory, phy_cores, phy_memory, batch_size, seed):
+    """Sample batch_size random assignments of the virtual nodes to the physical nodes.
+
+    Return the assignments, as rows of indices of physical nodes, respecting the cores and memory capacities.
+    """
+    n_virtual, n_physical = len(cores), len(phy_cores)
+    assignments = np.random.RandomState(seed).randint(
+        n_physical, size=(batch_size, n_virtual)
+    )
+    # load of each physical node in each assignment
+    bins = (np.arange(batch_size)[:, None] * n_physical + assignments).ravel()
+    cores_load = np.bincount(
+        bins, weights=np.tile(cores, batch_size), minlength=batch_size * n_physical
+    ).reshape(batch_size, n_physical)
+    memory_load = np.bincount(
+        bins, weights=np.tile(memory, batch_size), minlength=batch_size * n_physical
+    ).reshape(batch_size, n_physical)
+    feasible = ((cores_load <= phy_cores) & (memory_load <= phy_memory)).all(axis=1)
+    return assignments[feasible]
+
 
 class RandomSelection(EmbedSolver):
+    def _route(self, node_mapping, path_engine):
+        """Return a solution routing the virtual links for the given node mapping, None if not found."""
+        ledger = ResidualLedger(self.physical)
+        res_link_mapping = {}
+        try:
+            # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
+            for (u, v) in (
+                (u, v)
+                for (u, v) in self.virtual.sorted_edges()
+                if node_mapping[u] != node_mapping[v]
+            ):
+                path = self.physical.find_path(
+                    node_mapping[u],
+                    node_mapping[v],
+                    req_rate=self.virtual.req_rate(u, v),
+                    used_rate=ledger.rate_used,
+                    engine=path_engine,
+                )
+                ledger.add_path(path, self.virtual.req_rate(u, v))
+                res_link_mapping[(u, v)] = [
+                    (i, device_id, j) for (i, j, device_id) in path
+                ]
+        except NoPathFoundError:
+            return None
+
+        # build solution from the output
+        return Solution.build_solution(
+            self.virtual, self.physical, node_mapping, res_link_mapping
+        )
+
+    def _search_batch(self, batch_size, seed, path_engine, deadline):
+        """Sample a batch of assignments and return the solution of the first one which can be routed, if any.
+
+        Raise TimeLimitError if the deadline (if not None) expires while routing the assignments.
+        """
+        if deadline is not None and time.time() > deadline:
+            raise TimeLimitError("no feasible assignment found before the deadline")
+        compact = self.virtual.compact()
+        compiled = self.physical.compile()
+        compute_nodes = compiled.compute_nodes
+        assignments = sample_assignments(
+            compact.cores,
+            compact.memory,
+            compiled.cores[compute_nodes],
+            compiled.memory[compute_nodes],
+            batch_size,
+            seed,
+        )
+        for assignment in assignments.tolist():
+            if deadline is not None and time.time() > deadline:
+                raise TimeLimitError("no feasible assignment found before the deadline")
+            solution = self._route(
+                {
+                    compact.names[u]: compiled.names[compute_nodes[i]]
+                    for u, i in enumerate(assignment)
+                },
+                path_engine,
+            )
+            if solution is not None:
+                return solution
+        return None
+
     @timeit
     def solve(self, **kwargs):
-        seed = kwargs.get("seed", 66)
-        my_random = random.Random(seed)
-
-        compute_nodes = sorted(list(self.physical.compute_nodes))
-
-        while True:
-            try:
-                res_node_mapping = {}
-                cores_used = defaultdict(int)
-                memory_used = defaultdict(int)
-
-                # random virtual node to physical node assignment
-                for virtual_node, phy_node in zip(
-                    self.virtual.nodes(),
-                    my_random.choices(compute_nodes, k=self.virtual.number_of_nodes()),
-                ):
-                    res_node_mapping[virtual_node] = phy_node
-                    cores_used[phy_node] += self.virtual.req_cores(virtual_node)
-                    memory_used[phy_node] += self.virtual.req_memory(virtual_node)
-
-                    if cores_used[phy_node] > self.physical.cores(
-                        phy_node
-                    ) or memory_used[phy_node] > self.physical.memory(phy_node):
-                        raise NodeResourceError
-
-                res_link_mapping = {}
-                rate_used = defaultdict(int)
-                # link mapping
-                # iterate over each virtual link between two virtual nodes not mapped on the same physical machine
-                for (u, v) in (
-                    (u, v)
-                    for (u, v) in self.virtual.sorted_edges()
-                    if res_node_mapping[u] != res_node_mapping[v]
-                ):
-
-                    res_link_mapping[(u, v)] = []
-
-                    # physical nodes on which u and v have been placed
-                    phy_u, phy_v = res_node_mapping[u], res_node_mapping[v]
-
-                    next_node = phy_u
-                    # for each link in the physical path
-                    for (i, j) in self.physical.find_path(phy_u, phy_v):
-
-                        # get an interface_name with enough available rate
-                        feasible_interfaces_ids = [
-                            interface_id
-                            for interface_id in self.physical.interfaces_ids(i, j)
-                            if self.physical.rate(i, j, interface_id)
-                            - rate_used[(i, j, interface_id)]
-                            >= self.virtual.req_rate(u, v)
-                        ]
-
-                        if not feasible_interfaces_ids:
-                            raise LinkCapacityError
-                        else:
-                            chosen_interface_id = my_random.choice(
-                                feasible_interfaces_ids
-                            )
-
-                        # else update the rate
-                        rate_used[(i, j, chosen_interface_id)] += self.virtual.req_rate(
-                            u, v
-                        )
-
-                        res_link_mapping[(u, v)].append(
-                            (i, chosen_interface_id, j)
-                            if i == next_node
-                            else (j, chosen_interface_id, i)
-                        )
-                        next_node = j if i == next_node else i
-
-                # build solution from the output
-                self.solution = Solution.build_solution(
-                    self.virtual, self.physical, res_node_mapping, res_link_mapping
-                )
-                self.status = Solved
-                return Solved
+        """Sample random assignments until one of them is feasible.
 
-            except (NodeResourceError, LinkCapacityError):
-                pass
+        At most max_attempts assignments are sampled, in batches of batch_size, within timelimit seconds (if not
+        None). Raise TimeLimitError if the budget runs out. With n_jobs > 1, the batches are sampled and routed in
+        a pool of processes. The seed makes the result reproducible, whatever n_jobs.
+        """
+        seed = kwargs.get("seed", 66)
+        batch_size = kwargs.get("batch_size", 1000)
+        max_attempts = kwargs.get("max_attempts", 100000)
+        timelimit = kwargs.get("timelimit", None)
+        n_jobs = kwargs.get("n_jobs", 1)
+        path_engine = get_path_engine(kwargs.get("path_engine", "bfs"))
+
+        deadline = time.time() + timelimit if timelimit is not None else None
+
+        # size and seed of each batch, the batches are searched in this order
+        sizes = [
+            min(batch_size, max_attempts - n_attempts)
+            for n_attempts in range(0, max_attempts, batch_size)
+        ]
+        seeds = np.random.RandomState(seed).randint(2**31 - 1, size=len(sizes))
+        batches = list(zip(sizes, seeds.tolist()))
+
+        search = functools.partial(
+            self._search_batch, path_engine=path_engine, deadline=deadline
+        )
+        pool = (
+            multiprocessing.Pool(n_jobs, initializer=_init_worker, initargs=(search,))
+            if n_jobs > 1
+            else None
+        )
+        n_attempts = 0
+        try:
+            # with a pool, the results are returned in the order of the batches
+            results = (
+                pool.imap(_run_batch, batches)
+                if pool
+                else (search(*batch) for batch in batches)
+            )
+            for size, solution in zip(sizes, results):
+                n_attempts += size
+                if solution is not None:
+                    _log.debug(f"feasible assignment found in {n_attempts} attempts")
+                    self.solution = solution
+                    self.status = Solved
+                    return Solved
+        finally:
+            if pool is not None:
+                # stop the batches still running
+                pool.terminate()
+                pool.join()
+
+        raise TimeLimitError(f"no feasible assignment found in {n_attempts} attempts")
 
 
 if __name__ == "__main__":
     from distriopt.embedding import PhysicalNetwork
-    from distriopt.mapping import VirtualNetwork
+    from distriopt import VirtualNetwork
 
     physical_topo = PhysicalNetwork.from_files("grisou", group_interfaces=False)
     virtual_topo = VirtualNetwork.create_random_nw(n_nodes=66)
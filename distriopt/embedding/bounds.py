@@ -0,0 +1,156 @@
+"""
+Lower bounds on the number of physical machines needed to embed a virtual network.
+
+The node bounds are bin packing bounds [1] computed with vectorized numpy code on the compact virtual network and
+on the compiled physical network. The cut bound relies on the fact that, if the virtual nodes do not fit on a single
+machine, each machine used exchanges at least the min cut weight of the virtual network with the other machines.
+
+[1] S. Martello, P. Toth "Lower bounds and reduction procedures for the bin packing problem".
+Discrete Applied Mathematics 1990.
+"""
+import logging
+
+import networkx as nx
+import numpy as np
+
+_log = logging.getLogger(__name__)
+
+# tolerance used to compare sums of floats
+_EPS = 1e-9
+
+
+def volume_bound(sizes, capacities):
+    """Return the minimum number of machines whose total capacity (largest first) is at least the total size."""
+    total = sizes.sum()
+    if total <= 0:
+        return 0
+    cumulative = np.cumsum(np.sort(capacities)[::-1])
+    return int(np.searchsorted(cumulative, total - _EPS)) + 1
+
+
+def l2_bound(sizes, capacity):
+    """Return the bound L2 of Martello and Toth for bins of the given capacity.
+
+    For each threshold K in [0, capacity/2], items larger than capacity-K need a bin each, items in
+    (capacity/2, capacity-K] need a bin each with some free space left, and items in [K, capacity/2] need
+    enough bins to fit in the space not used by the previous ones. All the thresholds are evaluated at once.
+    """
+    if not len(sizes):
+        return 0
+    sizes = np.sort(sizes)
+    prefix = np.concatenate([[0], np.cumsum(sizes)])
+    half = capacity / 2
+
+    thresholds = np.unique(np.concatenate([[0], sizes[sizes <= half]]))
+    # number of items not larger than capacity-K, capacity/2 and smaller than K
+    n_fit = np.searchsorted(sizes, capacity - thresholds, side="right")
+    n_half = np.searchsorted(sizes, half, side="right")
+    n_small = np.searchsorted(sizes, thresholds, side="left")
+
+    n_large = len(sizes) - n_fit
+    n_medium = n_fit - n_half
+    free = n_medium * capacity - (prefix[n_fit] - prefix[n_half])
+    remaining = prefix[n_half] - prefix[n_small] - free
+    bounds = n_large + n_medium + np.maximum(0, np.ceil(remaining / capacity - _EPS))
+    return int(bounds.max())
+
+
+def conflict_bound(cores, memory, phy_cores, phy_memory, max_items=1000):
+    """Return the size of a set of virtual nodes which pairwise cannot be mapped on the same machine.
+
+    Two virtual nodes conflict if no machine has enough cores and memory for both of them. A clique of the
+    conflict graph is built greedily, starting from the nodes with the largest number of conflicts. Only the
+    max_items largest virtual nodes are considered.
+    """
+    if not len(cores):
+        return 0
+    # only the non dominated machine types matter
+    types = np.unique(np.stack([phy_cores, phy_memory], axis=1), axis=0)
+
+    size = np.maximum(cores / phy_cores.max(), memory / phy_memory.max())
+    items = np.argsort(-size, kind="stable")[:max_items]
+    cores, memory = cores[items], memory[items]
+
+    pair_cores = cores[:, None] + cores[None, :]
+    pair_memory = memory[:, None] + memory[None, :]
+    # fits[a, b] is True if some machine type can host both a and b
+    fits = np.zeros(pair_cores.shape, dtype=bool)
+    for type_cores, type_memory in types:
+        fits |= (pair_cores <= type_cores) & (pair_memory <= type_memory)
+    conflicts = ~fits
+    np.fill_diagonal(conflicts, False)
+
+    candidates = np.ones(len(items), dtype=bool)
+    clique = 0
+    for u in np.argsort(-conflicts.sum(axis=1), kind="stable").tolist():
+        if candidates[u]:
+            clique += 1
+            candidates &= conflicts[u]
+    return clique
+
+
+def capacity_bound(cores, memory, phy_cores, phy_memory):
+    """Return the best of the node bounds for the given virtual demands and machine capacities."""
+    if not len(cores):
+        return 0
+    return max(
+        volume_bound(cores, phy_cores),
+        volume_bound(memory, phy_memory),
+        l2_bound(cores, phy_cores.max()),
+        l2_bound(memory, phy_memory.max()),
+        conflict_bound(cores, memory, phy_cores, phy_memory),
+    )
+
+
+def min_cut_weight(virtual, max_cut_nodes=200):
+    """Return a lower bound on the weight of the min cut of the virtual network.
+
+    The min cut is computed with the Stoer-Wagner algorithm only for networks with at most max_cut_nodes nodes,
+    otherwise 0 is returned.
+    """
+    if virtual.number_of_nodes() > max_cut_nodes or not nx.is_connected(virtual.g):
+        return 0
+    return nx.stoer_wagner(virtual.g, weight="rate")[0]
+
+
+def lower_bound(virtual, physical, max_cut_nodes=200):
+    """Return a lower bound on the minimum number of physical machines needed to map all the virtual nodes.
+
+    If the bound exceeds the number of compute nodes, no feasible mapping exists.
+    """
+    compact = virtual.compact()
+    compiled = physical.compile()
+    compute_nodes = compiled.compute_nodes
+    if not len(compute_nodes):
+        return 1 if len(compact.cores) else 0
+
+    phy_cores = compiled.cores[compute_nodes]
+    phy_memory = compiled.memory[compute_nodes]
+    bound = capacity_bound(compact.cores, compact.memory, phy_cores, phy_memory)
+
+    if bound >= 2:
+        # the nodes mapped on each machine exchange at least the min cut weight with the other machines.
+        # The min cut is not larger than the minimum weighted degree: if all the machines support it, the cut
+        # bound is not better than the node bounds
+        rate_out = compiled.rate_out[compute_nodes]
+        degrees = np.bincount(
+            np.concatenate([compact.src, compact.dst]),
+            np.concatenate([compact.rate, compact.rate]),
+            minlength=len(compact.cores),
+        )
+        if (rate_out < degrees.min()).any():
+            eligible = rate_out >= min_cut_weight(virtual, max_cut_nodes)
+            if not eligible.any():
+                return len(compute_nodes) + 1
+            bound = max(
+                bound,
+                capacity_bound(
+                    compact.cores,
+                    compact.memory,
+                    phy_cores[eligible],
+                    phy_memory[eligible],
+                ),
+            )
+
+    _log.debug(f"lower bound on the number of machines: {bound}")
+    return bound
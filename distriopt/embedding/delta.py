@@ -0,0 +1,62 @@
+"""
+Changes of a virtual network, used to update an embedding without solving it again from scratch.
+"""
+import logging
+
+from distriopt import VirtualNetwork
+
+_log = logging.getLogger(__name__)
+
+
+def _sorted_link(u, v):
+    return (u, v) if u < v else (v, u)
+
+
+class VirtualDelta(object):
+    """Virtual nodes and links added to or removed from a virtual network.
+
+    add_nodes maps each new virtual node to its attributes (cores and memory) and add_links maps each new virtual
+    link (u,v) to its attributes (rate). Removing a virtual node also removes its links. A virtual node or link
+    both removed and added is replaced.
+
+    Examples
+    --------
+    >>> delta = VirtualDelta(
+    ...     add_nodes={"host_17": {"cores": 2, "memory": 4000}},
+    ...     add_links={("host_17", "edge_1"): {"rate": 200}},
+    ...     remove_nodes=["host_1"],
+    ... )
+    """
+
+    def __init__(
+        self, add_nodes=None, add_links=None, remove_nodes=(), remove_links=()
+    ):
+        self.add_nodes = dict(add_nodes or {})
+        self.add_links = {
+            _sorted_link(u, v): attributes
+            for (u, v), attributes in (add_links or {}).items()
+        }
+        self.remove_nodes = set(remove_nodes)
+        self.remove_links = set(_sorted_link(u, v) for (u, v) in remove_links)
+
+    def apply(self, virtual):
+        """Return a new virtual network with the changes applied to virtual."""
+        g = virtual.g.copy()
+        g.remove_nodes_from(self.remove_nodes)
+        g.remove_edges_from(self.remove_links)
+        g.add_nodes_from(self.add_nodes.items())
+        for (u, v), attributes in self.add_links.items():
+            if u not in g or v not in g:
+                raise ValueError(
+                    f"Invalid link {(u, v)}, endpoint not in the virtual network"
+                )
+            g.add_edge(u, v, **attributes)
+        return VirtualNetwork(g)
+
+    def changed_nodes(self):
+        """Return the virtual nodes whose previous mapping, if any, is no longer valid."""
+        return self.remove_nodes | set(self.add_nodes)
+
+    def changed_links(self):
+        """Return the virtual links whose previous path, if any, is no longer valid."""
+        return self.remove_links | set(self.add_links)
@@ -0,0 +1,134 @@
+"""
+Keep track of the physical resources used by an embedding.
+"""
+import logging
+from collections import defaultdict
+
+_log = logging.getLogger(__name__)
+
+
+class LayeredUsage(object):
+    """Resource usage stored as a base layer plus a stack of overlays.
+
+    Updates are written in the topmost layer, so that tentative changes can be either merged in the layer below
+    or discarded at a cost proportional to the number of changes.
+    """
+
+    def __init__(self):
+        self.layers = [defaultdict(int)]
+
+    def __getitem__(self, key):
+        return sum(layer.get(key, 0) for layer in self.layers)
+
+    def __contains__(self, key):
+        return any(key in layer for layer in self.layers)
+
+    def get(self, key, default=0):
+        return self[key] if key in self else default
+
+    def keys(self):
+        return set().union(*self.layers)
+
+    def items(self):
+        return ((key, self[key]) for key in self.keys())
+
+    def add(self, key, amount):
+        self.layers[-1][key] += amount
+
+    def push(self):
+        self.layers.append(defaultdict(int))
+
+    def merge(self):
+        top = self.layers.pop()
+        for key, amount in top.items():
+            self.layers[-1][key] += amount
+
+    def pop(self):
+        self.layers.pop()
+
+
+class ResidualLedger(object):
+    """Cores, memory and per-interface rate used on a physical network.
+
+    Changes can be grouped in transactions: begin() opens an overlay, commit() merges it in the underlying state
+    and rollback() discards it. Transactions can be nested.
+
+    The rate is stored per direction as (i, j, device_id), so that rate_used can be passed as the used_rate
+    argument of PhysicalNetwork.find_path.
+    """
+
+    def __init__(self, physical):
+        self.physical = physical
+        self._compiled = physical.compile()
+        self.cores_used = LayeredUsage()
+        self.memory_used = LayeredUsage()
+        self.rate_used = LayeredUsage()
+
+    @property
+    def depth(self):
+        """Return the number of open transactions."""
+        return len(self.cores_used.layers) - 1
+
+    def _usages(self):
+        return self.cores_used, self.memory_used, self.rate_used
+
+    def begin(self):
+        """Open a new transaction."""
+        for usage in self._usages():
+            usage.push()
+
+    def commit(self):
+        """Apply the changes of the innermost transaction."""
+        if not self.depth:
+            raise ValueError("No open transaction.")
+        for usage in self._usages():
+            usage.merge()
+
+    def rollback(self):
+        """Discard the changes of the innermost transaction."""
+        if not self.depth:
+            raise ValueError("No open transaction.")
+        for usage in self._usages():
+            usage.pop()
+
+    def residual_cores(self, i):
+        """Return the number of cores still available on a physical node."""
+        return self._compiled.cores[self._compiled.ids[i]] - self.cores_used[i]
+
+    def residual_memory(self, i):
+        """Return the amount of memory still available on a physical node."""
+        return self._compiled.memory[self._compiled.ids[i]] - self.memory_used[i]
+
+    def residual_rate(self, i, j, device_id):
+        """Return the rate still available on the interface device_id of the physical link (i,j)."""
+        return (
+            self._compiled.rates[self._compiled.interface_ids[(i, j, device_id)]]
+            - self.rate_used[(i, j, device_id)]
+            - self.rate_used[(j, i, device_id)]
+        )
+
+    def fits(self, i, cores, memory):
+        """Return True if the requested cores and memory are available on the physical node i."""
+        return cores <= self.residual_cores(i) and memory <= self.residual_memory(i)
+
+    def add_node(self, i, cores, memory):
+        """Use cores and memory on the physical node i."""
+        self.cores_used.add(i, cores)
+        self.memory_used.add(i, memory)
+
+    def add_rate(self, i, j, device_id, rate):
+        """Use rate on the interface device_id of the physical link (i,j)."""
+        self.rate_used.add((i, j, device_id), rate)
+
+    def add_path(self, path, rate):
+        """Use rate on each interface of a path given as a list of (i, j, device_id)."""
+        for (i, j, device_id) in path:
+            self.rate_used.add((i, j, device_id), rate)
+
+    def release_node(self, i, cores, memory):
+        """Release cores and memory on the physical node i."""
+        self.add_node(i, -cores, -memory)
+
+    def release_path(self, path, rate):
+        """Release rate on each interface of a path given as a list of (i, j, device_id)."""
+        self.add_path(path, -rate)
@@ -0,0 +1,277 @@
+"""
+Capacity-aware path engines used to route virtual links on the physical network.
+"""
+import heapq
+import itertools
+import logging
+from abc import abstractmethod, ABCMeta
+from collections import deque, OrderedDict
+
+import networkx as nx
+
+from distriopt.constants import NoPathFoundError
+
+_log = logging.getLogger(__name__)
+
+
+class PathEngine(object, metaclass=ABCMeta):
+    """Base class for the path engines.
+
+    An engine only expands the physical interfaces whose residual rate is enough to route the requested rate.
+    The search runs on the compiled snapshot of the physical network (see PhysicalNetwork.compile) and paths are
+    translated back to lists of (i, j, device_id) from the source to the target.
+    """
+
+    @staticmethod
+    def residual_rate(compiled, i, j, k, used_rate):
+        """Return the rate still available on the interface k from the node id i to the node id j."""
+        i, j, device_id = (
+            compiled.names[i],
+            compiled.names[j],
+            compiled.interface_device[k],
+        )
+        return (
+            compiled.rates[k]
+            - used_rate.get((i, j, device_id), 0)
+            - used_rate.get((j, i, device_id), 0)
+        )
+
+    def feasible_interfaces(self, compiled, i, j, interfaces, req_rate, used_rate):
+        """Return the interfaces from the node id i to the node id j able to support the requested rate."""
+        return (
+            k
+            for k in interfaces
+            if self.residual_rate(compiled, i, j, k, used_rate) >= req_rate
+        )
+
+    @staticmethod
+    def _build_path(compiled, pred, target):
+        """Build the path from the source to the target given the predecessors map."""
+        path = []
+        j = target
+        while pred[j] is not None:
+            i, k = pred[j]
+            path.append(
+                (compiled.names[i], compiled.names[j], compiled.interface_device[k])
+            )
+            j = i
+        return path[::-1]
+
+    @abstractmethod
+    def find_path(self, physical, source, target, req_rate=0, used_rate={}):
+        """This method must be implemented."""
+
+
+class BFSPathEngine(PathEngine):
+    """Return a feasible path with the minimum number of hops."""
+
+    def find_path(self, physical, source, target, req_rate=0, used_rate={}):
+        if source == target:
+            return []
+
+        compiled = physical.compile()
+        source, target = compiled.ids[source], compiled.ids[target]
+
+        pred = {source: None}
+        to_visit = deque([source])
+
+        while to_visit:
+            i = to_visit.popleft()
+            for j, interfaces in compiled.adjacency[i]:
+                if j in pred:
+                    continue
+                # take the first interface which can support the requested rate
+                k = next(
+                    self.feasible_interfaces(
+                        compiled, i, j, interfaces, req_rate, used_rate
+                    ),
+                    None,
+                )
+                if k is None:
+                    continue
+                pred[j] = (i, k)
+                if j == target:
+                    return self._build_path(compiled, pred, target)
+                to_visit.append(j)
+
+        raise NoPathFoundError(compiled.names[source], compiled.names[target])
+
+
+class DijkstraPathEngine(PathEngine):
+    """Return a feasible path with the minimum total weight.
+
+    The weight of an interface is either the value of the attribute *weight* of the physical link (1 if missing) or,
+    if *weight* is callable, the value returned by weight(i, j, device_id).
+    """
+
+    def __init__(self, weight="weight"):
+        self.weight = weight
+
+    def _cost(self, physical, i, j, device_id):
+        if callable(self.weight):
+            return self.weight(i, j, device_id)
+        return physical.g[i][j][device_id].get(self.weight, 1)
+
+    def find_path(self, physical, source, target, req_rate=0, used_rate={}):
+        if source == target:
+            return []
+
+        compiled = physical.compile()
+        names, devices = compiled.names, compiled.interface_device
+        source, target = compiled.ids[source], compiled.ids[target]
+
+        dist = {source: 0}
+        pred = {source: None}
+        visited = set()
+        heap = [(0, source)]
+
+        while heap:
+            d_i, i = heapq.heappop(heap)
+            if i in visited:
+                continue
+            if i == target:
+                return self._build_path(compiled, pred, target)
+            visited.add(i)
+
+            for j, interfaces in compiled.adjacency[i]:
+                if j in visited:
+                    continue
+                # the cheapest interface which can support the requested rate
+                best = min(
+                    (
+                        (self._cost(physical, names[i], names[j], devices[k]), k)
+                        for k in self.feasible_interfaces(
+                            compiled, i, j, interfaces, req_rate, used_rate
+                        )
+                    ),
+                    key=lambda x: x[0],
+                    default=None,
+                )
+                if best is None:
+                    continue
+                d_j = d_i + best[0]
+                if j not in dist or d_j < dist[j]:
+                    dist[j] = d_j
+                    pred[j] = (i, best[1])
+                    heapq.heappush(heap, (d_j, j))
+
+        raise NoPathFoundError(names[source], names[target])
+
+
+class PathIndex(object):
+    """Lazily filled index of the k shortest paths (in number of hops) between pairs of physical nodes.
+
+    Paths are tuples of node ids of the compiled physical network.
+    Since the physical network is frozen, the candidate paths of a pair never change and are computed only the first
+    time they are requested. At most *max_pairs* pairs are kept, the least recently used one is evicted first.
+    """
+
+    def __init__(self, physical, k=4, max_pairs=10000):
+        self.physical = physical
+        self.k = k
+        self.max_pairs = max_pairs
+        self._paths = OrderedDict()
+        self._g = None
+
+    def __len__(self):
+        return len(self._paths)
+
+    def clear(self):
+        self._paths.clear()
+
+    def paths(self, source, target):
+        """Return the k shortest paths from the source to the target as tuples of physical node ids.
+
+        The list is empty if the target cannot be reached from the source.
+        """
+        if (source, target) in self._paths:
+            self._paths.move_to_end((source, target))
+            return self._paths[(source, target)]
+        if (target, source) in self._paths:
+            self._paths.move_to_end((target, source))
+            return [path[::-1] for path in self._paths[(target, source)]]
+
+        compiled = self.physical.compile()
+        if self._g is None:
+            # parallel interfaces are irrelevant to enumerate the candidate paths
+            self._g = nx.Graph(
+                zip(compiled.interface_src.tolist(), compiled.interface_dst.tolist())
+            )
+        try:
+            paths = [
+                tuple(path)
+                for path in itertools.islice(
+                    nx.shortest_simple_paths(
+                        self._g, compiled.ids[source], compiled.ids[target]
+                    ),
+                    self.k,
+                )
+            ]
+        except (nx.NetworkXNoPath, nx.NodeNotFound):
+            # disconnected nodes or nodes without interfaces
+            paths = []
+
+        self._paths[(source, target)] = paths
+        if len(self._paths) > self.max_pairs:
+            self._paths.popitem(last=False)
+        return paths
+
+
+class KShortestPathEngine(PathEngine):
+    """Return the first of the precomputed k shortest paths with enough residual rate.
+
+    Candidate paths are taken from the path index of the physical network. If none of them is feasible,
+    the search is delegated to *fallback* (if not None).
+    """
+
+    def __init__(self, fallback="bfs"):
+        self.fallback = get_path_engine(fallback) if fallback is not None else None
+
+    def find_path(self, physical, source, target, req_rate=0, used_rate={}):
+        if source == target:
+            return []
+
+        compiled = physical.compile()
+
+        for nodes in physical.path_index.paths(source, target):
+            pred = {nodes[0]: None}
+            for i, j in zip(nodes, nodes[1:]):
+                k = next(
+                    self.feasible_interfaces(
+                        compiled,
+                        i,
+                        j,
+                        compiled.link_interfaces[(i, j)],
+                        req_rate,
+                        used_rate,
+                    ),
+                    None,
+                )
+                if k is None:
+                    break
+                pred[j] = (i, k)
+            else:
+                return self._build_path(compiled, pred, nodes[-1])
+
+        if self.fallback is not None:
+            return self.fallback.find_path(
+                physical, source, target, req_rate=req_rate, used_rate=used_rate
+            )
+        raise NoPathFoundError(source, target)
+
+
+PATH_ENGINES = {
+    "bfs": BFSPathEngine,
+    "dijkstra": DijkstraPathEngine,
+    "ksp": KShortestPathEngine,
+}
+
+
+def get_path_engine(engine="bfs"):
+    """Return a path engine given either its name or an instance of PathEngine."""
+    if isinstance(engine, PathEngine):
+        return engine
+    try:
+        return PATH_ENGINES[engine.lower()]()
+    except (KeyError, AttributeError):
+        raise ValueError(f"Invalid path engine {engine}")
@@ -3,13 +3,98 @@ import logging
 import os
 
 import networkx as nx
+import numpy as np
 
-from distriopt.constants import NoPathFoundError
 from distriopt.decorators import cached, cachedproperty, implemented_if_true
+from distriopt.embedding.paths import get_path_engine, PathIndex
 
 _log = logging.getLogger(__name__)
 
 
+class CompiledPhysicalNetwork(object):
+    """Integer-indexed snapshot of a PhysicalNetwork.
+
+    Physical nodes are numbered from 0 to n-1 following the order of PhysicalNetwork.nodes(), with names and ids
+    translating between names and ids. Each interface (i, j, device_id) of a physical link is numbered from 0 to
+    m-1 following the order of PhysicalNetwork.edges(keys=True).
+
+    The adjacency is stored in CSR format: for the node i, indices[indptr[i]:indptr[i+1]] are its neighbors and
+    interfaces[indptr[i]:indptr[i+1]] the interfaces reaching them (a neighbor is repeated for each interface).
+    """
+
+    def __init__(self, physical):
+        self.names = list(physical.nodes())
+        self.ids = {u: idx for idx, u in enumerate(self.names)}
+        n_nodes = len(self.names)
+
+        # node capacities
+        self.cores = np.array([physical.cores(u) for u in self.names])
+        self.memory = np.array([physical.memory(u) for u in self.names])
+
+        # interfaces
+        edges = list(physical.edges(keys=True))
+        self.interface_src = np.array(
+            [self.ids[i] for (i, _, _) in edges], dtype=np.int64
+        )
+        self.interface_dst = np.array(
+            [self.ids[j] for (_, j, _) in edges], dtype=np.int64
+        )
+        self.interface_rate = np.array(
+            [physical.rate(i, j, device_id) for (i, j, device_id) in edges]
+        )
+        self.interface_device = [device_id for (_, _, device_id) in edges]
+        # (i, j, device_id) -> interface id, for both the directions
+        self.interface_ids = {}
+        for k, (i, j, device_id) in enumerate(edges):
+            self.interface_ids[(i, j, device_id)] = self.interface_ids[
+                (j, i, device_id)
+            ] = k
+
+        # CSR adjacency, each interface is considered in both the directions
+        heads = np.concatenate([self.interface_src, self.interface_dst])
+        tails = np.concatenate([self.interface_dst, self.interface_src])
+        interfaces = np.tile(np.arange(len(edges), dtype=np.int64), 2)
+        order = np.lexsort((tails, heads))
+        self.indices = tails[order]
+        self.interfaces = interfaces[order]
+        self.indptr = np.zeros(n_nodes + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=n_nodes), out=self.indptr[1:])
+
+        # total rate supported by the interfaces of each node
+        self.rate_out = np.bincount(
+            heads, weights=self.interface_rate[interfaces], minlength=n_nodes
+        )
+
+        # for each node, the list of (neighbor, [interfaces to reach it]) used by the path engines
+        indices, interfaces = self.indices.tolist(), self.interfaces.tolist()
+        self.adjacency = []
+        for i in range(n_nodes):
+            neighbors = {}
+            for idx in range(self.indptr[i], self.indptr[i + 1]):
+                neighbors.setdefault(indices[idx], []).append(interfaces[idx])
+            self.adjacency.append(list(neighbors.items()))
+        # (i, j) -> interfaces from the node id i to the node id j
+        self.link_interfaces = {
+            (i, j): interfaces
+            for i in range(n_nodes)
+            for j, interfaces in self.adjacency[i]
+        }
+        self.rates = self.interface_rate.tolist()
+
+    @property
+    def compute_nodes(self):
+        """Return the ids of the physical nodes able to run virtual nodes."""
+        return np.flatnonzero((self.cores > 0) & (self.memory > 0))
+
+    def sorted_compute_nodes(self, key):
+        """Return the names of the compute nodes sorted in non increasing order according to an array of keys."""
+        compute_nodes = self.compute_nodes
+        return [
+            self.names[i]
+            for i in compute_nodes[np.argsort(-key[compute_nodes], kind="stable")]
+        ]
+
+
 class PhysicalNetwork(object):
     "Utility class to model the physical network. Uses networkx.MultiGraph."
 
@@ -26,6 +111,27 @@ class PhysicalNetwork(object):
         """Physical nodes able to run virtual nodes."""
         return set(u for u in self.nodes() if self.cores(u) > 0 and self.memory(u) > 0)
 
+    @cachedproperty
+    def path_index(self):
+        """Index of the k shortest candidate paths between pairs of physical nodes."""
+        return PathIndex(self)
+
+    @cached
+    def compile(self):
+        """Return an integer-indexed snapshot of the physical network."""
+        return CompiledPhysicalNetwork(self)
+
+    def clear_cache(self):
+        """Drop the values cached for the physical network, so that it can be garbage collected."""
+        for prop in (PhysicalNetwork.compute_nodes, PhysicalNetwork.path_index):
+            prop.fget.cache.pop(self, None)
+        for func in (PhysicalNetwork.compile, PhysicalNetwork.rate_out):
+            for key in list(func.cache):
+                # the key is (args, kwargs) if the function was called with keyword arguments
+                args = key[0] if isinstance(key[0], tuple) else key
+                if args[0] is self:
+                    del func.cache[key]
+
     def edges(self, keys=False):
         """Return the edges of the graph."""
         return self._g.edges(keys=keys)
@@ -86,54 +192,18 @@ class PhysicalNetwork(object):
     def number_of_nodes(self):
         return self._g.number_of_nodes()
 
-    def find_path(self, source, target, req_rate=0, used_rate={}):
-        """Given the physical network, return the path between the source and the target nodes."""
-
-        path = [source]
-        interfaces_used = [None]
-
-        stack = [(u for u in self.neighbors(source))]
+    def find_path(self, source, target, req_rate=0, used_rate={}, engine="bfs"):
+        """Given the physical network, return the path between the source and the target nodes.
 
-        while stack:
-            prev = path[-1]
-            curr = next(stack[-1], None)
-            # if generator has not been exhausted
-            # take the first device which can support the requested rate
-            if curr is None:
-                stack.pop()
-                path.pop()
-                interfaces_used.pop()
-            else:
-                device_id = next(
-                    (
-                        device_id
-                        for device_id in self.interfaces_ids(prev, curr)
-                        if self.rate(prev, curr, device_id)
-                        >= req_rate
-                        + used_rate.get((prev, curr, device_id), 0)
-                        + used_rate.get((curr, prev, device_id), 0)
-                    ),
-                    None,
-                )
-
-                if device_id is not None:
-                    if curr == target:
-                        interfaces_used.append(device_id)
-                        path.append(target)
-                        # return a path as a list (i, j, device_id)
-                        res = [
-                            (path[i], path[i + 1], device_id)
-                            for (i, device_id) in zip(
-                                range(len(path) - 1), interfaces_used[1:]
-                            )
-                        ]
-                        return res
-                    elif curr not in path:
-                        interfaces_used.append(device_id)
-                        path.append(curr)
-                        stack.append((u for u in self.neighbors(curr)))
-        else:
-            raise NoPathFoundError
+        Only the interfaces with enough residual rate, given the rate already used in *used_rate*, are considered.
+        The path is computed by *engine*, either the name of a path engine ("bfs" for the minimum number of hops,
+        "dijkstra" for the minimum weight, "ksp" to scan the candidate paths in path_index) or an instance of
+        PathEngine.
+        The path is returned as a list of (i, j, device_id).
+        """
+        return get_path_engine(engine).find_path(
+            self, source, target, req_rate=req_rate, used_rate=used_rate
+        )
 
     @classmethod
     def from_mininet(
@@ -1,5 +1,4 @@
 import logging
-from collections import defaultdict
 
 from distriopt.constants import (
     EmptySolutionError,
@@ -7,6 +6,7 @@ from distriopt.constants import (
     NodeResourceError,
     LinkCapacityError,
 )
+from distriopt.embedding.ledger import ResidualLedger
 
 _log = logging.getLogger(__name__)
 
@@ -72,10 +72,12 @@ class Solution(object):
     {'path': [('grisou-6', 'eth1', 'gw-nancy', 'Ethernet1/29'), ('gw-nancy', 'Ethernet2/11', 'grisou-7', 'eth3')], 'f_rate': 1}
     """
 
-    def __init__(self, node_mapping, link_mapping, paths):
+    def __init__(self, node_mapping, link_mapping, paths, link_path=None):
         self.node_mapping = node_mapping
         self.link_mapping = link_mapping
         self.paths = paths
+        # paths as lists of (i, device_id, j) on the physical network used to compute the solution
+        self.link_path = link_path if link_path is not None else {}
         self.n_machines_used = len(set(node_mapping.values()))
 
     def node_info(self, node):
@@ -99,8 +101,12 @@ class Solution(object):
         raise NotImplementedError
 
     @staticmethod
-    def verify_solution(virtual, physical, node_mapping, link_path):
-        """check if the solution is correct"""
+    def verify_solution(virtual, physical, node_mapping, link_path, ledger=None):
+        """check if the solution is correct
+
+        If a ResidualLedger is given, the resources already used in the ledger are taken into account.
+        The ledger is left unchanged.
+        """
 
         #
         # empty solution or invalid solution
@@ -124,53 +130,51 @@ class Solution(object):
                 if len(link_path[(u, v)]) < 2:
                     raise AssignmentError((u, v))
 
-        #
-        # resource usage on nodes
-        #
-        node_cores_used = defaultdict(int)
-        node_memory_used = defaultdict(int)
-        for virtual_node, physical_node in node_mapping.items():
-            # cpu limit is not exceeded
-            node_cores_used[physical_node] += virtual.req_cores(virtual_node)
-            if node_cores_used[physical_node] > physical.cores(physical_node):
-                raise NodeResourceError(
-                    physical_node,
-                    "cpu cores",
-                    node_cores_used[physical_node],
-                    physical.cores(physical_node),
-                )
-            # memory limit is not exceeded
-            node_memory_used[physical_node] += virtual.req_memory(virtual_node)
-            if node_memory_used[physical_node] > physical.memory(physical_node):
-                raise NodeResourceError(
+        if ledger is None:
+            ledger = ResidualLedger(physical)
+
+        ledger.begin()
+        try:
+            #
+            # resource usage on nodes
+            #
+            for virtual_node, physical_node in node_mapping.items():
+                ledger.add_node(
                     physical_node,
-                    "memory",
-                    node_memory_used[physical_node],
-                    physical.memory(physical_node),
+                    virtual.req_cores(virtual_node),
+                    virtual.req_memory(virtual_node),
                 )
+                # cpu limit is not exceeded
+                if ledger.residual_cores(physical_node) < 0:
+                    raise NodeResourceError(
+                        physical_node,
+                        "cpu cores",
+                        ledger.cores_used[physical_node],
+                        physical.cores(physical_node),
+                    )
+                # memory limit is not exceeded
+                if ledger.residual_memory(physical_node) < 0:
+                    raise NodeResourceError(
+                        physical_node,
+                        "memory",
+                        ledger.memory_used[physical_node],
+                        physical.memory(physical_node),
+                    )
 
-        #
-        # resource usage on links
-        #
-        used_link_resources = {
-            (i, j): {interface: 0 for interface in physical.interfaces_ids(i, j)}
-            for (i, j) in physical.edges()
-        }
-
-        for (u, v) in link_path:
-            for s1, i1, t1 in link_path[(u, v)]:
-                try:
-                    used_link_resources[(s1, t1)][i1] += virtual.req_rate(u, v)
-                except KeyError:
-                    used_link_resources[(t1, s1)][i1] += virtual.req_rate(u, v)
-
-        for (i, j) in physical.edges():
-
-            for interface in physical.interfaces_ids(i, j):
-                if used_link_resources[(i, j)][interface] > physical.rate(
-                    i, j, interface
-                ):
+            #
+            # resource usage on links
+            #
+            used_interfaces = set()
+            for (u, v) in link_path:
+                for s1, i1, t1 in link_path[(u, v)]:
+                    ledger.add_rate(s1, t1, i1, virtual.req_rate(u, v))
+                    used_interfaces.add((s1, t1, i1))
+
+            for (i, j, interface) in used_interfaces:
+                if ledger.residual_rate(i, j, interface) < 0:
                     raise LinkCapacityError(f"Capacity exceeded on ({i},{j})")
+        finally:
+            ledger.rollback()
 
         # delay requirements are respected
         # @todo to be defined
@@ -370,7 +374,7 @@ class Solution(object):
                     )
                 ]
 
-        return cls(node_mapping, link_mapping, paths)
+        return cls(node_mapping, link_mapping, paths, link_path)
 
     def __str__(self):
         return (
@@ -2,17 +2,36 @@
 Base class.
 """
 import logging
-import math
+import multiprocessing
+import queue
 from abc import abstractmethod, ABCMeta
+from collections import defaultdict
 
 from mininet.topo import Topo
 
 from distriopt import VirtualNetwork
 from distriopt.constants import *
+from distriopt.decorators import timeit
 from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.bounds import lower_bound
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.paths import get_path_engine
+from distriopt.embedding.solution import Solution
 
 _log = logging.getLogger(__name__)
 
+# attempt function run by the worker processes of the parallel search
+_worker_attempt = None
+
+
+def _init_worker(attempt):
+    global _worker_attempt
+    _worker_attempt = attempt
+
+
+def _run_attempt(n):
+    return n, _worker_attempt(n)
+
 
 class EmbedSolver(object, metaclass=ABCMeta):
     def __init__(self, virtual, physical):
@@ -29,35 +48,219 @@ class EmbedSolver(object, metaclass=ABCMeta):
         )
         self.solution = None
         self.status = NotSolved
+        # number of full placements run by the last call to solve
+        self.n_solves = 0
 
     def lower_bound(self):
-        """Return a lower bound on the minimum number of physical machines needed to map all the virtual nodes."""
-        tot_req_cores = tot_req_memory = 0
-        for virtual_node in self.virtual.nodes():
-            # the total number of cores to be mapped
-            tot_req_cores += self.virtual.req_cores(virtual_node)
-            # the total required memory to be mapped
-            tot_req_memory += self.virtual.req_memory(virtual_node)
-
-        max_phy_memory = max_phy_cores = 0
-        for phy_node in self.physical.compute_nodes:
-            # the maximum capacity in terms of cores for a physical machine
-            max_phy_cores = (
-                self.physical.cores(phy_node)
-                if self.physical.cores(phy_node) > max_phy_cores
-                else max_phy_cores
+        """Return a lower bound on the minimum number of physical machines needed to map all the virtual nodes.
+
+        See distriopt.embedding.bounds for the bounds used.
+        """
+        return lower_bound(self.virtual, self.physical)
+
+    def _objective_value(self, solution, obj):
+        """Return the value of the objective obj for a solution."""
+        if obj == "min_n_machines":
+            return solution.n_machines_used
+        elif obj == "min_bw":
+            return sum(
+                self.virtual.req_rate(u, v) * len(path)
+                for (u, v), path in solution.link_path.items()
             )
-            # the maximum capacity in terms of memory for a physical machine
-            max_phy_memory = (
-                self.physical.memory(phy_node)
-                if self.physical.memory(phy_node) > max_phy_memory
-                else max_phy_memory
+        return 0
+
+    def search_n_machines(self, attempt, n_min, n_max, search="linear", n_jobs=1):
+        """Return the solution using the smallest number of physical machines found between n_min and n_max.
+
+        attempt(n) returns a solution using at most n physical machines, or None if it is not able to find one.
+        The "linear" search tries every n in increasing order. The "galloping" search tries n_min, n_min + 1,
+        n_min + 3, n_min + 7, ... until a solution is found, then bisects the last interval. The galloping search
+        requires O(log(n_max - n_min)) attempts but, since heuristics are not monotone in n, it may miss solutions
+        with fewer machines. The "parallel" search returns the same solution as the linear search, but keeps n_jobs
+        attempts in flight in a pool of processes: once a solution is found with n machines, the attempts with more
+        machines are cancelled and the workers still running are terminated. attempt must then be picklable.
+        The number of attempts is stored in n_solves. Return None if no solution is found.
+        """
+        if search not in ("linear", "galloping", "parallel"):
+            raise ValueError(f"Invalid search {search}")
+
+        self.n_solves = 0
+        solutions = {}
+
+        def _attempt(n):
+            self.n_solves += 1
+            solutions[n] = attempt(n)
+            return solutions[n]
+
+        if search == "linear":
+            return next(
+                (
+                    solution
+                    for solution in map(_attempt, range(n_min, n_max + 1))
+                    if solution is not None
+                ),
+                None,
             )
 
-        # lower bound, any feasible mapping requires at least this number of physical machines
-        return math.ceil(
-            max(tot_req_cores / max_phy_cores, tot_req_memory / max_phy_memory)
+        if search == "parallel":
+            return self._parallel_search(attempt, n_min, n_max, n_jobs)
+
+        if n_min > n_max:
+            return None
+        # galloping: low is the largest n without solution, high the smallest n with a solution
+        low, n, step = n_min - 1, n_min, 1
+        while _attempt(n) is None:
+            if n == n_max:
+                _log.debug(f"no solution found with {self.n_solves} attempts")
+                return None
+            low, n, step = n, min(n + step, n_max), step * 2
+        high = n
+        # bisection
+        while high - low > 1:
+            mid = (low + high) // 2
+            if _attempt(mid) is None:
+                low = mid
+            else:
+                high = mid
+        _log.debug(f"solution with {high} machines found with {self.n_solves} attempts")
+        return solutions[high]
+
+    def _parallel_search(self, attempt, n_min, n_max, n_jobs):
+        """Return the solution of the parallel search, see search_n_machines."""
+        # the attempt is sent once to each worker
+        pool = multiprocessing.Pool(
+            n_jobs, initializer=_init_worker, initargs=(attempt,)
+        )
+        # (n, solution) of the completed attempts, or the exception raised by an attempt
+        completed = queue.Queue()
+        # number of machines of the attempts in flight
+        in_flight = set()
+        n, best, best_solution = n_min, None, None
+        try:
+            while True:
+                while (
+                    n <= n_max
+                    and len(in_flight) < n_jobs
+                    and (best is None or n < best)
+                ):
+                    pool.apply_async(
+                        _run_attempt,
+                        (n,),
+                        callback=completed.put,
+                        error_callback=completed.put,
+                    )
+                    in_flight.add(n)
+                    self.n_solves += 1
+                    n += 1
+                if not in_flight:
+                    break
+
+                result = completed.get()
+                if isinstance(result, BaseException):
+                    raise result
+                m, solution = result
+                if m not in in_flight:
+                    # attempt already cancelled
+                    continue
+                in_flight.remove(m)
+                if solution is not None and (best is None or m < best):
+                    best, best_solution = m, solution
+                    # attempts with more machines than the best solution are useless
+                    in_flight = set(m for m in in_flight if m < best)
+        finally:
+            # stop the attempts still running
+            pool.terminate()
+            pool.join()
+
+        _log.debug(f"solution with {best} machines found with {self.n_solves} attempts")
+        return best_solution
+
+    @timeit
+    def update(self, solution, delta, **kwargs):
+        """Update solution, an embedding of the virtual network, with the changes of a VirtualDelta.
+
+        The virtual nodes and links not changed keep their mapping. The added virtual nodes are placed, largest
+        first, on the residual capacity of the physical node exchanging the most rate with their neighbors,
+        preferring the physical nodes already used. Only the added virtual links and the links of the added
+        nodes are routed. If the update succeeds, virtual and solution are replaced by the updated ones,
+        otherwise the status is Infeasible and they are left unchanged.
+        """
+        path_engine = get_path_engine(kwargs.get("path_engine", "bfs"))
+        virtual = delta.apply(self.virtual)
+        changed_nodes, changed_links = delta.changed_nodes(), delta.changed_links()
+
+        # resources used by the virtual nodes and links which keep their mapping
+        ledger = ResidualLedger(self.physical)
+        node_mapping = {
+            u: i for u, i in solution.node_mapping.items() if u not in changed_nodes
+        }
+        for u, i in node_mapping.items():
+            ledger.add_node(i, virtual.req_cores(u), virtual.req_memory(u))
+        link_path = {}
+        for (u, v), path in solution.link_path.items():
+            if u in node_mapping and v in node_mapping and (u, v) not in changed_links:
+                link_path[(u, v)] = path
+                ledger.add_path(
+                    [(i, j, device_id) for (i, device_id, j) in path],
+                    virtual.req_rate(u, v),
+                )
+
+        compiled = self.physical.compile()
+        sorted_compute_nodes = compiled.sorted_compute_nodes(
+            compiled.cores * 1000 + compiled.memory
+        )
+        used = set(node_mapping.values())
+        for u in sorted(
+            delta.add_nodes,
+            key=lambda u: (virtual.req_cores(u), virtual.req_memory(u)),
+            reverse=True,
+        ):
+            cores, memory = virtual.req_cores(u), virtual.req_memory(u)
+            # rate towards the physical nodes hosting the neighbors
+            rate_to = defaultdict(int)
+            for v in virtual.neighbors(u):
+                if v in node_mapping:
+                    rate_to[node_mapping[v]] += virtual.req_rate(u, v)
+            feasible = [
+                i for i in sorted_compute_nodes if ledger.fits(i, cores, memory)
+            ]
+            if not feasible:
+                _log.debug(f"no physical node can host {u}")
+                self.status = Infeasible
+                return self.status
+            phy_node = max(feasible, key=lambda i: (rate_to[i], i in used))
+            node_mapping[u] = phy_node
+            used.add(phy_node)
+            ledger.add_node(phy_node, cores, memory)
+
+        # virtual links between virtual nodes not mapped on the same physical machine which need a path
+        to_route = set(delta.add_links)
+        for u in delta.add_nodes:
+            to_route |= virtual.sorted_edges_from(u)
+        try:
+            for (u, v) in to_route:
+                if node_mapping[u] == node_mapping[v]:
+                    continue
+                path = self.physical.find_path(
+                    node_mapping[u],
+                    node_mapping[v],
+                    req_rate=virtual.req_rate(u, v),
+                    used_rate=ledger.rate_used,
+                    engine=path_engine,
+                )
+                ledger.add_path(path, virtual.req_rate(u, v))
+                link_path[(u, v)] = [(i, device_id, j) for (i, j, device_id) in path]
+        except NoPathFoundError:
+            _log.debug(f"no path found for the virtual link {(u, v)}")
+            self.status = Infeasible
+            return self.status
+
+        self.virtual = virtual
+        self.solution = Solution.build_solution(
+            virtual, self.physical, node_mapping, link_path, check_solution=False
         )
+        self.status = Solved
+        return self.status
 
     @abstractmethod
     def solve(self, **kwargs):
@@ -0,0 +1,133 @@
+"""
+Embedding of many virtual networks (tenants) on one shared physical network.
+
+The resources used by the admitted tenants are kept in a ResidualLedger. Each new tenant is embedded by a solver
+on a copy of the physical network with the residual capacities, after a check of the node bounds which rejects
+the tenants which cannot fit without running the solver.
+"""
+import logging
+
+import numpy as np
+
+from distriopt.constants import *
+from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.algorithms.greedy import EmbedGreedy
+from distriopt.embedding.bounds import capacity_bound
+from distriopt.embedding.ledger import ResidualLedger
+
+_log = logging.getLogger(__name__)
+
+
+class EmbeddingManager(object):
+    """Admit and release virtual networks on a shared physical network.
+
+    Each tenant is embedded by solver_class (an EmbedSolver) called with the arguments solver_kwargs.
+    tenants maps the name of each admitted tenant to its (virtual network, solution).
+    """
+
+    def __init__(self, physical, solver_class=EmbedGreedy, **solver_kwargs):
+        self.physical = physical
+        self.solver_class = solver_class
+        self.solver_kwargs = solver_kwargs
+        self.ledger = ResidualLedger(physical)
+        self.tenants = {}
+        self._residual = None
+
+    def residual(self):
+        """Return a copy of the physical network with the capacities not used by the tenants.
+
+        The copy, and the structures cached for it, are reused until a tenant is admitted or released.
+        """
+        if self._residual is None:
+            g = self.physical.g.copy()
+            for i in self.ledger.cores_used.keys() | self.ledger.memory_used.keys():
+                g.nodes[i]["cores"] = self.ledger.residual_cores(i)
+                g.nodes[i]["memory"] = self.ledger.residual_memory(i)
+            for (i, j, device_id) in self.ledger.rate_used.keys():
+                g[i][j][device_id]["rate"] = self.ledger.residual_rate(i, j, device_id)
+            self._residual = PhysicalNetwork(
+                g, grouped_interfaces=self.physical.grouped_interfaces
+            )
+        return self._residual
+
+    def _clear_residual(self):
+        """Drop the copy of the physical network after a change of the used capacities."""
+        if self._residual is not None:
+            self._residual.clear_cache()
+            self._residual = None
+
+    def fits(self, virtual):
+        """Return False if the virtual network cannot fit in the residual capacities.
+
+        The node bounds of distriopt.embedding.bounds are compared with the number of physical nodes with
+        residual capacity, so that True does not guarantee that an embedding exists.
+        """
+        compact = virtual.compact()
+        if not len(compact.cores):
+            return True
+        compiled = self.physical.compile()
+        compute_nodes = [compiled.names[i] for i in compiled.compute_nodes]
+        res_cores = np.array([self.ledger.residual_cores(i) for i in compute_nodes])
+        res_memory = np.array([self.ledger.residual_memory(i) for i in compute_nodes])
+        available = (res_cores > 0) & (res_memory > 0)
+        if not available.any():
+            return False
+        return capacity_bound(
+            compact.cores, compact.memory, res_cores[available], res_memory[available]
+        ) <= np.count_nonzero(available)
+
+    def admit(self, name, virtual, **kwargs):
+        """Embed the virtual network of a new tenant, return the status of the embedding.
+
+        kwargs override the arguments of the solver. The tenant is rejected (status Infeasible) if it does not
+        pass the bound check or if the solver does not find an embedding.
+        """
+        if name in self.tenants:
+            raise ValueError(f"Tenant {name} already admitted")
+        if not self.fits(virtual):
+            _log.debug(f"tenant {name} rejected by the bound check")
+            return Infeasible
+
+        prob = self.solver_class(virtual, self.residual())
+        _, status = prob.solve(**dict(self.solver_kwargs, **kwargs))
+        if status != Solved:
+            _log.debug(f"tenant {name} rejected by the solver with status {status}")
+            return Infeasible if status == NotSolved else status
+
+        # the solution respects the residual capacities
+        solution = prob.solution
+        self._clear_residual()
+        for u, i in solution.node_mapping.items():
+            self.ledger.add_node(i, virtual.req_cores(u), virtual.req_memory(u))
+        for (u, v), path in solution.link_path.items():
+            self.ledger.add_path(
+                [(i, j, device_id) for (i, device_id, j) in path],
+                virtual.req_rate(u, v),
+            )
+        self.tenants[name] = (virtual, solution)
+        _log.debug(f"tenant {name} admitted on {solution.n_machines_used} machines")
+        return Solved
+
+    def admit_batch(self, tenants, **kwargs):
+        """Embed the virtual networks of a dict name -> virtual network, return the dict name -> status.
+
+        The largest virtual networks, by total number of cores, are embedded first.
+        """
+        order = sorted(
+            tenants,
+            key=lambda name: tenants[name].compact().cores.sum(),
+            reverse=True,
+        )
+        return {name: self.admit(name, tenants[name], **kwargs) for name in order}
+
+    def release(self, name):
+        """Release the resources used by a tenant."""
+        virtual, solution = self.tenants.pop(name)
+        self._clear_residual()
+        for u, i in solution.node_mapping.items():
+            self.ledger.release_node(i, virtual.req_cores(u), virtual.req_memory(u))
+        for (u, v), path in solution.link_path.items():
+            self.ledger.release_path(
+                [(i, j, device_id) for (i, device_id, j) in path],
+                virtual.req_rate(u, v),
+            )
@@ -1,12 +1,14 @@
 import logging
 from collections import defaultdict
 
+import numpy as np
 import pulp
 
 from distriopt.constants import *
 from distriopt.decorators import timeit
 from distriopt.packing import PackingSolver
 from distriopt.packing.solution import Solution
+from distriopt.sparse import SparseModel
 
 _log = logging.getLogger(__name__)
 
@@ -32,6 +34,8 @@ class PackILP(PackingSolver):
 
         solver_name = kwargs.get("solver", "cplex").lower()
         timelimit = int(kwargs.get("timelimit", "3600"))
+        # "pulp" builds the model with PuLP expressions, "sparse" directly as a sparse matrix
+        model = kwargs.get("model", "pulp")
         _log.info(f"called solve with the following parameters: {kwargs}")
         # UB on the number of instances of a certain type
         instances_UB = {
@@ -42,6 +46,19 @@ class PackILP(PackingSolver):
             u: self._get_feasible_instances(u) for u in self.virtual.nodes()
         }
 
+        if model == "sparse":
+            # the solver runs in the background until it exits or until the target gap or the deadline is reached
+            run = self._start_sparse(
+                kwargs.get("solver", "glpk").lower(),
+                timelimit,
+                instances_UB,
+                feasible_instances,
+            )
+            run.wait(kwargs.get("target_gap"), kwargs.get("deadline"))
+            return self.status
+        elif model != "pulp":
+            raise ValueError(f"Invalid model {model}")
+
         vm_used = pulp.LpVariable.dicts(
             "vm_used",
             (
@@ -149,6 +166,101 @@ class PackILP(PackingSolver):
         self.status = Solved
         return Solved
 
+    def start(self, **kwargs):
+        """Start solving the ILP, built as a sparse matrix, in the background and return the SolverRun.
+
+        The parameters are the ones of solve, only the solvers "cbc" and "glpk" (the default) are supported. While
+        the solver is running, the run gives the objective value of the best solution found (incumbent), the bound
+        and the gap, and can be stopped. The solution and current_val are set when the solver exits.
+        """
+        solver_name = kwargs.get("solver", "glpk").lower()
+        timelimit = int(kwargs.get("timelimit", "3600"))
+        instances_UB = {
+            vm_type: self._get_ub(vm_type) for vm_type in self.physical.vm_options
+        }
+        feasible_instances = {
+            u: self._get_feasible_instances(u) for u in self.virtual.nodes()
+        }
+        return self._start_sparse(
+            solver_name, timelimit, instances_UB, feasible_instances
+        )
+
+    def _start_sparse(self, solver_name, timelimit, instances_UB, feasible_instances):
+        """Build the model of solve directly as a sparse matrix and start the solver in the background."""
+        nodes = list(self.virtual.nodes())
+        node_index = {u: r for r, u in enumerate(nodes)}
+        vm_keys = [
+            (vm_type, vm_id)
+            for vm_type in self.physical.vm_options
+            for vm_id in range(instances_UB[vm_type])
+        ]
+        vm_index = {key: k for k, key in enumerate(vm_keys)}
+        node_keys = [
+            (u, vm_type, vm_id)
+            for u in nodes
+            for vm_type in feasible_instances[u]
+            for vm_id in range(instances_UB[vm_type])
+        ]
+
+        model = SparseModel("Packing_ILP")
+        vm_used = model.add_variables(
+            len(vm_keys),
+            upper=1,
+            integer=True,
+            cost=[self.physical.hourly_cost(vm_type) for (vm_type, _) in vm_keys],
+        )
+        node_mapping = model.add_variables(len(node_keys), upper=1, integer=True)
+
+        # Assignment of a virtual node to an EC2 instance
+        model.add_constraints(
+            [node_index[u] for (u, _, _) in node_keys],
+            node_mapping,
+            1,
+            "E",
+            np.ones(len(nodes)),
+        )
+
+        # CPU cores and memory capacity constraints
+        vm_rows = [vm_index[(vm_type, vm_id)] for (_, vm_type, vm_id) in node_keys]
+        for demand, capacity in (
+            (self.virtual.req_cores, self.physical.cores),
+            (self.virtual.req_memory, self.physical.memory),
+        ):
+            model.add_constraints(
+                np.concatenate([vm_rows, np.arange(len(vm_keys))]),
+                np.concatenate([node_mapping, vm_used]),
+                np.concatenate(
+                    [
+                        [demand(u) for (u, _, _) in node_keys],
+                        [-capacity(vm_type) for (vm_type, _) in vm_keys],
+                    ]
+                ),
+                "L",
+                np.zeros(len(vm_keys)),
+            )
+
+        self.solution, self.status, self.current_val = None, NotSolved, 0
+
+        def finish(run):
+            if run.bound is not None:
+                self.current_val = round(run.bound, 2)
+            if model.status == "Infeasible":
+                self.status = Infeasible
+            elif model.values is not None and (
+                model.status == "Optimal"
+                or np.round(model.values[node_mapping]).sum() == len(nodes)
+            ):
+                assignment_ec2_instances = defaultdict(list)
+                for k in np.flatnonzero(model.values[node_mapping] > 0.5).tolist():
+                    u, vm_type, vm_id = node_keys[k]
+                    assignment_ec2_instances[(vm_type, vm_id)].append(u)
+                self.solution = Solution.build_solution(
+                    self.virtual, self.physical, assignment_ec2_instances
+                )
+                self.status = Solved
+
+        return model.start(solver_name, timelimit, callback=finish)
+
     @staticmethod
     def build_ILP_solution(node_mapping):
         """Build an assignment of virtual nodes and virtual links starting from the values of the variables in the ILP."""
@@ -0,0 +1,393 @@
+"""
+Linear models built directly in sparse format.
+
+Building large models with PuLP expressions is slow: each term is a Python object and each constraint is named. A
+SparseModel stores the variables as numpy arrays and the constraint matrix in COO format, blocks of constraints are
+added at once from arrays of indices. The model is written in MPS format and solved by the command line solvers
+shipped with PuLP (CBC and GLPK).
+
+Solvers run in the background: the objective of the best solution found and the bound are read from their log
+while they are running, and they can be stopped early once the gap is small enough or a deadline is reached.
+"""
+import logging
+import os
+import pty
+import re
+import shutil
+import signal
+import subprocess
+import tempfile
+import threading
+import time
+
+import numpy as np
+import pulp
+
+_log = logging.getLogger(__name__)
+
+
+class SparseModel(object):
+    """Linear model (minimization) whose constraint matrix is assembled in COO format."""
+
+    def __init__(self, name="model"):
+        self.name = name
+        self.n_vars = 0
+        self.n_constraints = 0
+        # variables
+        self._cost, self._lower, self._upper, self._integer = [], [], [], []
+        # constraints
+        self._rows, self._cols, self._coefs = [], [], []
+        self._senses, self._rhs = [], []
+        # solution
+        self.status = "Not Solved"
+        self.values = None
+        self.objective_value = None
+
+    def add_variables(self, n, lower=0, upper=np.inf, integer=False, cost=0):
+        """Add n variables, the bounds and the cost are scalars or arrays of size n. Return their indices."""
+        self._cost.append(np.broadcast_to(np.asarray(cost, dtype=float), (n,)))
+        self._lower.append(np.broadcast_to(np.asarray(lower, dtype=float), (n,)))
+        self._upper.append(np.broadcast_to(np.asarray(upper, dtype=float), (n,)))
+        self._integer.append(np.broadcast_to(np.asarray(integer, dtype=bool), (n,)))
+        self.n_vars += n
+        return np.arange(self.n_vars - n, self.n_vars)
+
+    def add_constraints(self, rows, cols, coefs, sense, rhs):
+        """Add len(rhs) constraints and return their indices.
+
+        The nonzero coefficients are given in COO format: rows are indices in 0..len(rhs)-1 relative to the block,
+        cols are indices of variables. Duplicated entries are summed. sense is "L" (<=), "E" (==) or "G" (>=), either
+        for all the constraints or for each of them.
+        """
+        rhs = np.atleast_1d(np.asarray(rhs, dtype=float))
+        n = len(rhs)
+        rows = np.asarray(rows, dtype=np.int64)
+        self._rows.append(rows + self.n_constraints)
+        self._cols.append(np.asarray(cols, dtype=np.int64))
+        self._coefs.append(np.broadcast_to(np.asarray(coefs, dtype=float), rows.shape))
+        self._senses.append(np.broadcast_to(np.asarray(sense), (n,)))
+        self._rhs.append(rhs)
+        self.n_constraints += n
+        return np.arange(self.n_constraints - n, self.n_constraints)
+
+    def set_upper_bounds(self, cols, upper):
+        """Change the upper bound of the given variables."""
+        upper_bounds = self._concatenate(self._upper, float)
+        upper_bounds[cols] = upper
+        self._upper = [upper_bounds]
+
+    @staticmethod
+    def _concatenate(arrays, dtype):
+        return np.concatenate(arrays).astype(dtype) if arrays else np.empty(0, dtype)
+
+    @property
+    def cost(self):
+        return self._concatenate(self._cost, float)
+
+    def coo(self):
+        """Return the rows, the columns and the values of the nonzero coefficients, duplicated entries are summed."""
+        rows = self._concatenate(self._rows, np.int64)
+        cols = self._concatenate(self._cols, np.int64)
+        coefs = self._concatenate(self._coefs, float)
+        keys, inverse = np.unique(rows * self.n_vars + cols, return_inverse=True)
+        coefs = np.bincount(inverse, coefs, len(keys))
+        nonzero = coefs != 0
+        return keys[nonzero] // self.n_vars, keys[nonzero] % self.n_vars, coefs[nonzero]
+
+    def csr(self):
+        """Return the constraint matrix in CSR format as (indptr, indices, data)."""
+        rows, cols, coefs = self.coo()
+        indptr = np.zeros(self.n_constraints + 1, dtype=np.int64)
+        np.cumsum(np.bincount(rows, minlength=self.n_constraints), out=indptr[1:])
+        return indptr, cols, coefs
+
+    def write_mps(self, path):
+        """Write the model in MPS format, variables are named x<index> and constraints r<index>."""
+        cost = self.cost
+        lower = self._concatenate(self._lower, float)
+        upper = self._concatenate(self._upper, float)
+        integer = self._concatenate(self._integer, bool)
+        senses = self._concatenate(self._senses, str)
+        rhs = self._concatenate(self._rhs, float)
+
+        lines = [f"NAME          {self.name}\n", "ROWS\n", " N  obj\n"]
+        lines.extend(f" {s}  r{i}\n" for i, s in enumerate(senses.tolist()))
+
+        # the objective is the row -1, its coefficient is always written to declare the variable
+        rows, cols, coefs = self.coo()
+        rows = np.concatenate([np.full(self.n_vars, -1), rows])
+        cols = np.concatenate([np.arange(self.n_vars), cols])
+        coefs = np.concatenate([cost, coefs])
+        # MPS lists the coefficients by column, continuous variables first and then the integer ones between markers
+        order = np.lexsort((rows, cols, integer[cols]))
+        rows, cols, coefs = rows[order], cols[order], coefs[order]
+        n_continuous = int(np.count_nonzero(~integer[cols]))
+
+        row_names = [f"r{i:<7}" for i in range(self.n_constraints)] + ["obj     "]
+        column_lines = [
+            "    x%-7d  %s  % .12g\n" % (j, row_names[i], coef)
+            for j, i, coef in zip(cols.tolist(), rows.tolist(), coefs.tolist())
+        ]
+        lines.append("COLUMNS\n")
+        lines.extend(column_lines[:n_continuous])
+        if n_continuous < len(column_lines):
+            lines.append("    MARK      'MARKER'                 'INTORG'\n")
+            lines.extend(column_lines[n_continuous:])
+            lines.append("    MARK      'MARKER'                 'INTEND'\n")
+
+        lines.append("RHS\n")
+        lines.extend(
+            f"    RHS       r{i:<7}  {rhs[i]: .12g}\n"
+            for i in np.flatnonzero(rhs).tolist()
+        )
+
+        lines.append("BOUNDS\n")
+        for j in np.flatnonzero((lower != 0) | (upper != np.inf) | integer).tolist():
+            if lower[j] == upper[j]:
+                lines.append(f" FX BND       x{j:<7}  {lower[j]: .12g}\n")
+                continue
+            if lower[j] == -np.inf:
+                lines.append(f" MI BND       x{j:<7}\n")
+            elif lower[j] != 0:
+                lines.append(f" LO BND       x{j:<7}  {lower[j]: .12g}\n")
+            if upper[j] != np.inf:
+                lines.append(f" UP BND       x{j:<7}  {upper[j]: .12g}\n")
+            elif integer[j]:
+                # some readers give an upper bound of 1 to the integer variables
+                lines.append(f" PL BND       x{j:<7}\n")
+        lines.append("ENDATA\n")
+
+        with open(path, "w") as f:
+            f.writelines(lines)
+
+    def _command(self, solver_name, timelimit, mps_path, solution_path):
+        """Return the command line of the solver, the function reading its solution and the one parsing its log."""
+        if solver_name == "cbc":
+            cmd = [
+                pulp.PULP_CBC_CMD().path,
+                mps_path,
+                "-sec",
+                str(timelimit),
+                "-solve",
+                "-solu",
+                solution_path,
+            ]
+            return cmd, self._read_cbc_solution, _parse_cbc_log
+        elif solver_name == "glpk":
+            cmd = [
+                pulp.GLPK_CMD().path,
+                "--freemps",
+                mps_path,
+                "--tmlim",
+                str(timelimit),
+                "-w",
+                solution_path,
+            ]
+            return cmd, self._read_glpk_solution, _parse_glpk_log
+        else:
+            raise ValueError(f"Invalid solver name {solver_name}")
+
+    def start(self, solver_name="cbc", timelimit=3600, incumbent=None, callback=None):
+        """Start the command line solver solver_name ("cbc" or "glpk") in the background and return the SolverRun.
+
+        incumbent is the objective value of a known solution, if any. callback is called with the run once the
+        solution of the solver has been read.
+        """
+        return SolverRun(self, solver_name, timelimit, incumbent, callback)
+
+    def solve(self, solver_name="cbc", timelimit=3600):
+        """Solve the model with the command line solver solver_name ("cbc" or "glpk") and return the status.
+
+        The status is a PuLP status string ("Optimal", "Infeasible", "Not Solved", ...). The values of the variables
+        of the best solution found are stored in values, None if no solution has been found.
+        """
+        return self.start(solver_name, timelimit).wait()
+
+    def _read_cbc_solution(self, f):
+        header = f.readline()
+        if header.startswith("Optimal"):
+            self.status = "Optimal"
+        elif "nfeasible" in header.split(" - ")[0]:
+            self.status = "Infeasible"
+            return
+        elif header.startswith("Unbounded"):
+            self.status = "Unbounded"
+            return
+        if "no integer solution" in header:
+            return
+
+        values = np.zeros(self.n_vars)
+        for line in f:
+            tokens = line.split()
+            if tokens[0] == "**":
+                # the constraint or the variable is infeasible (within the tolerances)
+                tokens = tokens[1:]
+            if tokens[1].startswith("x"):
+                values[int(tokens[1][1:])] = float(tokens[2])
+        self._set_values(values)
+
+    def _read_glpk_solution(self, f):
+        values = np.zeros(self.n_vars)
+        kind = None
+        for line in f:
+            tokens = line.split()
+            if tokens[0] == "s":
+                # s mip <rows> <cols> <status> <objective> or s bas <rows> <cols> <primal status> ...
+                kind, status = tokens[1], tokens[4]
+                if status == "n":
+                    self.status = "Infeasible"
+                    return
+                if status not in ("o", "f"):
+                    self.status = "Undefined"
+                    return
+                self.status = "Optimal" if status == "o" else "Not Solved"
+            elif tokens[0] == "j":
+                # j <col> <value> for MIP, j <col> <status> <value> <dual> for LP
+                values[int(tokens[1]) - 1] = float(
+                    tokens[2] if kind == "mip" else tokens[3]
+                )
+        if kind is not None:
+            self._set_values(values)
+
+    def _set_values(self, values):
+        self.values = values
+        self.objective_value = float(self.cost @ values)
+
+
+class SolverRun(object):
+    """Command line solver running in the background on a SparseModel.
+
+    The solver writes its log on a pseudo terminal, so that it is not buffered, and a thread parses it to keep track
+    of the objective value of the best solution found (incumbent) and of the bound on the optimal value. When the
+    solver exits, its solution is read in the model and the callback, if any, is called with the run.
+    """
+
+    def __init__(self, model, solver_name, timelimit, incumbent=None, callback=None):
+        self.model = model
+        self.incumbent = incumbent
+        self.bound = None
+        self._callback = callback
+        self._stopped = False
+        self._done = threading.Event()
+
+        self._tmp_dir = tempfile.mkdtemp()
+        mps_path = os.path.join(self._tmp_dir, "model.mps")
+        self._solution_path = os.path.join(self._tmp_dir, "model.sol")
+        cmd, self._read_solution, self._parse_log = model._command(
+            solver_name, timelimit, mps_path, self._solution_path
+        )
+        model.write_mps(mps_path)
+        model.status, model.values, model.objective_value = "Not Solved", None, None
+        _log.debug(
+            f"solving {model.n_vars} variables and {model.n_constraints} constraints with {solver_name}"
+        )
+
+        master, slave = pty.openpty()
+        self._process = subprocess.Popen(
+            cmd, stdin=subprocess.DEVNULL, stdout=slave, stderr=slave
+        )
+        os.close(slave)
+        threading.Thread(target=self._follow, args=(master,), daemon=True).start()
+
+    @property
+    def done(self):
+        return self._done.is_set()
+
+    @property
+    def gap(self):
+        """Relative gap between the incumbent and the bound, None if any of them is unknown."""
+        if self.incumbent is None or self.bound is None:
+            return None
+        return max(0.0, self.incumbent - self.bound) / max(abs(self.incumbent), 1e-9)
+
+    def _update(self, incumbent=None, bound=None):
+        if incumbent is not None and (
+            self.incumbent is None or incumbent < self.incumbent
+        ):
+            self.incumbent = incumbent
+        if bound is not None and (self.bound is None or bound > self.bound):
+            self.bound = bound
+
+    def _follow(self, fd):
+        """Parse the log until the solver exits, then read the solution."""
+        try:
+            with open(fd, errors="replace") as log:
+                try:
+                    for line in log:
+                        self._update(*self._parse_log(line))
+                except OSError:
+                    # the pseudo terminal is closed when the solver exits
+                    pass
+            self._process.wait()
+            if os.path.exists(self._solution_path):
+                with open(self._solution_path) as f:
+                    self._read_solution(f)
+            if self.model.values is not None:
+                self._update(incumbent=self.model.objective_value)
+            if self.model.status == "Optimal":
+                self._update(bound=self.incumbent)
+            if self._callback is not None:
+                self._callback(self)
+        finally:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+            self._done.set()
+
+    def stop(self):
+        """Interrupt the solver. CBC keeps the best solution found, GLPK exits without a solution."""
+        if not self._stopped and self._process.poll() is None:
+            self._stopped = True
+            self._process.send_signal(signal.SIGINT)
+
+    def wait(self, target_gap=None, deadline=None, poll_interval=0.1):
+        """Wait for the solver to exit and return the status of the model.
+
+        The solver is stopped as soon as the gap is at most target_gap or at the time deadline (as returned by
+        time.time()).
+        """
+        while not self._done.wait(
+            poll_interval if target_gap is not None or deadline is not None else None
+        ):
+            gap = self.gap
+            if (target_gap is not None and gap is not None and gap <= target_gap) or (
+                deadline is not None and time.time() >= deadline
+            ):
+                self.stop()
+        return self.model.status
+
+
+def _to_float(value):
+    try:
+        return float(value)
+    except ValueError:
+        return None
+
+
+def _parse_cbc_log(line):
+    """Return the incumbent and the bound (None if not given) from a line of the log of CBC."""
+    incumbent = bound = None
+    match = re.search(r"Integer solution of (\S+) found", line)
+    if match:
+        incumbent = _to_float(match.group(1))
+    # Cbc0010I After <n> nodes, <n> on tree, <incumbent> best solution, best possible <bound>
+    match = re.search(r"(\S+) best solution, best possible (\S+)", line)
+    if match:
+        incumbent, bound = _to_float(match.group(1)), _to_float(match.group(2))
+        # 1e+50 if no solution has been found yet
+        if incumbent is not None and incumbent >= 1e50:
+            incumbent = None
+    match = re.search(r"Continuous objective value is (\S+)", line)
+    if match:
+        bound = _to_float(match.group(1))
+    match = re.search(r"best objective (\S+?),? .*best possible (\S+?)\)", line)
+    if match:
+        incumbent, bound = _to_float(match.group(1)), _to_float(match.group(2))
+    return incumbent, bound
+
+
+def _parse_glpk_log(line):
+    """Return the incumbent and the bound (None if not given) from a line of the log of GLPK."""
+    # +  <iterations>: mip = <incumbent or "not found yet"> >= <bound or "tree is empty"> <gap> (<nodes>)
+    match = re.search(r"mip =\s+(not found yet|\S+)\s+>=\s+(\S+)", line)
+    if not match:
+        return None, None
+    return _to_float(match.group(1)), _to_float(match.group(2))
@@ -10,12 +10,109 @@ import json
 import os
 
 import networkx as nx
+import numpy as np
 
 from distriopt.decorators import cached
 
 _log = logging.getLogger(__name__)
 
 
+class CompactVirtualNetwork(object):
+    """Frozen integer-indexed view of a VirtualNetwork.
+
+    Virtual nodes are numbered from 0 to n-1 following the order of VirtualNetwork.nodes(), with names and ids
+    translating between names and ids. Demands are stored in the read-only arrays cores and memory, while virtual
+    links are stored in COO format as the read-only arrays src, dst and rate.
+    The adjacency is also stored in CSR format: for the node u, indices[indptr[u]:indptr[u+1]] are its neighbors
+    and weights[indptr[u]:indptr[u+1]] the rates of the links reaching them.
+    """
+
+    def __init__(self, virtual):
+        self.names = list(virtual.nodes())
+        self.ids = {u: idx for idx, u in enumerate(self.names)}
+
+        # node demands
+        self.cores = np.array([virtual.req_cores(u) for u in self.names])
+        self.memory = np.array([virtual.req_memory(u) for u in self.names])
+
+        # link demands
+        edges = list(virtual.edges())
+        self.src = np.array([self.ids[u] for (u, _) in edges], dtype=np.int64)
+        self.dst = np.array([self.ids[v] for (_, v) in edges], dtype=np.int64)
+        self.rate = np.array([virtual.req_rate(u, v) for (u, v) in edges])
+
+        # CSR adjacency, each link is considered in both the directions
+        heads = np.concatenate([self.src, self.dst])
+        order = np.argsort(heads, kind="stable")
+        self.indices = np.concatenate([self.dst, self.src])[order]
+        self.weights = np.concatenate([self.rate, self.rate])[order]
+        self.indptr = np.zeros(len(self.names) + 1, dtype=np.int64)
+        np.cumsum(np.bincount(heads, minlength=len(self.names)), out=self.indptr[1:])
+
+        for array in (
+            self.cores,
+            self.memory,
+            self.src,
+            self.dst,
+            self.rate,
+            self.indptr,
+            self.indices,
+            self.weights,
+        ):
+            array.flags.writeable = False
+
+    def number_of_nodes(self):
+        """Return the number of nodes."""
+        return len(self.names)
+
+    def number_of_edges(self):
+        """Return the number of edges."""
+        return len(self.src)
+
+    def neighbors(self, u):
+        """Return the neighbors of the node id u and the rates of the links reaching them."""
+        start, end = self.indptr[u], self.indptr[u + 1]
+        return self.indices[start:end], self.weights[start:end]
+
+    def to_ids(self, nodes):
+        """Return the array of ids of the given virtual nodes."""
+        return np.fromiter((self.ids[u] for u in nodes), dtype=np.int64)
+
+    def rate_out(self):
+        """Return for each node the total rate of its virtual links."""
+        n_nodes = self.number_of_nodes()
+        return np.bincount(self.src, self.rate, n_nodes) + np.bincount(
+            self.dst, self.rate, n_nodes
+        )
+
+    def assignment(self, partitions):
+        """Return an array with the index of the partition of each node given a list of sets of nodes."""
+        assignment = np.empty(self.number_of_nodes(), dtype=np.int64)
+        for id_partition, partition in enumerate(partitions):
+            assignment[self.to_ids(partition)] = id_partition
+        return assignment
+
+    def partitions(self, assignment, n_partitions=None):
+        """Return a list of sets of nodes given the index of the partition of each node."""
+        if n_partitions is None:
+            n_partitions = assignment.max() + 1 if len(assignment) else 0
+        partitions = [set() for _ in range(n_partitions)]
+        for u, id_partition in zip(self.names, assignment.tolist()):
+            partitions[id_partition].add(u)
+        return partitions
+
+    def cut_weight(self, assignment):
+        """Return the total rate of the links between nodes in different partitions."""
+        return self.rate[assignment[self.src] != assignment[self.dst]].sum()
+
+    def partition_loads(self, assignment, n_partitions):
+        """Return the total cores and memory required by each partition."""
+        return (
+            np.bincount(assignment, self.cores, n_partitions),
+            np.bincount(assignment, self.memory, n_partitions),
+        )
+
+
 class VirtualNetwork(object):
     "Utility class to model the virtual network. Uses networkx.Graph."
 
@@ -35,6 +132,11 @@ class VirtualNetwork(object):
         """Return the edges of the graph."""
         return self._g.edges()
 
+    @cached
+    def compact(self):
+        """Return a frozen integer-indexed view of the virtual network."""
+        return CompactVirtualNetwork(self)
+
     @cached
     def sorted_edges(self):
         """Return the edges of the graph sorted in lexicographic way."""
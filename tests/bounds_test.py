@@ -0,0 +1,57 @@
+import networkx as nx
+import numpy as np
+import pytest
+
+from distriopt import VirtualNetwork
+from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.bounds import (
+    conflict_bound,
+    l2_bound,
+    lower_bound,
+    volume_bound,
+)
+
+
+def test_volume_bound():
+    """Test that the largest machines are used first."""
+    assert volume_bound(np.array([4, 4, 4]), np.array([2, 10, 1, 1])) == 2
+    assert volume_bound(np.array([4, 4, 4]), np.array([2, 2])) == 3
+    assert volume_bound(np.array([0, 0]), np.array([2, 2])) == 0
+
+
+@pytest.mark.parametrize(
+    "sizes, expected",
+    [([6, 6, 6], 3), ([6, 6, 6, 4, 4, 4], 3), ([6, 4, 4, 4, 4], 3), ([1] * 25, 3)],
+)
+def test_l2_bound(sizes, expected):
+    assert l2_bound(np.array(sizes), 10) == expected
+
+
+def test_conflict_bound():
+    """Test that nodes large in different resources can share a machine."""
+    cores, memory = np.array([3, 3, 1, 1]), np.array([1, 1, 3, 3])
+    assert conflict_bound(cores, memory, np.array([4, 4]), np.array([4, 4])) == 2
+    assert conflict_bound(cores, memory, np.array([4, 4]), np.array([3, 3])) == 4
+
+
+def _virtual(n_nodes, cores, memory, rate):
+    g = nx.complete_graph(n_nodes)
+    nx.set_node_attributes(g, cores, "cores")
+    nx.set_node_attributes(g, memory, "memory")
+    nx.set_edge_attributes(g, rate, "rate")
+    return VirtualNetwork(nx.relabel_nodes(g, lambda u: f"Node_{u}"))
+
+
+def test_node_bounds():
+    """Test virtual nodes larger than half a machine."""
+    physical = PhysicalNetwork.create_test_nw(cores=4, memory=4000)
+    assert lower_bound(_virtual(2, 3, 1000, 1), physical) == 2
+    assert lower_bound(_virtual(3, 3, 1000, 1), physical) == 3
+    assert lower_bound(_virtual(3, 1, 1000, 1), physical) == 1
+
+
+def test_cut_bound():
+    """Test that machines without enough outgoing rate are not counted."""
+    virtual = _virtual(2, 3, 1000, 20000)
+    assert lower_bound(virtual, PhysicalNetwork.create_test_nw(rate=10000)) == 2
+    assert lower_bound(virtual, PhysicalNetwork.create_test_nw(rate=5000)) == 3
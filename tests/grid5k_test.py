@@ -1,15 +1,26 @@
+import functools
+import time
+
 import networkx as nx
+import numpy as np
 import pytest
 
 from distriopt import VirtualNetwork
 from distriopt.constants import *
-from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding import PhysicalNetwork, VirtualDelta
 from distriopt.embedding.algorithms import (
     EmbedBalanced,
+    EmbedColumnGeneration,
     EmbedILP,
     EmbedPartition,
     EmbedGreedy,
+    PortfolioSolver,
+    RandomSelection,
 )
+from distriopt.embedding.algorithms.colgen import _shortest_paths
+from distriopt.embedding.algorithms.portfolio import _member_kwargs
+from distriopt.embedding.algorithms.random import sample_assignments
+from distriopt.embedding.solution import Solution
 
 
 @pytest.fixture(scope="module")
@@ -61,3 +72,469 @@ class TestGroupInterfaces(object):
         for link_map in solution.link_info(("Node_0", "Node_1")):
             assert link_map.s_node == solution.node_info("Node_0")
             assert link_map.d_node == solution.node_info("Node_1")
+
+
+@pytest.mark.parametrize("threshold", [1, 2, 7, 30, 50])
+def test_galloping_search(threshold):
+    """Test that the galloping search finds the smallest n with a solution of a monotone attempt."""
+    prob = EmbedGreedy(None, None)
+    solution = prob.search_n_machines(
+        lambda n: n if n >= threshold else None, 1, 50, search="galloping"
+    )
+    assert solution == threshold
+    assert prob.n_solves <= 12
+
+    assert prob.search_n_machines(lambda n: None, 1, 50, search="galloping") is None
+
+    prob.search_n_machines(lambda n: n if n >= threshold else None, 1, 50)
+    assert prob.n_solves == threshold
+
+
+def _threshold_attempt(n, threshold):
+    return n if n >= threshold else None
+
+
+@pytest.mark.parametrize("threshold", [1, 7, 50, 51])
+def test_parallel_search(threshold):
+    """Test that the parallel search finds the smallest n with a solution."""
+    prob = EmbedGreedy(None, None)
+    solution = prob.search_n_machines(
+        functools.partial(_threshold_attempt, threshold=threshold),
+        1,
+        50,
+        search="parallel",
+        n_jobs=4,
+    )
+    assert solution == (threshold if threshold <= 50 else None)
+    assert prob.n_solves <= min(threshold, 50) + 3
+
+
+def _slow_attempt(n):
+    if n > 3:
+        time.sleep(60)
+    return n if n == 3 else None
+
+
+def test_parallel_search_cancel():
+    """Test that the attempts with more machines than the solution found are stopped."""
+    prob = EmbedGreedy(None, None)
+    start = time.time()
+    assert (
+        prob.search_n_machines(_slow_attempt, 1, 10, search="parallel", n_jobs=4) == 3
+    )
+    assert time.time() - start < 30
+
+
+@pytest.mark.parametrize("algo", [EmbedBalanced, EmbedPartition])
+def test_parallel_solvers(algo):
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=6)
+
+    prob = algo(virtual, physical)
+    _, status = prob.solve(search="parallel", n_jobs=3)
+    assert status == Solved
+    assert prob.solution.n_machines_used >= prob.lower_bound()
+
+
+@pytest.mark.parametrize("algo", [EmbedGreedy, EmbedBalanced, EmbedPartition])
+def test_galloping_solvers(algo):
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=6)
+
+    prob = algo(virtual, physical)
+    _, status = prob.solve(search="galloping")
+    assert status == Solved
+    assert prob.n_solves >= 1
+
+
+def test_warm_start_heuristic():
+    """Test the heuristic solution used to warm start the ILP."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+
+    prob = EmbedILP(virtual, physical)
+    solution = prob._heuristic_solution("greedy")
+    assert solution.n_machines_used >= prob.lower_bound()
+    for (u, v), path in solution.link_path.items():
+        assert path[0][0] == solution.node_info(u)
+        assert path[-1][-1] == solution.node_info(v)
+
+    with pytest.raises(ValueError):
+        prob.solve(warm_start="unknown")
+
+
+def test_warm_start_solve():
+    """Test that the warm started ILP keeps or improves the heuristic solution."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=2, req_cores=8)
+
+    prob = EmbedILP(virtual, physical)
+    heuristic_solution = prob._heuristic_solution("greedy")
+    _, status = prob.solve(
+        solver_name="cbc", warm_start="greedy", presolve=True, timelimit=60
+    )
+    assert status == Solved
+    Solution.verify_solution(
+        virtual, physical, prob.solution.node_mapping, prob.solution.link_path
+    )
+    assert prob._objective_value(
+        prob.solution, "min_n_machines"
+    ) <= prob._objective_value(heuristic_solution, "min_n_machines")
+
+
+def test_presolve_candidate_edges():
+    """Test that the presolve keeps the physical links on the paths between compute nodes."""
+    physical = PhysicalNetwork.from_files("grisou", "graphique")
+    prob = EmbedILP(VirtualNetwork.create_fat_tree(k=2), physical)
+    candidate_edges = prob._candidate_edges()
+
+    assert set(candidate_edges) <= set(physical.edges(keys=True))
+    candidate_nodes = set(i for (i, _, _) in candidate_edges) | set(
+        j for (_, j, _) in candidate_edges
+    )
+    assert physical.compute_nodes <= candidate_nodes
+
+
+def test_presolve_infeasible():
+    """Test that the heuristic solution is returned when the candidate paths of the presolve are too small."""
+    g = nx.MultiGraph()
+    g.add_node("h1", cores=4, memory=4000)
+    g.add_node("h2", cores=4, memory=4000)
+    # the shortest paths do not have enough rate, only the longest path has
+    for s in ("s1", "s2", "s3", "s4"):
+        g.add_node(s, cores=0, memory=0)
+        g.add_edge("h1", s, devices={"h1": f"eth_{s}", s: "eth0"}, rate=100)
+        g.add_edge(s, "h2", devices={s: "eth1", "h2": f"eth_{s}"}, rate=100)
+    g.add_node("a", cores=0, memory=0)
+    g.add_node("b", cores=0, memory=0)
+    for (i, j) in (("h1", "a"), ("a", "b"), ("b", "h2")):
+        g.add_edge(i, j, devices={i: f"eth_{j}", j: f"eth_{i}"}, rate=1000)
+    physical = PhysicalNetwork(g)
+
+    v = nx.Graph()
+    v.add_node("u", cores=4, memory=4000)
+    v.add_node("v", cores=4, memory=4000)
+    v.add_edge("u", "v", rate=500)
+    virtual = VirtualNetwork(v)
+
+    for model in ("pulp", "sparse"):
+        prob = EmbedILP(virtual, physical)
+        _, status = prob.solve(
+            solver_name="cbc", presolve=True, model=model, timelimit=60
+        )
+        assert status == NotSolved
+        prob = EmbedILP(virtual, physical)
+        _, status = prob.solve(
+            solver_name="cbc",
+            presolve=True,
+            warm_start="greedy",
+            model=model,
+            timelimit=60,
+        )
+        assert status == Solved
+        Solution.verify_solution(
+            virtual, physical, prob.solution.node_mapping, prob.solution.link_path
+        )
+
+
+def test_symmetry_breaking():
+    """Test that the machines of grisou are identical and that a solution can be relabeled to break symmetries."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+    prob = EmbedILP(virtual, physical)
+
+    classes = prob._machine_classes(list(physical.nodes()))
+    assert len(classes) == 1
+    assert set(classes[0]) == physical.compute_nodes
+
+    members = classes[0]
+    solution = prob._heuristic_solution("greedy")
+    node_mapping, link_path = prob._break_symmetry(solution, classes)
+
+    used = set(node_mapping.values())
+    assert used == set(members[: len(used)])
+    for r, u in enumerate(virtual.nodes()):
+        assert members.index(node_mapping[u]) <= r
+    for (u, v), path in link_path.items():
+        assert path[0][0] == node_mapping[u]
+        assert path[-1][-1] == node_mapping[v]
+
+
+def test_column_generation_pricing():
+    """Test the shortest paths used to price the paths of the column generation."""
+    physical = PhysicalNetwork.from_files("grisou", "graphique")
+    compiled = physical.compile()
+    source = compiled.compute_nodes[0]
+    dist, pred = _shortest_paths(compiled, [1] * len(compiled.rates), source)
+
+    lengths = nx.single_source_shortest_path_length(
+        physical.g, compiled.names[source]
+    )
+    for j, name in enumerate(compiled.names):
+        assert dist[j] == lengths.get(name, float("inf"))
+    for j, (i, k) in ((j, p) for j, p in pred.items() if p is not None):
+        assert {i, j} == {compiled.interface_src[k], compiled.interface_dst[k]}
+
+    prob = EmbedColumnGeneration(VirtualNetwork.create_fat_tree(k=2), physical)
+    with pytest.raises(ValueError):
+        prob.solve(obj="unknown")
+
+
+@pytest.mark.parametrize("obj", ("min_n_machines", "min_bw"))
+def test_column_generation(obj):
+    """Test a solve of the column generation on a virtual network which does not fit on one machine."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=2, req_cores=8)
+    prob = EmbedColumnGeneration(virtual, physical)
+    time_solution, status = prob.solve(obj=obj, solver_name="cbc", timelimit=60)
+
+    assert status == Solved
+    Solution.verify_solution(
+        virtual, physical, prob.solution.node_mapping, prob.solution.link_path
+    )
+    assert prob.solution.n_machines_used >= prob.lower_bound() > 1
+    assert prob.solution.link_path
+
+
+def test_column_generation_default_solver():
+    """Test that the default backend returns the duals used to generate the paths."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=2, req_cores=8)
+
+    # without warm start, all the paths are generated by the pricing
+    prob = EmbedColumnGeneration(virtual, physical)
+    time_solution, status = prob.solve(obj="min_bw", warm_start=None, timelimit=60)
+
+    assert status == Solved
+    assert prob.solution.link_path
+    assert prob.current_val > 0
+
+
+def test_build_ILP_solution(virtual_nw):
+    """Test that the paths are rebuilt in order from the values of the ILP variables."""
+
+    def values(keys, active):
+        return {key: 1 if key in active else 0 for key in keys}
+
+    node_values = values(
+        [(u, i) for u in ("Node_0", "Node_1") for i in ("a", "b")],
+        [("Node_0", "a"), ("Node_1", "b")],
+    )
+    # path a-c-d-b listed out of order, a cycle c-e-c on the path and a cycle f-g-f outside of it
+    links = [
+        ("d", "b", "eth0"),
+        ("c", "e", "eth0"),
+        ("e", "c", "eth1"),
+        ("f", "g", "eth0"),
+        ("c", "d", "eth1"),
+        ("g", "f", "eth0"),
+        ("a", "c", "eth0"),
+    ]
+    link_values = values(
+        [("Node_0", "Node_1", i, j, d) for (i, j, d) in links + [("b", "a", "eth2")]],
+        [("Node_0", "Node_1", i, j, d) for (i, j, d) in links],
+    )
+
+    res_node_mapping, res_link_mapping = EmbedILP._build_ILP_solution(
+        virtual_nw, None, node_values, link_values
+    )
+    assert res_node_mapping == {"Node_0": "a", "Node_1": "b"}
+    assert res_link_mapping == {
+        ("Node_0", "Node_1"): [
+            ("a", "eth0", "c"),
+            ("c", "eth1", "d"),
+            ("d", "eth0", "b"),
+        ]
+    }
+
+
+@pytest.mark.parametrize("obj", ("min_n_machines", "min_bw"))
+def test_sparse_model(obj):
+    """Test the ILP built as a sparse matrix."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=2)
+    prob = EmbedILP(virtual, physical)
+    time_solution, status = prob.solve(
+        obj=obj, solver_name="cbc", model="sparse", presolve=True, timelimit=60
+    )
+    assert status == Solved
+    assert prob.solution.n_machines_used == 1
+
+    with pytest.raises(ValueError):
+        prob.solve(model="unknown")
+
+
+def test_anytime_ILP():
+    """Test that the heuristic solution is available right away and that the solver is stopped at the deadline."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+    prob = EmbedILP(virtual, physical)
+    run = prob.start(obj="min_bw", solver_name="cbc", presolve=True, timelimit=600)
+
+    assert prob.status == Solved
+    heuristic_value = prob._objective_value(prob.solution, "min_bw")
+    assert run.incumbent == heuristic_value
+
+    start = time.time()
+    run.wait(deadline=start + 5)
+    assert run.done and time.time() - start < 60
+    assert prob.status == Solved
+    assert prob._objective_value(prob.solution, "min_bw") <= heuristic_value
+    assert prob.current_val <= run.incumbent
+
+
+def test_substrate_template():
+    """Test that the substrate template is shared by the solves on the same physical network."""
+    physical = PhysicalNetwork.from_files("grisou")
+    template = EmbedILP(VirtualNetwork.create_fat_tree(k=2), physical)._template(
+        True, True
+    )
+    assert (
+        EmbedILP(VirtualNetwork.create_fat_tree(k=4), physical)._template(True, True)
+        is template
+    )
+
+    assert set(template.host_nodes) == physical.compute_nodes
+    assert template.flow_nodes[: len(template.host_nodes)] == template.host_nodes
+    for p, (i, j, device_id) in enumerate(template.phy_edges):
+        assert template.flow_nodes[template.link_i[p]] == i
+        assert template.flow_nodes[template.link_j[p]] == j
+        assert template.link_rates[p] == physical.rate(i, j, device_id)
+
+
+class _SlowSolver(EmbedGreedy):
+    """Solver which ignores the time limit."""
+
+    def solve(self, **kwargs):
+        time.sleep(60)
+        return super().solve(**kwargs)
+
+
+def test_portfolio_solver():
+    """Test that the best solution is kept and that the members still running at the deadline are cancelled."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+    members = {
+        "greedy": (EmbedGreedy, {"algo": "min_cut", "seed": 1}),
+        "partition": (EmbedPartition, {}),
+        "slow": (_SlowSolver, {}),
+    }
+    prob = PortfolioSolver(virtual, physical)
+
+    start = time.time()
+    time_solution, status = prob.solve(obj="min_bw", timelimit=5, members=members)
+    assert time.time() - start < 60
+    assert status == Solved
+    assert set(prob.results) == {"greedy", "partition"}
+    assert prob.winner in prob.results
+    greedy = EmbedGreedy(virtual, physical)
+    greedy.solve(algo="min_cut", seed=1)
+    assert prob._objective_value(prob.solution, "min_bw") <= greedy._objective_value(
+        greedy.solution, "min_bw"
+    )
+
+    with pytest.raises(ValueError):
+        prob.solve(obj="unknown")
+
+    # the members share the objective and the deadline of the portfolio
+    assert _member_kwargs({"obj": "min_n_machines", "timelimit": 600}, "min_bw", 5) == {
+        "obj": "min_bw",
+        "timelimit": 5,
+    }
+    assert _member_kwargs({"timelimit": 2}, "min_bw", 5.5)["timelimit"] == 2
+    assert _member_kwargs({}, "min_bw", 0.2)["timelimit"] == 1
+
+
+def test_sample_assignments():
+    """Test that the assignments sampled respect the node capacities."""
+    cores, memory = np.array([1, 2, 3, 4]), np.array([10, 20, 30, 40])
+    phy_cores, phy_memory = np.array([5, 5, 6]), np.array([50, 30, 60])
+    assignments = sample_assignments(cores, memory, phy_cores, phy_memory, 500, 1)
+    assert 0 < len(assignments) < 500
+    for assignment in assignments:
+        assert (np.bincount(assignment, cores, minlength=3) <= phy_cores).all()
+        assert (np.bincount(assignment, memory, minlength=3) <= phy_memory).all()
+
+
+def test_random_selection():
+    """Test that the random search is reproducible and that it stops when the budget runs out."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_random_nw(n_nodes=30, seed=1)
+
+    solutions = []
+    for n_jobs in (1, 2):
+        prob = RandomSelection(virtual, physical)
+        _, status = prob.solve(seed=1, n_jobs=n_jobs)
+        assert status == Solved
+        Solution.verify_solution(
+            virtual, physical, prob.solution.node_mapping, prob.solution.link_path
+        )
+        solutions.append(prob.solution.node_mapping)
+    assert solutions[0] == solutions[1]
+
+    physical = PhysicalNetwork.create_test_nw(cores=1, memory=100, rate=10)
+    with pytest.raises(TimeLimitError):
+        RandomSelection(virtual, physical).solve(max_attempts=5000)
+    with pytest.raises(TimeLimitError):
+        RandomSelection(virtual, physical).solve(timelimit=0.1)
+
+
+class _SlowRouting(RandomSelection):
+    """Random search whose routing never succeeds, slowly."""
+
+    def _route(self, node_mapping, path_engine):
+        time.sleep(0.01)
+        return None
+
+
+def test_random_selection_timelimit():
+    """Test that the deadline is checked while routing the assignments of a batch."""
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_random_nw(n_nodes=30, seed=1)
+
+    for n_jobs in (1, 2):
+        start = time.time()
+        with pytest.raises(TimeLimitError):
+            _SlowRouting(virtual, physical).solve(
+                timelimit=0.1, batch_size=1000, n_jobs=n_jobs
+            )
+        assert time.time() - start < 5
+
+
+def test_update():
+    """Test that the update places only the changed virtual nodes and keeps the other ones in place."""
+    physical = PhysicalNetwork.from_files("grisou")
+    prob = EmbedBalanced(VirtualNetwork.create_fat_tree(k=4), physical)
+    prob.solve()
+    solution = prob.solution
+
+    delta = VirtualDelta(
+        add_nodes={f"host_{i}": {"cores": 2, "memory": 4000} for i in (1, 17, 18)},
+        add_links={(f"host_{i}", "edge_2"): {"rate": 200} for i in (1, 17, 18)},
+        remove_nodes=["host_1", "host_2"],
+        remove_links=[("edge_1", "aggr_1")],
+    )
+    _, status = prob.update(solution, delta)
+    assert status == Solved
+    assert "host_2" not in prob.solution.node_mapping
+    assert ("aggr_1", "edge_1") not in prob.solution.link_path
+    for u, phy_node in prob.solution.node_mapping.items():
+        if u not in ("host_1", "host_17", "host_18"):
+            assert phy_node == solution.node_info(u)
+    Solution.verify_solution(
+        prob.virtual,
+        physical,
+        prob.solution.node_mapping,
+        prob.solution.link_path,
+    )
+
+    # the solution is left unchanged if the update is not feasible
+    virtual, solution = prob.virtual, prob.solution
+    _, status = prob.update(
+        solution, VirtualDelta(add_nodes={"big": {"cores": 1000, "memory": 1}})
+    )
+    assert status == Infeasible
+    assert prob.virtual is virtual and prob.solution is solution
+
+    with pytest.raises(ValueError):
+        VirtualDelta(add_links={("host_3", "unknown"): {"rate": 1}}).apply(virtual)
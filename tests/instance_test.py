@@ -149,3 +149,53 @@ def test_mininet_conversion_to_physical():
         assert phy_topo.memory(node) == 1000
     for i, j, device in phy_topo.edges(keys=True):
         assert phy_topo.rate(i, j, device) == 1000
+
+
+def test_compile():
+    """Test the integer-indexed snapshot of a physical network."""
+
+    from distriopt.embedding import PhysicalNetwork
+
+    physical = PhysicalNetwork.create_test_nw(cores=4, memory=4000, rate=10000)
+    compiled = physical.compile()
+    assert compiled is physical.compile()
+    assert [compiled.names[i] for i in compiled.compute_nodes] == ["h1", "h2"]
+    for node in physical.nodes():
+        i = compiled.ids[node]
+        assert compiled.cores[i] == physical.cores(node)
+        assert compiled.memory[i] == physical.memory(node)
+        assert compiled.rate_out[i] == physical.rate_out(node)
+        neighbors = compiled.indices[compiled.indptr[i] : compiled.indptr[i + 1]]
+        assert set(compiled.names[j] for j in neighbors) == set(
+            physical.neighbors(node)
+        )
+    for i, j, device_id in physical.edges(keys=True):
+        k = compiled.interface_ids[(j, i, device_id)]
+        assert compiled.interface_rate[k] == physical.rate(i, j, device_id)
+        assert compiled.interface_device[k] == device_id
+
+
+def test_compact():
+    """Test the integer-indexed view of a virtual network."""
+
+    import numpy as np
+    from distriopt import VirtualNetwork
+
+    virtual = VirtualNetwork.create_fat_tree(k=4, req_cores=2, req_memory=8000)
+    compact = virtual.compact()
+    assert compact.number_of_nodes() == 36
+    assert compact.number_of_edges() == 48
+    assert compact.cores.sum() == 72
+    assert not compact.cores.flags.writeable
+
+    partitions = [set(list(virtual.nodes())[:10]), set(list(virtual.nodes())[10:])]
+    assignment = compact.assignment(partitions)
+    assert compact.partitions(assignment) == partitions
+    assert compact.cut_weight(assignment) == sum(
+        virtual.req_rate(u, v)
+        for (u, v) in virtual.edges()
+        if (u in partitions[0]) != (v in partitions[0])
+    )
+    cores, memory = compact.partition_loads(assignment, 2)
+    assert np.array_equal(cores, [20, 52])
+    assert np.array_equal(memory, [80000, 208000])
@@ -0,0 +1,78 @@
+import pytest
+
+from distriopt import VirtualNetwork
+from distriopt.constants import LinkCapacityError, NoPathFoundError, NodeResourceError
+from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.ledger import ResidualLedger
+from distriopt.embedding.solution import Solution
+
+
+@pytest.fixture()
+def ledger():
+    yield ResidualLedger(
+        PhysicalNetwork.create_test_nw(cores=4, memory=4000, rate=10000)
+    )
+
+
+def test_transactions(ledger):
+    """Test that changes are applied on commit and discarded on rollback."""
+    ledger.add_node("h1", 1, 1000)
+    ledger.begin()
+    ledger.add_node("h1", 2, 1000)
+    ledger.add_path([("h1", "s1", 0), ("s1", "h2", 0)], 3000)
+    assert ledger.residual_cores("h1") == 1
+    assert ledger.residual_rate("s1", "h1", 0) == 7000
+    ledger.rollback()
+    assert ledger.residual_cores("h1") == 3
+    assert ledger.residual_memory("h1") == 3000
+    assert ledger.residual_rate("h1", "s1", 0) == 10000
+
+    ledger.begin()
+    ledger.begin()
+    ledger.add_node("h2", 4, 4000)
+    ledger.commit()
+    assert ledger.depth == 1
+    assert not ledger.fits("h2", 1, 0)
+    ledger.commit()
+    assert ledger.cores_used["h2"] == 4
+
+    with pytest.raises(ValueError):
+        ledger.rollback()
+
+
+def test_find_path(ledger):
+    """Test that the used rate is taken into account when looking for a path."""
+    ledger.add_rate("h1", "s1", 0, 6000)
+    ledger.begin()
+    ledger.add_rate("s1", "h1", 1, 6000)
+    with pytest.raises(NoPathFoundError):
+        ledger.physical.find_path(
+            "h1", "h2", req_rate=5000, used_rate=ledger.rate_used
+        )
+    ledger.rollback()
+    path = ledger.physical.find_path(
+        "h1", "h2", req_rate=5000, used_rate=ledger.rate_used
+    )
+    assert path[0] == ("h1", "s1", 1)
+
+
+def test_verify_solution(ledger):
+    """Test the verification of a solution on top of the resources already used."""
+    virtual = VirtualNetwork.create_test_nw(req_cores=2, req_memory=2000, req_rate=6000)
+    node_mapping = {"Node_0": "h1", "Node_1": "h2"}
+    link_path = {("Node_0", "Node_1"): [("h1", 0, "s1"), ("s1", 0, "h2")]}
+
+    Solution.verify_solution(virtual, ledger.physical, node_mapping, link_path, ledger)
+    ledger.add_rate("h2", "s1", 0, 5000)
+    with pytest.raises(LinkCapacityError):
+        Solution.verify_solution(
+            virtual, ledger.physical, node_mapping, link_path, ledger
+        )
+    ledger.add_node("h1", 3, 0)
+    with pytest.raises(NodeResourceError):
+        Solution.verify_solution(
+            virtual, ledger.physical, node_mapping, link_path, ledger
+        )
+    # the ledger is not modified
+    assert ledger.cores_used["h1"] == 3
+    assert ledger.depth == 0
@@ -0,0 +1,155 @@
+import random
+
+import pytest
+
+from distriopt import VirtualNetwork
+from distriopt.embedding.algorithms.partition import get_partitions
+
+
+@pytest.fixture(scope="module")
+def virtual_nw():
+    yield VirtualNetwork.create_random_nw(n_nodes=60, p=0.2, seed=1)
+
+
+def test_swaps(virtual_nw):
+    """Test that the swaps never increase the cut weight and keep the partitions balanced."""
+    compact = virtual_nw.compact()
+
+    random.seed(3)
+    initial = get_partitions(virtual_nw, n_partitions=4, n_swaps=0)
+    random.seed(3)
+    partitions = get_partitions(virtual_nw, n_partitions=4, n_swaps=5000)
+
+    assert sorted(len(p) for p in partitions) == sorted(len(p) for p in initial)
+    assert set().union(*partitions) == set(virtual_nw.nodes())
+    assert compact.cut_weight(compact.assignment(partitions)) < compact.cut_weight(
+        compact.assignment(initial)
+    )
+
+
+@pytest.mark.parametrize("n_partitions", [2, 5, 8])
+def test_multilevel(n_partitions):
+    """Test that the multilevel partitions cover all the nodes and are balanced."""
+    from distriopt.embedding.algorithms.multilevel import multilevel_partition
+
+    virtual = VirtualNetwork.create_fat_tree(k=8, density=4)
+    partitions = multilevel_partition(virtual.g, n_partitions, imbalance=0.05, seed=1)
+
+    assert len(partitions) == n_partitions
+    assert sum(len(p) for p in partitions) == virtual.number_of_nodes()
+    assert set().union(*partitions) == set(virtual.nodes())
+    assert (
+        max(len(p) for p in partitions)
+        <= 1.05 * virtual.number_of_nodes() / n_partitions + 1
+    )
+
+
+def test_multilevel_solvers():
+    """Test that the multilevel partitioner can be selected by the heuristics."""
+    from distriopt.embedding import PhysicalNetwork
+    from distriopt.embedding.algorithms import EmbedBalanced, EmbedGreedy
+    from distriopt.constants import Solved
+
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+
+    _, status = EmbedBalanced(virtual, physical).solve(partitioner="multilevel")
+    assert status == Solved
+    _, status = EmbedGreedy(virtual, physical).solve(algo="multilevel")
+    assert status == Solved
+
+
+def test_union_find():
+    """Test that find does not recurse on long chains of parents."""
+    from distriopt.embedding.algorithms.mincut import UnionFind
+
+    n = 100000
+    uf = UnionFind(n)
+    # build a chain without union by rank
+    uf.parents = [max(u - 1, 0) for u in range(n)]
+    assert uf.find(n - 1) == 0
+    assert uf.parents[n - 1] == 0
+    assert not uf.union(0, n - 1)
+
+
+@pytest.mark.parametrize("karger_stein", [False, True])
+def test_karger_min_cut(karger_stein):
+    """Test that the min cut separates two cliques connected by a light edge and that it is reproducible."""
+    import networkx as nx
+    from distriopt.embedding.algorithms.mincut import karger_min_cut
+
+    g = nx.Graph()
+    for offset in (0, 10):
+        for u in range(offset, offset + 10):
+            for v in range(u + 1, offset + 10):
+                g.add_edge(u, v, rate=10)
+    g.add_edge(0, 10, rate=1)
+
+    cut = karger_min_cut(g, n_trials=20, karger_stein=karger_stein, seed=2)
+    assert sorted(map(sorted, cut)) == [list(range(10)), list(range(10, 20))]
+    assert karger_min_cut(g, karger_stein=karger_stein, seed=5) == karger_min_cut(
+        g, karger_stein=karger_stein, seed=5
+    )
+
+
+def test_min_cut_solver():
+    """Test the greedy heuristic with Karger-Stein min cuts run in a pool of processes."""
+    from distriopt.embedding import PhysicalNetwork
+    from distriopt.embedding.algorithms import EmbedGreedy
+    from distriopt.constants import Solved
+
+    physical = PhysicalNetwork.from_files("grisou")
+    virtual = VirtualNetwork.create_fat_tree(k=4)
+
+    _, status = EmbedGreedy(virtual, physical).solve(
+        algo="min_cut", n_trials=4, karger_stein=True, n_jobs=2, seed=1
+    )
+    assert status == Solved
+
+
+def test_min_cut_executor_shutdown(monkeypatch):
+    """Test that the pool of the min cuts is shut down when the partition fails."""
+    from concurrent.futures import ThreadPoolExecutor
+    from distriopt.embedding.algorithms import greedy
+
+    def fail(*args, **kwargs):
+        raise RuntimeError("min cut failed")
+
+    executor = ThreadPoolExecutor(1)
+    monkeypatch.setattr(greedy, "min_cut_executor", lambda n_jobs: executor)
+    monkeypatch.setattr(greedy, "karger_min_cut", fail)
+    with pytest.raises(RuntimeError):
+        greedy.partition(VirtualNetwork.create_fat_tree(k=4), n_jobs=2)
+    # a shut down executor does not accept new tasks
+    with pytest.raises(RuntimeError):
+        executor.submit(print)
+
+
+def test_partition_tree_cache(virtual_nw):
+    """Test that the bisection tree is shared by equal graphs and by any number of partitions."""
+    from concurrent.futures import ThreadPoolExecutor
+    from distriopt.embedding.algorithms.kbalanced import GetPartitions
+
+    get_kl_partitions = GetPartitions(max_graphs=2)
+    tree = get_kl_partitions.tree(virtual_nw.g)
+    for n_partitions in (1, 3, 4, 8, 16):
+        partitions = get_kl_partitions(virtual_nw.g, n_partitions)
+        assert len(partitions) == n_partitions
+        assert set().union(*partitions) == set(virtual_nw.nodes())
+
+    # the partitions for 8 refine the partitions for 4, without new bisections
+    n_bisections = len(tree.children)
+    coarse, fine = tree.cut(4), tree.cut(8)
+    assert len(tree.children) == n_bisections
+    assert all(any(p <= q for q in coarse) for p in fine)
+
+    # equal graphs share the tree, which is used concurrently
+    assert get_kl_partitions.tree(virtual_nw.g.copy()) is tree
+    with ThreadPoolExecutor(max_workers=4) as executor:
+        results = list(executor.map(tree.cut, [16] * 8))
+    assert all(result == results[0] for result in results)
+
+    # least recently used trees are evicted
+    for n_nodes in (10, 20):
+        get_kl_partitions(VirtualNetwork.create_random_nw(n_nodes=n_nodes).g, 2)
+    assert get_kl_partitions.tree(virtual_nw.g) is not tree
@@ -0,0 +1,98 @@
+import networkx as nx
+import pytest
+
+from distriopt.constants import NoPathFoundError
+from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.paths import DijkstraPathEngine, PathIndex
+
+
+@pytest.fixture(scope="module")
+def physical_nw():
+    yield PhysicalNetwork.from_files("grisou")
+
+
+@pytest.mark.parametrize("engine", ["bfs", "dijkstra", "ksp"])
+class TestFindPath(object):
+    """Test the capacity-aware path engines."""
+
+    def test_shortest(self, engine, physical_nw):
+        source, target = sorted(physical_nw.compute_nodes)[:2]
+        path = physical_nw.find_path(source, target, engine=engine)
+        assert path[0][0] == source
+        assert path[-1][1] == target
+        for (_, j, _), (i, _, _) in zip(path, path[1:]):
+            assert j == i
+        # hosts are attached to the same switch
+        assert len(path) == 2
+
+    def test_residual_capacity(self, engine, physical_nw):
+        source, target = sorted(physical_nw.compute_nodes)[:2]
+        path = physical_nw.find_path(source, target, req_rate=1, engine=engine)
+        # saturate the interfaces used by the first path
+        used_rate = {
+            (i, j, device_id): physical_nw.rate(i, j, device_id)
+            for (i, j, device_id) in path
+        }
+        try:
+            other = physical_nw.find_path(
+                source, target, req_rate=1, used_rate=used_rate, engine=engine
+            )
+        except NoPathFoundError:
+            return
+        assert not set(other) & set(path)
+
+    def test_no_path(self, engine):
+        physical = PhysicalNetwork.create_test_nw(rate=10000)
+        with pytest.raises(NoPathFoundError):
+            physical.find_path("h1", "h2", req_rate=10001, engine=engine)
+
+
+@pytest.mark.parametrize("engine", ["bfs", "dijkstra", "ksp"])
+def test_disconnected(engine):
+    """Test that all the engines raise NoPathFoundError between disconnected nodes."""
+    g = nx.MultiGraph()
+    # h5 has no interfaces
+    for i in ("h1", "h2", "h3", "h4", "h5"):
+        g.add_node(i, cores=4, memory=4000)
+    g.add_edge("h1", "h2", devices={"h1": "eth0", "h2": "eth0"}, rate=10000)
+    g.add_edge("h3", "h4", devices={"h3": "eth0", "h4": "eth0"}, rate=10000)
+    physical = PhysicalNetwork(g)
+
+    assert len(physical.find_path("h1", "h2", engine=engine)) == 1
+    for target in ("h3", "h5"):
+        with pytest.raises(NoPathFoundError):
+            physical.find_path("h1", target, engine=engine)
+    assert physical.path_index.paths("h1", "h3") == []
+
+
+def test_dijkstra_weight():
+    """Test that the weight function drives the choice of the interface."""
+    physical = PhysicalNetwork.create_test_nw(rate=10000)
+    preferred = {"h1": 1, "h2": 0}
+    engine = DijkstraPathEngine(
+        weight=lambda i, j, device_id: (
+            0 if device_id == preferred.get(i, preferred.get(j)) else 1
+        )
+    )
+    path = physical.find_path("h1", "h2", engine=engine)
+    assert [device_id for (_, _, device_id) in path] == [1, 0]
+
+
+def test_path_index():
+    """Test that the candidate paths are sorted, cached and bounded in number."""
+    physical = PhysicalNetwork.from_files("grisou")
+    index = PathIndex(physical, k=3, max_pairs=2)
+    source, target, other = sorted(physical.compute_nodes)[:3]
+
+    ids = physical.compile().ids
+    paths = index.paths(source, target)
+    assert 0 < len(paths) <= 3
+    assert [len(path) for path in paths] == sorted(len(path) for path in paths)
+    assert all(path[0] == ids[source] and path[-1] == ids[target] for path in paths)
+    # the reverse pair is served by the same entry
+    assert index.paths(target, source) == [path[::-1] for path in paths]
+    assert len(index) == 1
+
+    index.paths(source, other)
+    index.paths(target, other)
+    assert len(index) == 2
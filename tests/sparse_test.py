@@ -0,0 +1,84 @@
+import time
+
+import numpy as np
+import pytest
+
+from distriopt.sparse import SparseModel, _parse_cbc_log, _parse_glpk_log
+
+
+@pytest.fixture()
+def model():
+    """max x0 + 2 x1 with x0 + x1 <= 1.5, x1 + x2 == 1, x0 <= 4 and x1, x2 integer."""
+    model = SparseModel("test")
+    x0 = model.add_variables(1, upper=4, cost=-1)
+    x1_x2 = model.add_variables(2, integer=True, cost=[-2, 0])
+    model.add_constraints(
+        [0, 0, 1, 1], [x0[0], x1_x2[0], x1_x2[0], x1_x2[1]], 1, ["L", "E"], [1.5, 1]
+    )
+    return model
+
+
+def test_sparse_matrix(model):
+    """Test the assembly of the constraint matrix, with duplicated entries summed."""
+    model.add_constraints([0, 0, 0], [0, 2, 0], [1, 1, 2], "G", 0)
+    indptr, indices, data = model.csr()
+    assert indptr.tolist() == [0, 2, 4, 6]
+    assert indices.tolist() == [0, 1, 1, 2, 0, 2]
+    assert data.tolist() == [1, 1, 1, 1, 3, 1]
+
+
+def test_write_mps(model, tmpdir):
+    path = str(tmpdir.join("model.mps"))
+    model.write_mps(path)
+    with open(path) as f:
+        lines = f.read().splitlines()
+
+    assert lines[:5] == ["NAME          test", "ROWS", " N  obj", " L  r0", " E  r1"]
+    # the integer variables are between markers
+    start = lines.index("    MARK      'MARKER'                 'INTORG'")
+    end = lines.index("    MARK      'MARKER'                 'INTEND'")
+    assert all(line.split()[0] in ("x1", "x2") for line in lines[start + 1 : end])
+    assert lines[-1] == "ENDATA"
+
+
+def test_solve(model):
+    assert model.solve("cbc", timelimit=10) == "Optimal"
+    assert np.allclose(model.values, [0.5, 1, 0])
+    assert model.objective_value == pytest.approx(-2.5)
+
+    # x0 + x1 >= 3 makes the model infeasible
+    model.add_constraints([0, 0], [0, 1], 1, "G", 3)
+    assert model.solve("cbc", timelimit=10) == "Infeasible"
+    assert model.values is None
+
+    with pytest.raises(ValueError):
+        model.solve("unknown")
+
+
+def test_solver_run(model):
+    """Test that the incumbent, the bound and the solution are available once the solver exits."""
+    solutions = []
+    run = model.start("cbc", timelimit=10, callback=solutions.append)
+    assert run.wait(target_gap=0, deadline=time.time() + 10) == "Optimal"
+    assert run.done
+    assert solutions == [run]
+    assert run.incumbent == pytest.approx(-2.5)
+    assert run.gap == pytest.approx(0)
+
+
+def test_parse_logs():
+    assert _parse_cbc_log(
+        "Cbc0010I After 100 nodes, 5 on tree, 12 best solution, best possible 10.5 (1.50 seconds)"
+    ) == (12, 10.5)
+    assert _parse_cbc_log(
+        "Cbc0010I After 0 nodes, 1 on tree, 1e+50 best solution, best possible 10.5 (1.50 seconds)"
+    ) == (None, 10.5)
+    assert _parse_cbc_log(
+        "Cbc0004I Integer solution of 12 found after 100 iterations and 3 nodes (0.10 seconds)"
+    ) == (12, None)
+    assert _parse_glpk_log(
+        "+   123: mip =   1.200000000e+01 >=   1.050000000e+01  12.5% (12; 0)"
+    ) == (12, 10.5)
+    assert _parse_glpk_log(
+        "+   100: mip =     not found yet >=              -inf        (1; 0)"
+    ) == (None, float("-inf"))
@@ -0,0 +1,78 @@
+import pytest
+
+from distriopt import VirtualNetwork
+from distriopt.constants import Infeasible, Solved
+from distriopt.embedding import PhysicalNetwork
+from distriopt.embedding.algorithms import EmbedBalanced
+from distriopt.embedding.solution import Solution
+from distriopt.embedding.tenants import EmbeddingManager
+
+
+@pytest.fixture()
+def manager():
+    yield EmbeddingManager(PhysicalNetwork.from_files("grisou"))
+
+
+def test_admit_release(manager):
+    """Test that the tenants share the physical resources and that released resources can be reused."""
+    statuses = [
+        manager.admit(f"tenant_{i}", VirtualNetwork.create_fat_tree(k=4))
+        for i in range(40)
+    ]
+    assert statuses[0] == Solved and statuses[-1] == Infeasible
+    n_admitted = statuses.count(Solved)
+    assert len(manager.tenants) == n_admitted
+
+    # the tenants do not exceed the capacity of the physical network
+    residual = manager.residual()
+    for i in residual.compute_nodes:
+        assert manager.ledger.residual_cores(i) >= 0
+        assert manager.ledger.residual_memory(i) >= 0
+    assert not manager.fits(VirtualNetwork.create_fat_tree(k=4))
+
+    manager.release("tenant_0")
+    assert manager.fits(VirtualNetwork.create_fat_tree(k=4))
+    assert manager.admit("tenant_0", VirtualNetwork.create_fat_tree(k=4)) == Solved
+    with pytest.raises(ValueError):
+        manager.admit("tenant_0", VirtualNetwork.create_fat_tree(k=4))
+
+    for name in list(manager.tenants):
+        manager.release(name)
+    assert all(manager.ledger.cores_used[i] == 0 for i in residual.compute_nodes)
+    assert all(amount == 0 for _, amount in manager.ledger.rate_used.items())
+
+
+def test_admit_batch():
+    """Test that the batches are embedded largest first with the chosen solver."""
+    physical = PhysicalNetwork.from_files("grisou")
+    manager = EmbeddingManager(physical, EmbedBalanced)
+    tenants = {
+        name: VirtualNetwork.create_random_nw(n_nodes=n_nodes, seed=1)
+        for name, n_nodes in (("small", 10), ("large", 60), ("medium", 30))
+    }
+    statuses = manager.admit_batch(tenants)
+    assert list(statuses) == ["large", "medium", "small"]
+    assert all(status == Solved for status in statuses.values())
+
+    # each embedding is feasible on its own
+    for virtual, solution in manager.tenants.values():
+        assert set(solution.node_mapping) == set(virtual.nodes())
+        Solution.verify_solution(
+            virtual,
+            physical,
+            solution.node_mapping,
+            solution.link_path,
+        )
+
+
+def test_residual_cache(manager):
+    """Test that the residual network is reused while the tenants do not change and then dropped from the caches."""
+    residual = manager.residual()
+    assert manager.residual() is residual
+    residual.compile()
+    residual.path_index
+
+    assert manager.admit("tenant_0", VirtualNetwork.create_fat_tree(k=4)) == Solved
+    assert manager.residual() is not residual
+    assert residual not in PhysicalNetwork.path_index.fget.cache
+    assert all(key[0] is not residual for key in PhysicalNetwork.compile.cache)